@@ -6,7 +6,8 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
 
 import logging
-from telegram import Update
+from telegram import Update, InputMediaPhoto
+from telegram.error import RetryAfter, NetworkError
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -18,7 +19,13 @@ from flask import Flask, request
 import requests
 import threading
 import asyncio
-from config.config import SERVER_URL, BOT_TOKEN, FLASK_PORT
+import sqlite3
+import json
+import time
+from config.config import (
+    SERVER_URL, BOT_TOKEN, BOT_API_BASE_URL, FLASK_PORT, BOT_OUTBOUND_QUEUE, BOT_ENQUEUE_TIMEOUT,
+    BOT_CHAT_INTERVAL, BOT_GLOBAL_RATE, BOT_MEDIA_GROUP_WINDOW, BOT_SEND_RETRIES, BOT_DB_FILE, BOT_VERIFY_INTERVAL
+)
 
 # Настройка логирования для отладки и мониторинга
 logging.basicConfig(
@@ -29,6 +36,61 @@ logger = logging.getLogger(__name__)
 # Инициализация Flask-приложения
 app = Flask(__name__)
 bot_application = None  # Глобальная переменная для хранения приложения Telegram-бота
+# Цикл событий бота и планировщик исходящих сообщений: эндпоинты Flask только ставят сообщения в очередь,
+# отправку выполняет задача планировщика в цикле бота
+bot_loop = None
+scheduler = None
+sender_task = None
+MEDIA_GROUP_SIZE = 10  # Максимум фото в медиагруппе Telegram
+chat_registry = None  # Хранилище привязок чатов к кодам (ChatRegistry)
+verify_task = None
+
+# Схема хранилища привязок чатов
+CHAT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_codes (
+    chat_id TEXT PRIMARY KEY,
+    code TEXT NOT NULL,
+    bound REAL NOT NULL
+);
+"""
+
+# Привязки чатов Telegram к кодам авторизации в SQLite: переживают перезапуск бота.
+# Рабочая копия привязок - bot_data['user_codes'], файл обновляется при каждом изменении.
+class ChatRegistry:
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.executescript(CHAT_SCHEMA)
+
+    # Все привязки: {chat_id: code}
+    def load(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT chat_id, code FROM chat_codes").fetchall())
+
+    def bind(self, chat_id, code):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO chat_codes (chat_id, code, bound) VALUES (?, ?, ?) "
+                "ON CONFLICT (chat_id) DO UPDATE SET code = excluded.code, bound = excluded.bound",
+                (chat_id, code, time.time())
+            )
+
+    # Удаление отозванных привязок {chat_id: code}; привязка, измененная после проверки, сохраняется
+    def remove(self, bindings):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "DELETE FROM chat_codes WHERE chat_id = ? AND code = ?", list(bindings.items())
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._db.close()
 
 # Эндпоинт Flask для отправки изображений в Telegram
 @app.route('/send_image', methods=['POST'])
@@ -45,34 +107,279 @@ def send_image():
         return {"error": "Отсутствуют необходимые данные"}, 400
 
     # Проверка инициализации бота
-    if not bot_application:
+    if not bot_application or not bot_loop:
         logger.error("Приложение бота не инициализировано")
         return {"error": "Бот не инициализирован"}, 500
 
     # Проверка авторизации chat_id
     user_codes = bot_application.bot_data.get('user_codes', {})
-    if chat_id not in user_codes or user_codes[chat_id] != code:
+    if user_codes.get(chat_id) != code:
         logger.error(f"Неавторизованный chat_id {chat_id} или неверный код {code}")
         return {"error": "Неавторизованный chat_id или код"}, 401
 
-    # Асинхронная отправка изображения
+    # Постановка изображения в очередь отправки в цикле бота
+    photo.seek(0)  # Сброс указателя файла
+    message = {"chat_id": chat_id, "photo": photo.read(), "caption": caption}
     try:
-        photo.seek(0)  # Сброс указателя файла
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(
-            bot_application.bot.send_photo(
-                chat_id=chat_id,
-                photo=photo,
-                caption=caption
-            )
-        )
-        loop.close()
-        logger.info(f"Изображение отправлено в чат {chat_id}")
-        return {"status": "success"}, 200
+        queued = asyncio.run_coroutine_threadsafe(enqueue(message), bot_loop).result(timeout=BOT_ENQUEUE_TIMEOUT)
     except Exception as e:
-        logger.error(f"Ошибка отправки изображения в чат {chat_id}: {e}")
+        logger.error(f"Ошибка постановки изображения в очередь для чата {chat_id}: {e}")
         return {"error": str(e)}, 500
+    if not queued:
+        logger.warning(f"Очередь отправки переполнена, изображение для чата {chat_id} отклонено")
+        return {"error": "Очередь отправки переполнена"}, 503
+    logger.info(f"Изображение для чата {chat_id} поставлено в очередь")
+    return {"status": "queued"}, 202
+
+# Эндпоинт Flask для пакетной отправки изображений: каждое изображение передается в запросе один раз,
+# items - JSON-список {"chat_id", "code", "caption", "photo": имя файла изображения в запросе}.
+# Результат возвращается по каждому элементу в порядке items.
+@app.route('/send_images', methods=['POST'])
+def send_images():
+    try:
+        items = json.loads(request.form.get('items', ''))
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        logger.error("Пакетная отправка: список items не указан или поврежден")
+        return {"error": "Список items должен быть JSON-массивом"}, 400
+
+    if not bot_application or not bot_loop:
+        logger.error("Приложение бота не инициализировано")
+        return {"error": "Бот не инициализирован"}, 500
+
+    user_codes = bot_application.bot_data.get('user_codes', {})
+    photos = {}  # Имя файла в запросе -> байты изображения (читаются один раз для всех чатов)
+    results = [None] * len(items)
+    messages = []
+    positions = []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        chat_id = str(item.get('chat_id') or '')
+        code = item.get('code')
+        caption = item.get('caption')
+        name = item.get('photo')
+        if not all([chat_id, code, caption, name]) or name not in request.files:
+            results[index] = {"chat_id": chat_id, "status": "error", "error": "Отсутствуют необходимые данные"}
+        elif user_codes.get(chat_id) != code:
+            results[index] = {"chat_id": chat_id, "status": "error", "error": "Неавторизованный chat_id или код"}
+        else:
+            if name not in photos:
+                photos[name] = request.files[name].read()
+            messages.append({"chat_id": chat_id, "photo": photos[name], "caption": caption})
+            positions.append(index)
+
+    if messages:
+        try:
+            queued = asyncio.run_coroutine_threadsafe(
+                enqueue_many(messages), bot_loop
+            ).result(timeout=BOT_ENQUEUE_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Ошибка постановки пакета изображений в очередь: {e}")
+            return {"error": str(e)}, 500
+        for index, message, ok in zip(positions, messages, queued):
+            if ok:
+                results[index] = {"chat_id": message["chat_id"], "status": "queued"}
+            else:
+                results[index] = {"chat_id": message["chat_id"], "status": "error", "error": "Очередь отправки переполнена"}
+    queued_count = sum(result["status"] == "queued" for result in results)
+    logger.info(f"Пакет изображений: элементов {len(items)}, поставлено в очередь {queued_count}")
+    return {"results": results}, 200
+
+# Добавление сообщения в очередь (выполняется в цикле бота); False, если очередь заполнена
+async def enqueue(message):
+    return scheduler.submit(message)
+
+async def enqueue_many(messages):
+    return [scheduler.submit(message) for message in messages]
+
+# Планировщик исходящих сообщений. Соблюдает ограничения Telegram: не чаще одного сообщения в чат
+# за chat_interval секунд и не более global_rate запросов в секунду в целом. Снимки одного чата,
+# поступившие в течение group_window секунд, отправляются одной медиагруппой (до 10 фото).
+# На RetryAfter чат откладывается на указанное Telegram время, сообщения повторяются до max_retries раз.
+# Все методы вызываются в цикле бота.
+class OutboundScheduler:
+    def __init__(self, bot, max_pending, chat_interval, global_rate, group_window, max_retries):
+        self.bot = bot
+        self.max_pending = max_pending
+        self.chat_interval = chat_interval
+        self.global_rate = global_rate
+        self.group_window = group_window
+        self.max_retries = max_retries
+        self.pending = 0  # Сообщений в очереди и в отправке
+        self._chats = {}  # {chat_id: [message, ...]} в порядке поступления
+        self._next_send = {}  # {chat_id: время, раньше которого в чат не отправлять}
+        self._sending = set()  # Чаты, отправка в которые выполняется сейчас
+        self._tasks = set()
+        self._tokens = global_rate
+        self._refilled = time.monotonic()
+        self._wakeup = asyncio.Event()
+
+    def submit(self, message):
+        if self.pending >= self.max_pending:
+            return False
+        message["queued"] = time.monotonic()
+        message["attempts"] = 0
+        self._chats.setdefault(message["chat_id"], []).append(message)
+        self.pending += 1
+        self._wakeup.set()
+        return True
+
+    # Время, с которого чат можно отправлять: истекло окно объединения (или набрана полная группа)
+    # и прошел интервал после предыдущей отправки
+    def _due(self, chat_id, messages):
+        ready = messages[0]["queued"] + (0 if len(messages) >= MEDIA_GROUP_SIZE else self.group_window)
+        return max(ready, self._next_send.get(chat_id, 0))
+
+    # Общее ограничение частоты (token bucket): 0, если запрос можно выполнить сейчас, иначе время ожидания
+    def _take_token(self, now):
+        self._tokens = min(self.global_rate, self._tokens + (now - self._refilled) * self.global_rate)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.global_rate
+
+    async def run(self):
+        try:
+            while True:
+                now = time.monotonic()
+                due = min(
+                    ((self._due(chat_id, messages), chat_id) for chat_id, messages in self._chats.items()
+                     if messages and chat_id not in self._sending),
+                    default=None
+                )
+                if due is None or due[0] > now:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), due[0] - now if due else None)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                wait = self._take_token(now)
+                if wait:
+                    await asyncio.sleep(wait)
+                    continue
+                chat_id = due[1]
+                batch = self._chats[chat_id][:MEDIA_GROUP_SIZE]
+                del self._chats[chat_id][:len(batch)]
+                if not self._chats[chat_id]:
+                    del self._chats[chat_id]
+                self._next_send[chat_id] = now + self.chat_interval
+                self._sending.add(chat_id)
+                task = asyncio.create_task(self._send(chat_id, batch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+
+    async def _send(self, chat_id, batch):
+        try:
+            if len(batch) == 1:
+                await self.bot.send_photo(chat_id=chat_id, photo=batch[0]["photo"], caption=batch[0]["caption"])
+            else:
+                media = [InputMediaPhoto(message["photo"], caption=message["caption"]) for message in batch]
+                await self.bot.send_media_group(chat_id=chat_id, media=media)
+            self.pending -= len(batch)
+            logger.info(f"Изображений отправлено в чат {chat_id}: {len(batch)}")
+        except RetryAfter as e:
+            delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            logger.warning(f"Ограничение частоты Telegram для чата {chat_id}: повтор через {delay} с")
+            self._retry(chat_id, batch, delay)
+        except NetworkError as e:
+            logger.warning(f"Сетевая ошибка отправки в чат {chat_id}: {e}")
+            self._retry(chat_id, batch, self.chat_interval)
+        except Exception as e:
+            self.pending -= len(batch)
+            logger.error(f"Ошибка отправки изображений в чат {chat_id}: {e}")
+        finally:
+            self._sending.discard(chat_id)
+            self._wakeup.set()
+
+    # Возврат сообщений в начало очереди чата с отсрочкой; исчерпавшие попытки отбрасываются
+    def _retry(self, chat_id, batch, delay):
+        self._next_send[chat_id] = time.monotonic() + delay
+        retry = []
+        for message in batch:
+            message["attempts"] += 1
+            if message["attempts"] <= self.max_retries:
+                retry.append(message)
+        messages = retry + self._chats.get(chat_id, [])
+        if messages:
+            self._chats[chat_id] = messages
+        else:
+            self._chats.pop(chat_id, None)
+        self.pending -= len(batch) - len(retry)
+        if len(retry) < len(batch):
+            logger.error(f"Не удалось отправить изображений в чат {chat_id}: {len(batch) - len(retry)}")
+
+# Запуск планировщика отправки после инициализации бота
+async def start_outbound(application):
+    global bot_loop, scheduler, sender_task
+    scheduler = OutboundScheduler(
+        application.bot, BOT_OUTBOUND_QUEUE, BOT_CHAT_INTERVAL, BOT_GLOBAL_RATE,
+        BOT_MEDIA_GROUP_WINDOW, BOT_SEND_RETRIES
+    )
+    sender_task = asyncio.create_task(scheduler.run())
+    bot_loop = asyncio.get_running_loop()
+
+# Остановка планировщика отправки; неотправленные сообщения отбрасываются
+async def stop_outbound(application):
+    global bot_loop
+    bot_loop = None
+    if sender_task:
+        sender_task.cancel()
+    if scheduler and scheduler.pending:
+        logger.warning(f"Бот остановлен, не отправлено сообщений: {scheduler.pending}")
+
+# Проверка всех привязок чатов на сервере одним запросом; отозванные привязки удаляются.
+# Если сервер недоступен, привязки сохраняются до следующей проверки.
+async def verify_chat_codes(application):
+    user_codes = application.bot_data.setdefault('user_codes', {})
+    bindings = dict(user_codes)
+    if not bindings:
+        return
+    try:
+        response = await asyncio.to_thread(
+            requests.post,
+            f"{SERVER_URL}/verify_chat_codes",
+            json={"bindings": bindings},
+            timeout=10
+        )
+        response.raise_for_status()
+        results = response.json()["results"]
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.warning(f"Не удалось проверить привязки чатов на сервере: {e}")
+        return
+    revoked = {chat_id: code for chat_id, code in bindings.items() if not results.get(chat_id)}
+    for chat_id, code in revoked.items():
+        if user_codes.get(chat_id) == code:
+            del user_codes[chat_id]
+    if revoked:
+        chat_registry.remove(revoked)
+    logger.info(f"Проверено привязок чатов: {len(bindings)}, отозвано: {len(revoked)}")
+
+async def verify_periodically(application):
+    while True:
+        await asyncio.sleep(BOT_VERIFY_INTERVAL)
+        await verify_chat_codes(application)
+
+# Инициализация бота: загрузка и проверка привязок чатов, запуск отправки
+async def initialize(application):
+    global verify_task
+    application.bot_data['user_codes'] = chat_registry.load()
+    logger.info(f"Загружено привязок чатов: {len(application.bot_data['user_codes'])}")
+    await verify_chat_codes(application)
+    verify_task = asyncio.create_task(verify_periodically(application))
+    await start_outbound(application)
+
+# Остановка бота
+async def finalize(application):
+    if verify_task:
+        verify_task.cancel()
+    await stop_outbound(application)
+    chat_registry.close()
 
 # Обработчик команды /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -94,8 +401,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)  # ID чата
 
     try:
-        # Отправка запроса на сервер для проверки кода
-        response = requests.post(
+        # Отправка запроса на сервер для проверки кода (в отдельном потоке, чтобы не блокировать цикл бота)
+        response = await asyncio.to_thread(
+            requests.post,
             f"{SERVER_URL}/update_chat_id",
             json={"code": code, "chat_id": chat_id},
             timeout=5
@@ -105,6 +413,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Сохранение кода в данных бота
             context.bot_data.setdefault('user_codes', {})
             context.bot_data['user_codes'][chat_id] = code
+            chat_registry.bind(chat_id, code)
             context.user_data['awaiting_code'] = False
             await update.message.reply_text(
                 "Код подтвержден. Уведомления об объектах будут отправляться."
@@ -125,9 +434,18 @@ def run_flask():
 
 # Основная функция для запуска бота
 def main():
-    global bot_application
+    global bot_application, chat_registry
+    chat_registry = ChatRegistry(BOT_DB_FILE)
     # Инициализация приложения Telegram-бота
-    bot_application = Application.builder().token(BOT_TOKEN).build()
+    bot_application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(f"{BOT_API_BASE_URL}/bot")
+        .base_file_url(f"{BOT_API_BASE_URL}/file/bot")
+        .post_init(initialize)
+        .post_stop(finalize)
+        .build()
+    )
 
     # Регистрация обработчиков команд и сообщений
     bot_application.add_handler(CommandHandler("start", start))
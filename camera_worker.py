@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+# Процесс обработки камер для режима CAMERA_RUNTIME = "external". Процессы регистрируются в общем индексе
+# и делят камеры по кольцу хешей, число процессов можно менять без перезапуска остальных.
+# Пример для двух процессов: python camera_worker.py --port 5100 и python camera_worker.py --port 5101
+# На другом хосте: python camera_worker.py --host 0.0.0.0 --port 5100 --advertise-url http://<хост>:5100
+from server.worker import main
+
+if __name__ == "__main__":
+    main()
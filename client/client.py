@@ -10,13 +10,127 @@ import pyperclip
 import time
 import json
 import cv2
+import hashlib
+import logging
 import tkinter as tk
 import tkinter.filedialog as filedialog
 
+logger = logging.getLogger(__name__)
+
 # URL сервера и Telegram-бота
 SERVER_URL = "http://127.0.0.1:5000"
 BOT_SERVER_URL = "http://127.0.0.1:5001"
 
+# Классы объектов YOLO, доступные для распознавания
+DETECTION_CLASSES = {
+    "0": "Человек", "2": "Машина", "16": "Собака", "15": "Кот", "1": "Велосипед",
+    "3": "Мотоцикл", "14": "Птица", "24": "Рюкзак", "25": "Зонт", "26": "Сумка"
+}
+
+# Периоды фильтра снимков (с)
+IMAGE_PERIODS = {"За все время": None, "За час": 3600, "За сутки": 86400, "За неделю": 7 * 86400}
+
+# Пользователей на странице списка в админ-панели
+USERS_PAGE_SIZE = 50
+
+# Высота окна добавления камеры (px)
+ADD_CAMERA_WINDOW_HEIGHT = 820
+
+# Локальный кэш снимков: каталог и наибольший объем (байт)
+IMAGE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".object_detection_camera", "images")
+IMAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Локальный кэш снимков на диске. Сервер отдает снимки с Cache-Control: immutable, такие файлы
+# берутся из кэша без запроса; остальные перепроверяются условным запросом с If-None-Match (ответ 304).
+# При превышении объема удаляются файлы, которые дольше всего не использовались.
+class ImageCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(
+            os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory) if name.endswith(".img")
+        )
+
+    def _files(self, image_path):
+        key = hashlib.sha1(image_path.encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.img"), os.path.join(self.directory, f"{key}.json")
+
+    # Байты снимка image_path (путь вида static/captures/...); requests.RequestException при ошибке сети
+    def get(self, image_path, token):
+        data_file, meta_file = self._files(image_path)
+        meta = {}
+        try:
+            with open(meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("immutable"):
+                with open(data_file, "rb") as f:
+                    data = f.read()
+                os.utime(data_file)
+                return data
+        except (OSError, ValueError):
+            meta = {}
+        headers = {"If-None-Match": meta["etag"]} if meta.get("etag") and os.path.exists(data_file) else {}
+        response = self.session.get(f"{SERVER_URL}/{image_path}", params={"token": token}, headers=headers, timeout=5)
+        if response.status_code == 304:
+            with open(data_file, "rb") as f:
+                return f.read()
+        response.raise_for_status()
+        cache_control = response.headers.get("Cache-Control", "")
+        if response.headers.get("ETag") and "no-store" not in cache_control:
+            self._put(data_file, meta_file, response.content, {
+                "etag": response.headers["ETag"],
+                "immutable": "immutable" in cache_control
+            })
+        return response.content
+
+    def _put(self, data_file, meta_file, data, meta):
+        with self._lock:
+            try:
+                old_size = os.path.getsize(data_file) if os.path.exists(data_file) else 0
+                with open(data_file, "wb") as f:
+                    f.write(data)
+                with open(meta_file, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+                self._size += len(data) - old_size
+            except OSError as e:
+                logger.warning(f"Ошибка записи кэша снимков: {e}")
+                return
+            if self._size > self.max_bytes:
+                self._evict()
+
+    # Удаление давно не использованных файлов до 90% наибольшего объема
+    def _evict(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".img"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        for _, size, path in sorted(files):
+            if self._size <= self.max_bytes * 0.9:
+                break
+            for file in (path, path[:-4] + ".json"):
+                try:
+                    os.remove(file)
+                except OSError:
+                    pass
+            self._size -= size
+
+    # Удаление снимка из кэша (после удаления на сервере)
+    def discard(self, image_path):
+        data_file, meta_file = self._files(image_path)
+        with self._lock:
+            for file in (data_file, meta_file):
+                try:
+                    if file == data_file:
+                        self._size -= os.path.getsize(file)
+                    os.remove(file)
+                except OSError:
+                    pass
+
 # Основной класс приложения для работы с камерами и распознаванием объектов
 class ObjectDetectionApp(ctk.CTk):
     def __init__(self):
@@ -33,6 +147,10 @@ class ObjectDetectionApp(ctk.CTk):
         self.cameras = {}  # Словарь для хранения данных о камерах: {name: (label, source, active_flag, frame, is_test_video)}
         self.image_widgets = {}  # Словарь для хранения виджетов изображений: {camera_name: [(label, path, timestamp, viewed)]}
         self.new_images_count = 0  # Счетчик новых изображений
+        self.clips = {}  # Клипы событий: {camera_name: {image_path: clip_path}}
+        self.viewed_images = set()  # Снимки, отмеченные просмотренными на сервере
+        self.capture_ids = {}  # Идентификаторы снимков на сервере: {image_path: capture_id или None}
+        self.selected_images = {}  # Выбранные в галерее снимки: {image_path: (camera_name, container)}
         self.current_user = None  # Текущий пользователь
         self.session_token = None  # Токен сессии
         self.role = "user"  # Роль пользователя (по умолчанию user)
@@ -43,6 +161,8 @@ class ObjectDetectionApp(ctk.CTk):
         self.add_camera_window = None  # Окно добавления камеры
         self.edit_user_window = None  # Окно редактирования пользователя
         self.logs_text = None  # Текстовое поле для логов
+        self.users_page = 1  # Текущая страница списка пользователей в админ-панели
+        self.image_cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)  # Локальный кэш снимков
 
         # Создание главного фрейма
         self.main_frame = ctk.CTkFrame(self)
@@ -221,7 +341,8 @@ class ObjectDetectionApp(ctk.CTk):
             if response.status_code == 200:
                 cameras = response.json().get("cameras", {})
                 self.cameras.clear()
-                for name, url in cameras.items():
+                for name, camera in cameras.items():
+                    url = camera.get("url") if isinstance(camera, dict) else camera
                     self.start_video_stream(name, url, is_test_video=False)
             else:
                 self.show_auth_screen()
@@ -383,14 +504,13 @@ class ObjectDetectionApp(ctk.CTk):
 
         self.add_camera_window = ctk.CTkToplevel(self)
         self.add_camera_window.title("Добавить камеру")
-        self.add_camera_window.geometry("400x400")
         self.add_camera_window.transient(self)
         self.add_camera_window.grab_set()
         self.add_camera_window.attributes("-topmost", True)
 
-        # Центрирование окна
+        # Размер и центрирование окна: высота вмещает все параметры камеры, но не больше экрана
         window_width = 400
-        window_height = 400
+        window_height = min(ADD_CAMERA_WINDOW_HEIGHT, self.winfo_screenheight() - 80)
         screen_width = self.winfo_screenwidth()
         screen_height = self.winfo_screenheight()
         x = (screen_width - window_width) // 2
@@ -420,6 +540,41 @@ class ObjectDetectionApp(ctk.CTk):
         self.url_entry = ctk.CTkEntry(self.url_frame)
         self.url_entry.pack(pady=5, fill="x")
 
+        # Параметры захвата: подпоток для распознавания, транспорт, потоки декодера, уменьшение
+        ctk.CTkLabel(self.url_frame, text="URL подпотока для распознавания (необязательно):").pack(pady=5)
+        self.detect_url_entry = ctk.CTkEntry(self.url_frame)
+        self.detect_url_entry.pack(pady=5, fill="x")
+        options_frame = ctk.CTkFrame(self.url_frame)
+        options_frame.pack(pady=5, fill="x")
+        ctk.CTkLabel(options_frame, text="Транспорт:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+        self.transport_var = ctk.StringVar(value="tcp")
+        ctk.CTkOptionMenu(options_frame, values=["tcp", "udp"], variable=self.transport_var, width=100).grid(
+            row=0, column=1, padx=5, pady=2, sticky="w")
+        ctk.CTkLabel(options_frame, text="Потоки декодера:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+        self.threads_entry = ctk.CTkEntry(options_frame, width=100, placeholder_text="по умолчанию")
+        self.threads_entry.grid(row=1, column=1, padx=5, pady=2, sticky="w")
+        ctk.CTkLabel(options_frame, text="Ширина распознавания:").grid(row=2, column=0, padx=5, pady=2, sticky="w")
+        self.decode_width_entry = ctk.CTkEntry(options_frame, width=100, placeholder_text="0 - без уменьшения")
+        self.decode_width_entry.grid(row=2, column=1, padx=5, pady=2, sticky="w")
+        self.record_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(options_frame, text="Непрерывная запись", variable=self.record_var).grid(
+            row=3, column=0, columnspan=2, padx=5, pady=2, sticky="w")
+        ctk.CTkLabel(options_frame, text="Хранить записи (ч):").grid(row=4, column=0, padx=5, pady=2, sticky="w")
+        self.retention_entry = ctk.CTkEntry(options_frame, width=100, placeholder_text="по умолчанию")
+        self.retention_entry.grid(row=4, column=1, padx=5, pady=2, sticky="w")
+        ctk.CTkLabel(options_frame, text="Формат снимков:").grid(row=5, column=0, padx=5, pady=2, sticky="w")
+        self.snapshot_format_var = ctk.StringVar(value="по умолчанию")
+        ctk.CTkOptionMenu(
+            options_frame, values=["по умолчанию", "jpg", "webp"], variable=self.snapshot_format_var, width=100
+        ).grid(
+            row=5, column=1, padx=5, pady=2, sticky="w")
+        ctk.CTkLabel(options_frame, text="Качество снимков (1-100):").grid(row=6, column=0, padx=5, pady=2, sticky="w")
+        self.snapshot_quality_entry = ctk.CTkEntry(options_frame, width=100, placeholder_text="по умолчанию")
+        self.snapshot_quality_entry.grid(row=6, column=1, padx=5, pady=2, sticky="w")
+        ctk.CTkLabel(options_frame, text="Макс. размер снимка (px):").grid(row=7, column=0, padx=5, pady=2, sticky="w")
+        self.snapshot_max_size_entry = ctk.CTkEntry(options_frame, width=100, placeholder_text="исходный")
+        self.snapshot_max_size_entry.grid(row=7, column=1, padx=5, pady=2, sticky="w")
+
         # Поля для выбора видеофайла
         self.video_frame = ctk.CTkFrame(add_camera_frame)
         self.video_file_path = ctk.StringVar()
@@ -481,6 +636,15 @@ class ObjectDetectionApp(ctk.CTk):
                         "username": self.current_user,
                         "name": name,
                         "url": source,
+                        "detect_url": self.detect_url_entry.get().strip(),
+                        "transport": self.transport_var.get(),
+                        "threads": self.threads_entry.get().strip(),
+                        "decode_width": self.decode_width_entry.get().strip(),
+                        "record": self.record_var.get(),
+                        "retention_hours": self.retention_entry.get().strip(),
+                        "snapshot_format": self.snapshot_format_var.get().replace("по умолчанию", ""),
+                        "snapshot_quality": self.snapshot_quality_entry.get().strip(),
+                        "snapshot_max_size": self.snapshot_max_size_entry.get().strip(),
                         "token": self.session_token
                     },
                     timeout=5
@@ -511,6 +675,26 @@ class ObjectDetectionApp(ctk.CTk):
             command=self.load_selected_images
         )
         self.camera_selector.pack(side="left", padx=5)
+        # Фильтр по обнаруженному объекту и периоду (поиск по метаданным снимков на сервере)
+        self.class_filter = ctk.CTkOptionMenu(
+            self.images_control_frame,
+            values=["Все объекты"] + list(DETECTION_CLASSES.values()),
+            command=lambda _: self.load_selected_images(self.camera_selector.get())
+        )
+        self.class_filter.pack(side="left", padx=5)
+        self.period_filter = ctk.CTkOptionMenu(
+            self.images_control_frame,
+            values=list(IMAGE_PERIODS),
+            command=lambda _: self.load_selected_images(self.camera_selector.get())
+        )
+        self.period_filter.pack(side="left", padx=5)
+        # Действия с выбранными снимками
+        for text, command in (
+            ("Удалить выбранные", self.delete_selected_images),
+            ("Просмотрено", self.mark_selected_viewed),
+            ("Экспорт", self.export_selected_images),
+        ):
+            ctk.CTkButton(self.images_control_frame, text=text, width=120, command=command).pack(side="right", padx=5)
         self.images_frame = ctk.CTkScrollableFrame(images_tab)
         self.images_frame.pack(fill="both", expand=True, padx=10, pady=5)
         self.load_selected_images("Все камеры")
@@ -520,25 +704,64 @@ class ObjectDetectionApp(ctk.CTk):
         for widget in self.images_frame.winfo_children():
             widget.destroy()
         self.image_widgets.clear()
+        self.selected_images.clear()
 
+        class_ids = [class_id for class_id, name in DETECTION_CLASSES.items() if name == self.class_filter.get()]
+        period = IMAGE_PERIODS[self.period_filter.get()]
         try:
-            response = requests.get(
-                f"{SERVER_URL}/get_images",
-                params={"username": self.current_user, "token": self.session_token},
-                timeout=5
-            )
+            if class_ids or period:
+                response = self.search_images(selection, class_ids, period)
+            else:
+                response = requests.get(
+                    f"{SERVER_URL}/get_images",
+                    params={"username": self.current_user, "token": self.session_token},
+                    timeout=5
+                )
             if response.status_code == 200:
-                images = response.json().get("images", {})
+                if class_ids or period:
+                    images = {}
+                    for capture in response.json().get("captures", []):
+                        images.setdefault(capture["camera"], {})[capture["path"]] = capture["timestamp"]
+                        self.capture_ids[capture["path"]] = capture["capture_id"]
+                else:
+                    images = response.json().get("images", {})
+                    self.viewed_images = set(response.json().get("viewed", []))
+                    self.capture_ids = response.json().get("ids", {})
+                    self.camera_selector.configure(values=["Все камеры"] + sorted(images.keys()))
+                self.load_clips()
                 cameras = images.keys() if selection == "Все камеры" else [selection]
                 for camera_name in cameras:
                     if camera_name in images:
                         self.load_images_for_camera(camera_name, images[camera_name])
-                self.camera_selector.configure(values=["Все камеры"] + sorted(images.keys()))
             else:
                 tk.messagebox.showerror("Ошибка", response.json().get("error", "Неизвестная ошибка"))
         except requests.RequestException as e:
             tk.messagebox.showerror("Ошибка", f"Сетевая ошибка: {e}")
 
+    # Поиск снимков с выбранным объектом за период
+    def search_images(self, selection, class_ids, period):
+        params = {"username": self.current_user, "token": self.session_token, "limit": 200}
+        if selection != "Все камеры":
+            params["camera_name"] = selection
+        if class_ids:
+            params["classes"] = ",".join(class_ids)
+        if period:
+            params["start"] = time.time() - period
+        return requests.get(f"{SERVER_URL}/search_captures", params=params, timeout=5)
+
+    # Загрузка списка клипов событий
+    def load_clips(self):
+        try:
+            response = requests.get(
+                f"{SERVER_URL}/get_clips",
+                params={"username": self.current_user, "token": self.session_token},
+                timeout=5
+            )
+            if response.status_code == 200:
+                self.clips = response.json().get("clips", {})
+        except requests.RequestException as e:
+            logger.warning(f"Ошибка загрузки клипов: {e}")
+
     # Загрузка снимков для конкретной камеры
     def load_images_for_camera(self, camera_name, image_list):
         label = ctk.CTkLabel(self.images_frame, text=f"📷 {camera_name}")
@@ -549,10 +772,7 @@ class ObjectDetectionApp(ctk.CTk):
         self.image_widgets[camera_name] = []
         for idx, (image_path, timestamp) in enumerate(sorted(image_list.items(), key=lambda x: x[1], reverse=True)):
             try:
-                image_url = f"{SERVER_URL}/{image_path}?token={self.session_token}"
-                response = requests.get(image_url, timeout=5)
-                response.raise_for_status()
-                img = Image.open(io.BytesIO(response.content))
+                img = Image.open(io.BytesIO(self.image_cache.get(image_path, self.session_token)))
                 img_thumbnail = img.copy()
                 img_thumbnail.thumbnail((150, 150), Image.Resampling.LANCZOS)
                 img_tk = ctk.CTkImage(light_image=img_thumbnail, size=(150, 150))
@@ -594,7 +814,27 @@ class ObjectDetectionApp(ctk.CTk):
                 )
                 open_button.pack(side="left", padx=2)
 
-                viewed = False
+                clip_path = self.clips.get(camera_name, {}).get(image_path)
+                if clip_path:
+                    clip_button = ctk.CTkButton(
+                        button_frame,
+                        text="▶",
+                        width=20,
+                        height=20,
+                        fg_color="#555555",
+                        command=lambda p=clip_path: self.open_clip(p)
+                    )
+                    clip_button.pack(side="left", padx=2)
+
+                select_box = ctk.CTkCheckBox(button_frame, text="", width=20)
+                select_box.configure(
+                    command=lambda cn=camera_name, p=image_path, c=container, b=select_box: self.toggle_image_selection(
+                        cn, p, c, b.get()
+                    )
+                )
+                select_box.pack(side="right", padx=2)
+
+                viewed = image_path in self.viewed_images
                 if not viewed:
                     indicator = ctk.CTkLabel(container, text="●", text_color="red", font=("Arial", 12))
                     indicator.place(relx=0.9, rely=0.1)
@@ -606,10 +846,7 @@ class ObjectDetectionApp(ctk.CTk):
     # Открытие изображения в полноэкранном режиме
     def open_image_fullscreen(self, image_path):
         try:
-            image_url = f"{SERVER_URL}/{image_path}?token={self.session_token}"
-            response = requests.get(image_url, timeout=5)
-            response.raise_for_status()
-            img = Image.open(io.BytesIO(response.content))
+            img = Image.open(io.BytesIO(self.image_cache.get(image_path, self.session_token)))
 
             viewer_window = ctk.CTkToplevel(self)
             viewer_window.title("Просмотр изображения")
@@ -653,6 +890,46 @@ class ObjectDetectionApp(ctk.CTk):
         except requests.RequestException as e:
             tk.messagebox.showerror("Ошибка", f"Ошибка загрузки изображения: {e}")
 
+    # Воспроизведение клипа события (видео читается с сервера по частям через Range-запросы)
+    def open_clip(self, clip_path):
+        player_window = ctk.CTkToplevel(self)
+        player_window.title("Клип события")
+        player_window.geometry("800x600")
+        video_label = ctk.CTkLabel(player_window, text="Загрузка...")
+        video_label.pack(fill="both", expand=True)
+        close_button = ctk.CTkButton(player_window, text="Закрыть", command=player_window.destroy, width=100)
+        close_button.pack(pady=10)
+        player_window.transient(self)
+        player_window.focus_set()
+        threading.Thread(
+            target=self.play_clip,
+            args=(f"{SERVER_URL}/{clip_path}?token={self.session_token}", player_window, video_label),
+            daemon=True
+        ).start()
+
+    # Поток воспроизведения клипа
+    def play_clip(self, clip_url, player_window, video_label):
+        cap = cv2.VideoCapture(clip_url)
+        if not cap.isOpened():
+            self.after(0, lambda: video_label.configure(text="Не удалось открыть клип"))
+            return
+        fps = cap.get(cv2.CAP_PROP_FPS) or 10
+        try:
+            while self.running and player_window.winfo_exists():
+                ret, frame_cv = cap.read()
+                if not ret:
+                    break
+                img = Image.fromarray(cv2.cvtColor(frame_cv, cv2.COLOR_BGR2RGB))
+                img.thumbnail((780, 520), Image.Resampling.LANCZOS)
+                img_tk = ctk.CTkImage(light_image=img, size=img.size)
+                self.after(0, lambda i=img_tk: video_label.configure(text="", image=i))
+                video_label.image = img_tk
+                time.sleep(1 / fps)
+        except tk.TclError:
+            pass
+        finally:
+            cap.release()
+
     # Добавление нового снимка в интерфейс
     def append_image(self, camera_name, image_path, timestamp):
         if camera_name not in self.image_widgets or \
@@ -660,10 +937,7 @@ class ObjectDetectionApp(ctk.CTk):
             return
 
         try:
-            image_url = f"{SERVER_URL}/{image_path}?token={self.session_token}"
-            response = requests.get(image_url, timeout=5)
-            response.raise_for_status()
-            img = Image.open(io.BytesIO(response.content))
+            img = Image.open(io.BytesIO(self.image_cache.get(image_path, self.session_token)))
             img.thumbnail((150, 150), Image.Resampling.LANCZOS)
             img_tk = ctk.CTkImage(light_image=img, size=(150, 150))
 
@@ -714,6 +988,12 @@ class ObjectDetectionApp(ctk.CTk):
             )
             open_button.pack(side="left", padx=2)
 
+            select_box = ctk.CTkCheckBox(button_frame, text="", width=20)
+            select_box.configure(
+                command=lambda: self.toggle_image_selection(camera_name, image_path, container, select_box.get())
+            )
+            select_box.pack(side="right", padx=2)
+
             indicator = ctk.CTkLabel(container, text="●", text_color="red", font=("Arial", 12))
             indicator.place(relx=0.9, rely=0.1)
 
@@ -739,18 +1019,115 @@ class ObjectDetectionApp(ctk.CTk):
                 timeout=5
             )
             if response.status_code == 200:
+                self.remove_image_widgets({image_path: (camera_name, container)})
+            else:
+                tk.messagebox.showerror("Ошибка", response.json().get("error", "Неизвестная ошибка"))
+        except requests.RequestException as e:
+            tk.messagebox.showerror("Ошибка", f"Сетевая ошибка: {e}")
+
+    # Удаление виджетов снимков из галереи: images - {image_path: (camera_name, container)}
+    def remove_image_widgets(self, images):
+        for image_path, (camera_name, container) in images.items():
+            self.image_cache.discard(image_path)
+            self.selected_images.pop(image_path, None)
+            if camera_name in self.image_widgets:
                 self.image_widgets[camera_name] = [
                     (l, p, t, v) for l, p, t, v in self.image_widgets[camera_name] if p != image_path
                 ]
-                container.destroy()
-                self.new_images_count = sum(
-                    1 for cn in self.image_widgets for _, _, _, v in self.image_widgets[cn] if not v
-                )
-                self.update_notification()
-            else:
-                tk.messagebox.showerror("Ошибка", response.json().get("error", "Неизвестная ошибка"))
+            container.destroy()
+        self.new_images_count = sum(
+            1 for cn in self.image_widgets for _, _, _, v in self.image_widgets[cn] if not v
+        )
+        self.update_notification()
+
+    # Выбор снимка в галерее для пакетных действий
+    def toggle_image_selection(self, camera_name, image_path, container, selected):
+        if selected:
+            self.selected_images[image_path] = (camera_name, container)
+        else:
+            self.selected_images.pop(image_path, None)
+
+    # Выбор снимков для пакетных запросов: идентификаторы с сервера, пути - для снимков без идентификатора
+    # (не перенесенных в новую раскладку или добавленных в галерею после загрузки списка)
+    def capture_selection(self, image_paths):
+        ids = [self.capture_ids[path] for path in image_paths if self.capture_ids.get(path)]
+        paths = [path for path in image_paths if not self.capture_ids.get(path)]
+        return {"ids": ids, "paths": paths}
+
+    # Пакетный запрос к серверу по выбранным снимкам; None при ошибке
+    def post_selected_images(self, endpoint, stream=False, **params):
+        try:
+            response = requests.post(
+                f"{SERVER_URL}/{endpoint}",
+                json={
+                    "username": self.current_user,
+                    "token": self.session_token,
+                    **self.capture_selection(list(self.selected_images)),
+                    **params
+                },
+                stream=stream,
+                timeout=30
+            )
+            if response.status_code == 200:
+                return response
+            tk.messagebox.showerror("Ошибка", response.json().get("error", "Неизвестная ошибка"))
         except requests.RequestException as e:
             tk.messagebox.showerror("Ошибка", f"Сетевая ошибка: {e}")
+        return None
+
+    # Удаление выбранных снимков одним запросом
+    def delete_selected_images(self):
+        if not self.selected_images:
+            return
+        if not tk.messagebox.askyesno("Удаление", f"Удалить выбранные снимки ({len(self.selected_images)})?"):
+            return
+        response = self.post_selected_images("delete_captures")
+        if response is None:
+            return
+        # Из галереи убираются только снимки, которые сервер удалил
+        deleted = set(response.json().get("paths", []))
+        self.remove_image_widgets({path: image for path, image in self.selected_images.items() if path in deleted})
+        if self.selected_images:
+            tk.messagebox.showwarning("Удаление", f"Не удалось удалить снимков: {len(self.selected_images)}")
+
+    # Отметка выбранных снимков просмотренными одним запросом
+    def mark_selected_viewed(self):
+        if not self.selected_images:
+            return
+        response = self.post_selected_images("mark_captures_viewed", viewed=True)
+        if response is None:
+            return
+        updated = set(response.json().get("paths", []))
+        for image_path, (camera_name, _) in self.selected_images.items():
+            if image_path not in updated:
+                continue
+            self.viewed_images.add(image_path)
+            for i, (label, path, timestamp, viewed) in enumerate(self.image_widgets.get(camera_name, [])):
+                if path == image_path and not viewed:
+                    self.image_widgets[camera_name][i] = (label, path, timestamp, True)
+                    self.new_images_count -= 1
+                    for child in label.master.winfo_children():
+                        if isinstance(child, ctk.CTkLabel) and child.cget("text") == "●":
+                            child.destroy()
+        self.update_notification()
+
+    # Экспорт выбранных снимков в ZIP-архив с manifest.json; архив записывается на диск по мере загрузки
+    def export_selected_images(self):
+        if not self.selected_images:
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".zip", filetypes=[("ZIP", "*.zip")])
+        if not file_path:
+            return
+        response = self.post_selected_images("export_captures", stream=True, format="zip")
+        if response is None:
+            return
+        try:
+            with response, open(file_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+            tk.messagebox.showinfo("Экспорт", f"Снимки сохранены в {file_path}")
+        except (requests.RequestException, OSError) as e:
+            tk.messagebox.showerror("Ошибка", f"Ошибка экспорта: {e}")
 
     # Отметка изображения как просмотренного
     def mark_image_viewed(self, camera_name, image_path):
@@ -762,6 +1139,19 @@ class ObjectDetectionApp(ctk.CTk):
                     if isinstance(child, ctk.CTkLabel) and child.cget("text") == "●":
                         child.destroy()
                 self.update_notification()
+                self.viewed_images.add(image_path)
+                try:
+                    requests.post(
+                        f"{SERVER_URL}/mark_captures_viewed",
+                        json={
+                            "username": self.current_user,
+                            "token": self.session_token,
+                            **self.capture_selection([image_path])
+                        },
+                        timeout=5
+                    )
+                except requests.RequestException as e:
+                    logger.warning(f"Ошибка отметки снимка {image_path}: {e}")
                 self.open_image_fullscreen(image_path)
                 break
 
@@ -803,9 +1193,26 @@ class ObjectDetectionApp(ctk.CTk):
         admin_tabview.pack(fill="both", expand=True)
 
         users_tab = admin_tabview.add("Пользователи")
+        # Поиск и переход между страницами списка пользователей
+        users_control_frame = ctk.CTkFrame(users_tab)
+        users_control_frame.pack(fill="x", padx=5, pady=5)
+        self.users_search = ctk.CTkEntry(users_control_frame, placeholder_text="Поиск по имени")
+        self.users_search.pack(side="left", fill="x", expand=True, padx=5)
+        self.users_search.bind("<Return>", lambda e: self.load_users(1))
+        ctk.CTkButton(users_control_frame, text="Найти", width=80, command=lambda: self.load_users(1)).pack(
+            side="left", padx=5
+        )
+        ctk.CTkButton(users_control_frame, text="→", width=30, command=lambda: self.load_users(self.users_page + 1)).pack(
+            side="right", padx=5
+        )
+        self.users_page_label = ctk.CTkLabel(users_control_frame, text="")
+        self.users_page_label.pack(side="right", padx=5)
+        ctk.CTkButton(users_control_frame, text="←", width=30, command=lambda: self.load_users(self.users_page - 1)).pack(
+            side="right", padx=5
+        )
         self.users_frame = ctk.CTkScrollableFrame(users_tab)
         self.users_frame.pack(fill="both", expand=True, padx=5, pady=5)
-        self.load_users()
+        self.load_users(1)
 
         logs_tab = admin_tabview.add("Логи")
         self.logs_frame = ctk.CTkScrollableFrame(logs_tab)
@@ -813,23 +1220,50 @@ class ObjectDetectionApp(ctk.CTk):
         self.load_logs()
 
     # Загрузка списка пользователей
-    def load_users(self):
-        for widget in self.users_frame.winfo_children():
-            widget.destroy()
+    def load_users(self, page=None):
+        page = max(page or self.users_page, 1)
         try:
             response = requests.get(
                 f"{SERVER_URL}/admin/users",
-                params={"token": self.session_token},
+                params={
+                    "token": self.session_token,
+                    "search": self.users_search.get().strip(),
+                    "page": page,
+                    "per_page": USERS_PAGE_SIZE
+                },
                 timeout=5
             )
             if response.status_code == 200:
-                users = response.json().get("users", {})
-                for username, data in users.items():
+                result = response.json()
+                pages = max(1, -(-result["total"] // USERS_PAGE_SIZE))
+                if page > pages and result["users"] == [] and result["total"]:
+                    self.load_users(pages)
+                    return
+                self.users_page = page = min(page, pages)
+                self.users_page_label.configure(text=f"{page} / {pages} (всего {result['total']})")
+                for widget in self.users_frame.winfo_children():
+                    widget.destroy()
+                for data in result["users"]:
+                    username = data["username"]
                     user_frame = ctk.CTkFrame(self.users_frame)
                     user_frame.pack(fill="x", pady=5, padx=5)
 
+                    ctk.CTkLabel(
+                        user_frame,
+                        text="●" if data["online"] else "○",
+                        text_color="green" if data["online"] else "gray"
+                    ).pack(side="left", padx=5)
                     ctk.CTkLabel(user_frame, text=f"Пользователь: {username}").pack(side="left", padx=5)
                     ctk.CTkLabel(user_frame, text=f"Роль: {data['role']}").pack(side="left", padx=5)
+                    last_activity = (
+                        datetime.fromtimestamp(data["last_activity"]).strftime("%Y-%m-%d %H:%M")
+                        if data["last_activity"] else "—"
+                    )
+                    ctk.CTkLabel(
+                        user_frame,
+                        text=f"Камеры: {data['camera_count']}  Снимки: {data['capture_count']}  "
+                             f"Занято: {data['disk_bytes'] / 1e6:.1f} МБ  Активность: {last_activity}"
+                    ).pack(side="left", padx=5)
 
                     ctk.CTkButton(
                         user_frame,
@@ -977,7 +1411,7 @@ class ObjectDetectionApp(ctk.CTk):
 
         self.settings_frame = ctk.CTkToplevel(self)
         self.settings_frame.title("Настройки")
-        self.settings_frame.geometry("600x600")
+        self.settings_frame.geometry("800x600")
         self.settings_frame.transient(self)
         self.settings_frame.grab_set()
 
@@ -1000,7 +1434,8 @@ class ObjectDetectionApp(ctk.CTk):
             )
             if response.status_code == 200:
                 cameras = response.json().get("cameras", {})
-                for name, url in cameras.items():
+                for name, camera in cameras.items():
+                    url = camera.get("url") if isinstance(camera, dict) else camera
                     camera_frame = ctk.CTkFrame(cameras_frame)
                     camera_frame.pack(fill="x", pady=5, padx=5)
                     ctk.CTkLabel(camera_frame, text=f"{name}: {url}").pack(side="left", padx=5)
@@ -1012,6 +1447,13 @@ class ObjectDetectionApp(ctk.CTk):
                         command=lambda n=name: self.delete_camera(n),
                         width=100
                     ).pack(side="right", padx=5)
+                    zones = camera.get("zones", []) if isinstance(camera, dict) else []
+                    ctk.CTkButton(
+                        camera_frame,
+                        text="Зоны",
+                        command=lambda n=name, z=zones: self.open_zone_editor(n, z),
+                        width=80
+                    ).pack(side="right", padx=5)
             else:
                 tk.messagebox.showerror("Ошибка", response.json().get("error", "Неизвестная ошибка"))
         except requests.RequestException as e:
@@ -1036,14 +1478,11 @@ class ObjectDetectionApp(ctk.CTk):
         grid_frame = ctk.CTkFrame(detection_frame)
         grid_frame.pack(fill="both", expand=True, padx=5, pady=5)
 
-        detection_classes = {
-            "0": "Человек", "2": "Машина", "16": "Собака", "15": "Кот", "1": "Велосипед",
-            "3": "Мотоцикл", "14": "Птица", "24": "Рюкзак", "25": "Зонт", "26": "Сумка"
-        }
+        detection_classes = DETECTION_CLASSES
 
         detection_vars = {}
 
-        headers = ["Объект", "Распознавать", "Уведомлять"]
+        headers = ["Объект", "Распознавать", "Уведомлять", "Порог", "Мин. площадь %", "Кадров подряд"]
         for col, header in enumerate(headers):
             ctk.CTkLabel(
                 grid_frame,
@@ -1052,7 +1491,7 @@ class ObjectDetectionApp(ctk.CTk):
             ).grid(row=0, column=col, padx=10, pady=5, sticky="w")
 
         separator = ctk.CTkFrame(grid_frame, height=2, fg_color="#666666")
-        separator.grid(row=1, column=0, columnspan=3, sticky="ew", pady=5)
+        separator.grid(row=1, column=0, columnspan=6, sticky="ew", pady=5)
 
         for row, (class_id, class_name) in enumerate(detection_classes.items(), start=2):
             detect_var = ctk.BooleanVar(
@@ -1061,7 +1500,23 @@ class ObjectDetectionApp(ctk.CTk):
             notify_var = ctk.BooleanVar(
                 value=self.detection_settings.get(class_id, {}).get("notify", False)
             )
-            detection_vars[class_id] = {"detect": detect_var, "notify": notify_var}
+            class_settings = self.detection_settings.get(class_id, {})
+            confidence_entry = ctk.CTkEntry(grid_frame, width=60, placeholder_text="0.5")
+            if "confidence" in class_settings:
+                confidence_entry.insert(0, str(class_settings["confidence"]))
+            min_area_entry = ctk.CTkEntry(grid_frame, width=60, placeholder_text="0")
+            if "min_area" in class_settings:
+                min_area_entry.insert(0, f"{class_settings['min_area'] * 100:g}")
+            min_frames_entry = ctk.CTkEntry(grid_frame, width=60, placeholder_text="1")
+            if "min_frames" in class_settings:
+                min_frames_entry.insert(0, str(class_settings["min_frames"]))
+            detection_vars[class_id] = {
+                "detect": detect_var,
+                "notify": notify_var,
+                "confidence": confidence_entry,
+                "min_area": min_area_entry,
+                "min_frames": min_frames_entry
+            }
 
             ctk.CTkLabel(
                 grid_frame,
@@ -1083,6 +1538,10 @@ class ObjectDetectionApp(ctk.CTk):
                 width=20
             ).grid(row=row, column=2, padx=10, pady=5)
 
+            confidence_entry.grid(row=row, column=3, padx=5, pady=5)
+            min_area_entry.grid(row=row, column=4, padx=5, pady=5)
+            min_frames_entry.grid(row=row, column=5, padx=5, pady=5)
+
         grid_frame.grid_columnconfigure(0, weight=1)
         grid_frame.grid_columnconfigure(1, weight=0)
         grid_frame.grid_columnconfigure(2, weight=0)
@@ -1094,6 +1553,16 @@ class ObjectDetectionApp(ctk.CTk):
                     "detect": vars["detect"].get(),
                     "notify": vars["notify"].get()
                 }
+                try:
+                    if vars["confidence"].get().strip():
+                        new_settings[class_id]["confidence"] = float(vars["confidence"].get())
+                    if vars["min_area"].get().strip():
+                        new_settings[class_id]["min_area"] = float(vars["min_area"].get()) / 100
+                    if vars["min_frames"].get().strip():
+                        new_settings[class_id]["min_frames"] = int(vars["min_frames"].get())
+                except ValueError:
+                    tk.messagebox.showerror("Ошибка", f"Пороги класса {detection_classes[class_id]} должны быть числами")
+                    return
             try:
                 response = requests.post(
                     f"{SERVER_URL}/update_detection_settings",
@@ -1223,6 +1692,111 @@ class ObjectDetectionApp(ctk.CTk):
         except requests.RequestException as e:
             tk.messagebox.showerror("Ошибка", f"Сетевая ошибка: {e}")
 
+    # Один кадр видеопотока камеры (для редактора зон)
+    def fetch_camera_frame(self, name):
+        url = f"{SERVER_URL}/video_feed?username={self.current_user}&camera_name={name}&token={self.session_token}"
+        with requests.get(url, stream=True, timeout=10) as stream:
+            if stream.status_code != 200:
+                return None
+            bytes_data = bytes()
+            for chunk in stream.iter_content(chunk_size=4096):
+                bytes_data += chunk
+                a = bytes_data.find(b'\xff\xd8')
+                b = bytes_data.find(b'\xff\xd9', a + 2)
+                if a != -1 and b != -1:
+                    return Image.open(io.BytesIO(bytes_data[a:b + 2]))
+        return None
+
+    # Редактор зон распознавания: щелчки по кадру добавляют точки зоны, "Замкнуть зону" сохраняет ее.
+    # Координаты хранятся долями ширины и высоты кадра.
+    def open_zone_editor(self, name, zones):
+        try:
+            image = self.fetch_camera_frame(name)
+        except requests.RequestException as e:
+            tk.messagebox.showerror("Ошибка", f"Сетевая ошибка: {e}")
+            return
+        if image is None:
+            tk.messagebox.showerror("Ошибка", f"Не удалось получить кадр камеры {name}")
+            return
+        window = ctk.CTkToplevel(self)
+        window.title(f"Зоны камеры {name}")
+        window.transient(self)
+        window.grab_set()
+
+        scale = min(1, 800 / image.width, 450 / image.height)
+        width, height = int(image.width * scale), int(image.height * scale)
+        photo = ImageTk.PhotoImage(image.resize((width, height), Image.Resampling.BILINEAR))
+        canvas = tk.Canvas(window, width=width, height=height, highlightthickness=0)
+        canvas.pack(padx=10, pady=10)
+        canvas.create_image(0, 0, anchor="nw", image=photo)
+        canvas.image = photo
+
+        zones = [dict(zone) for zone in zones]
+        current = []
+        zone_type = ctk.StringVar(value="include")
+        colors = {"include": "#00FF00", "exclude": "#FF0000"}
+
+        def redraw():
+            canvas.delete("zone")
+            for zone in zones:
+                points = [value for x, y in zone["points"] for value in (x * width, y * height)]
+                canvas.create_polygon(points, outline=colors[zone["type"]], fill="", width=2, tags="zone")
+            for x, y in current:
+                canvas.create_oval(x * width - 3, y * height - 3, x * width + 3, y * height + 3,
+                                   fill=colors[zone_type.get()], tags="zone")
+            if len(current) > 1:
+                points = [value for x, y in current for value in (x * width, y * height)]
+                canvas.create_line(points, fill=colors[zone_type.get()], width=2, tags="zone")
+
+        def add_point(event):
+            current.append([round(event.x / width, 4), round(event.y / height, 4)])
+            redraw()
+
+        def close_zone():
+            if len(current) < 3:
+                tk.messagebox.showerror("Ошибка", "Зона должна содержать не менее трех точек")
+                return
+            zones.append({"type": zone_type.get(), "points": list(current)})
+            current.clear()
+            redraw()
+
+        def clear_zones():
+            zones.clear()
+            current.clear()
+            redraw()
+
+        def save_zones():
+            try:
+                response = requests.post(
+                    f"{SERVER_URL}/update_camera_zones",
+                    json={
+                        "username": self.current_user,
+                        "name": name,
+                        "zones": zones,
+                        "token": self.session_token
+                    },
+                    timeout=5
+                )
+                if response.status_code == 200:
+                    tk.messagebox.showinfo("Успех", f"Зоны камеры {name} сохранены")
+                    window.destroy()
+                else:
+                    tk.messagebox.showerror("Ошибка", response.json().get("error", "Неизвестная ошибка"))
+            except requests.RequestException as e:
+                tk.messagebox.showerror("Ошибка", f"Сетевая ошибка: {e}")
+
+        canvas.bind("<Button-1>", add_point)
+        controls = ctk.CTkFrame(window)
+        controls.pack(fill="x", padx=10, pady=(0, 10))
+        ctk.CTkLabel(controls, text="Тип зоны:").pack(side="left", padx=5)
+        ctk.CTkOptionMenu(
+            controls, values=["include", "exclude"], variable=zone_type, width=100, command=lambda _: redraw()
+        ).pack(side="left", padx=5)
+        ctk.CTkButton(controls, text="Замкнуть зону", command=close_zone, width=110).pack(side="left", padx=5)
+        ctk.CTkButton(controls, text="Очистить", command=clear_zones, width=90).pack(side="left", padx=5)
+        ctk.CTkButton(controls, text="Сохранить", command=save_zones, width=90).pack(side="right", padx=5)
+        redraw()
+
     # Удаление камеры
     def delete_camera(self, name):
         try:
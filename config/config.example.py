@@ -15,5 +15,146 @@ FLASK_PORT = 5001
 # Токен Telegram-бота для авторизации
 BOT_TOKEN = "YOUR_BOT_TOKEN_HERE"  # Замените на реальный токен
 
+# Адрес Telegram Bot API (для проверки на локальной имитации: scripts/fake_telegram_api.py)
+BOT_API_BASE_URL = "https://api.telegram.org"
+
 # Допустимые расширения файлов изображений
-ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg'} 
\ No newline at end of file
+ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+
+# Параметры захвата видео по умолчанию (могут быть переопределены в записи камеры)
+# Транспорт RTSP: "tcp" или "udp"
+CAPTURE_TRANSPORT = "tcp"
+
+# Количество потоков декодера FFmpeg на камеру (0 - выбор OpenCV)
+CAPTURE_THREADS = 2
+
+# Ширина кадра для распознавания (0 - без уменьшения). Кадр уменьшается после декодирования в полном
+# разрешении: экономится время распознавания, но не декодирования (для него - подпоток detect_url)
+CAPTURE_DECODE_WIDTH = 0
+
+# Параметры HTTP-сервера для production-запуска (run_production.py)
+# Адрес для прослушивания
+HTTP_HOST = "0.0.0.0"
+
+# Размер пула потоков для REST-маршрутов Flask
+HTTP_THREADS = 16
+
+# Максимальное число одновременных соединений (None - без ограничения)
+HTTP_LIMIT_CONCURRENCY = 1000
+
+# Таймаут keep-alive соединений (с)
+HTTP_KEEPALIVE_TIMEOUT = 5
+
+# Время на корректное завершение запросов при остановке (с)
+HTTP_SHUTDOWN_TIMEOUT = 30
+
+# Где работают камеры: "inprocess" - в процессе сервера (камеры пользователя запускаются при входе),
+# "external" - в отдельных процессах camera_worker.py (все камеры всех пользователей)
+CAMERA_RUNTIME = "inprocess"
+
+# Файл индекса снимков SQLite (общий для сервера и camera_worker)
+CAPTURE_DB_FILE = "captures.db"
+
+# Адрес и порт по умолчанию серверов кадров camera_worker (для нескольких процессов задайте --port)
+WORKER_HOST = "127.0.0.1"
+WORKER_BASE_PORT = 5100
+
+# Период heartbeat и проверки изменений users.json процессами camera_worker (с)
+WORKER_SYNC_INTERVAL = 2
+
+# Узел считается выбывшим, если heartbeat не приходил дольше (с); его камеры переходят к другим узлам
+WORKER_HEARTBEAT_TIMEOUT = 10
+
+# Как зритель получает поток с узла-владельца камеры: "proxy" - через сервер, "redirect" - перенаправлением
+WORKER_STREAM_MODE = "proxy"
+
+# Общий секрет для подписи ссылок на потоки кадров camera_worker
+WORKER_SECRET = "change-me-worker-secret"
+
+# Запись клипов событий: кадры за CLIP_PRE_SECONDS до обнаружения и CLIP_POST_SECONDS после последнего
+CLIP_RECORDING = True
+CLIP_PRE_SECONDS = 5
+CLIP_POST_SECONDS = 5
+
+# Максимальная длительность одного клипа (с)
+CLIP_MAX_SECONDS = 60
+
+# Частота кадров и качество JPEG кадров в буфере клипа (память на камеру ~ CLIP_PRE_SECONDS * CLIP_FPS кадров)
+CLIP_FPS = 10
+CLIP_JPEG_QUALITY = 80
+
+# Кодек (FourCC) и контейнер клипов, число потоков записи клипов
+CLIP_CODEC = "mp4v"
+CLIP_EXTENSION = ".mp4"
+CLIP_WRITERS = 1
+
+# Непрерывная запись камер с параметром "record": исполняемый файл FFmpeg, длина сегмента (с)
+# и контейнер сегментов ("mp4" или "ts"; "ts" не повреждается при аварийной остановке)
+FFMPEG_BINARY = "ffmpeg"
+RECORDING_SEGMENT_SECONDS = 60
+RECORDING_FORMAT = "mp4"
+
+# Срок хранения сегментов записи по умолчанию (ч), 0 - без ограничения; задается и для отдельной камеры
+RECORDING_RETENTION_HOURS = 72
+
+# Очистка снимков (и клипов): период проверки (с) и ограничения по умолчанию, 0 - без ограничения.
+# Для пользователя задаются полем "retention" ({"max_age_days", "max_bytes"}), для камеры - ее параметрами.
+RETENTION_INTERVAL = 300
+RETENTION_MAX_AGE_DAYS = 0
+RETENTION_MAX_BYTES_PER_CAMERA = 0
+RETENTION_MAX_BYTES_PER_USER = 0
+
+# Снимки событий по умолчанию (для камеры задаются параметрами snapshot_*): формат "jpg" или "webp",
+# качество 1-100 и ограничение большей стороны в пикселях (0 - исходный размер)
+SNAPSHOT_FORMAT = "jpg"
+SNAPSHOT_QUALITY = 90
+SNAPSHOT_MAX_SIZE = 0
+
+# Потоки фоновой записи снимков и длина очереди записи
+SNAPSHOT_WRITERS = 2
+SNAPSHOT_MAX_PENDING = 64
+
+# Трекинг объектов: снимки и уведомления только при появлении нового объекта или его заметном смещении.
+# Порог IoU сопоставления, время жизни трека без обнаружений (с), кадров до подтверждения трека,
+# минимальная уверенность обнаружений ниже порога класса, которые только продлевают трек,
+# и смещение (доля диагонали рамки), считающееся изменением состояния
+TRACKING = True
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_MAX_AGE = 3
+TRACK_MIN_HITS = 2
+TRACK_LOW_CONFIDENCE = 0.1
+TRACK_MOVE_THRESHOLD = 0.5
+
+# Фильтр обнаружений по умолчанию (для класса задаются в detection_settings): минимальная уверенность,
+# минимальная площадь рамки (доля площади кадра) и число кадров подряд, после которого класс считается обнаруженным
+DETECTION_CONFIDENCE = 0.5
+DETECTION_MIN_AREA = 0
+DETECTION_MIN_FRAMES = 1
+
+# Очередь исходящих сообщений Telegram-бота: максимальная длина (при переполнении /send_image отвечает 503)
+# и время ожидания постановки сообщения в очередь цикла бота (с)
+BOT_OUTBOUND_QUEUE = 100
+BOT_ENQUEUE_TIMEOUT = 5
+
+# Ограничения отправки Telegram-бота: минимальный интервал между сообщениями в один чат (с),
+# общее число запросов в секунду, окно объединения снимков одного чата в медиагруппу (с)
+# и число повторов сообщения после ответа RetryAfter
+BOT_CHAT_INTERVAL = 1.0
+BOT_GLOBAL_RATE = 25
+BOT_MEDIA_GROUP_WINDOW = 2.0
+BOT_SEND_RETRIES = 3
+
+# Файл SQLite с привязками чатов Telegram-бота к кодам и интервал их проверки на сервере (с)
+BOT_DB_FILE = "bot.db"
+BOT_VERIFY_INTERVAL = 600
+
+# Отправка уведомлений боту: окно сбора уведомлений в один запрос /send_images (с)
+# и длина очереди уведомлений процесса (при переполнении уведомления отбрасываются)
+NOTIFY_BATCH_WINDOW = 0.5
+NOTIFY_MAX_PENDING = 256
+
+# Сессии пользователей: срок действия (с), период удаления истекших сессий (с)
+# и сохранение сессий в индексе снимков, чтобы вход не терялся при перезапуске сервера
+SESSION_TTL = 3600
+SESSION_SWEEP_INTERVAL = 300
+SESSION_PERSIST = False
@@ -0,0 +1,29 @@
+import os
+import sys
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+import uvicorn
+
+from config.config import (
+    SERVER_PORT, HTTP_HOST, HTTP_LIMIT_CONCURRENCY, HTTP_KEEPALIVE_TIMEOUT, HTTP_SHUTDOWN_TIMEOUT
+)
+
+# Production-запуск: uvicorn без отладчика и перезагрузчика.
+# Конкурентность HTTP обеспечивается циклом событий (стримы) и пулом потоков HTTP_THREADS (REST).
+# Процесс HTTP всегда один: users_db загружается каждым процессом при импорте, и save_db перезаписал бы
+# изменения других процессов. В режиме "external" камеры при этом обрабатывает camera_worker.py.
+if __name__ == "__main__":
+    uvicorn.run(
+        "server.asgi:app",
+        host=HTTP_HOST,
+        port=SERVER_PORT,
+        workers=1,
+        limit_concurrency=HTTP_LIMIT_CONCURRENCY,
+        timeout_keep_alive=HTTP_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=HTTP_SHUTDOWN_TIMEOUT,
+        access_log=False,
+        proxy_headers=True,
+    )
@@ -5,8 +5,12 @@ import sys
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(project_root)
 
+import uvicorn
+
 # Now we can import from the server directory
-from server.server import app
+from server.asgi import app
+from config.config import SERVER_PORT, HTTP_HOST
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    # Потоковые эндпоинты обслуживаются асинхронно, REST-маршруты Flask - в пуле потоков
+    uvicorn.run(app, host=HTTP_HOST, port=SERVER_PORT)
\ No newline at end of file
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import argparse
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import cv2
+from server.capture import normalize_camera, open_capture, read_frame
+
+# Замер процессорного времени декодирования (и распознавания) на локальном файле.
+# Пример: python scripts/bench_decode.py test_1080p.mp4 --threads 2 --width 640 --model yolov8n.pt
+
+
+# Прогон одного варианта: возвращает (кадров, CPU-секунд, секунд реального времени)
+def run(camera, frames, model):
+    cap = open_capture(camera)
+    if not cap.isOpened():
+        raise SystemExit(f"Не удалось открыть {camera['detect_url']}")
+    count = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    while count < frames:
+        success, frame = read_frame(cap, camera)
+        if not success:
+            break
+        if model is not None:
+            model(frame, verbose=False)
+        count += 1
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    cap.release()
+    return count, cpu, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение CPU на камеру до и после настройки декодера")
+    parser.add_argument("path", help="Локальный видеофайл (например, 1080p)")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--model", help="Путь к весам YOLO для замера вместе с распознаванием")
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        from ultralytics import YOLO
+        model = YOLO(args.model)
+
+    variants = [
+        ("до (по умолчанию, полный кадр)", normalize_camera({"url": args.path, "threads": 0, "decode_width": 0})),
+        ("после (потоки и уменьшение)",
+         normalize_camera({"url": args.path, "threads": args.threads, "decode_width": args.width})),
+    ]
+    for title, camera in variants:
+        count, cpu, wall = run(camera, args.frames, model)
+        if not count:
+            print(f"{title}: нет кадров")
+            continue
+        print(f"{title}: кадров={count}, CPU на кадр={cpu / count * 1000:.1f} мс, "
+              f"загрузка CPU={cpu / wall * 100:.0f}%, FPS={count / wall:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import sys
+import json
+import time
+import email
+import argparse
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Локальная имитация Telegram Bot API для проверки отправки уведомлений ботом без обращения к Telegram.
+# Отвечает на getMe, getUpdates, sendMessage, sendPhoto и sendMediaGroup, запоминает отправки и, если задан
+# --chat-interval, отвечает 429 с retry_after на сообщения в чат чаще этого интервала, как Telegram.
+# Список отправок: GET /calls. Бот подключается к имитации через BOT_API_BASE_URL = "http://127.0.0.1:<порт>".
+# Пример: python scripts/fake_telegram_api.py --port 8081 --chat-interval 1
+
+SEND_METHODS = ("sendMessage", "sendPhoto", "sendMediaGroup")
+
+
+# Поля запроса Bot API: multipart (с файлами), JSON или форма
+def parse_fields(content_type, body):
+    if content_type.startswith("multipart/"):
+        message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        fields = {}
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            if part.get_filename() is None:
+                fields[name] = part.get_payload(decode=True).decode()
+        return fields
+    if content_type.startswith("application/json"):
+        return json.loads(body or b"{}")
+    return {key: values[0] for key, values in urllib.parse.parse_qs(body.decode()).items()}
+
+
+class FakeTelegramAPI(ThreadingHTTPServer):
+    def __init__(self, address, chat_interval, retry_after):
+        super().__init__(address, FakeTelegramHandler)
+        self.chat_interval = chat_interval
+        self.retry_after = retry_after
+        self.calls = []  # [{time, method, chat_id, status, photos}]
+        self.last_sent = {}
+        self.lock = threading.Lock()
+
+    # Отправка в чат: 429, если предыдущая принятая отправка в этот чат была раньше chat_interval
+    def send(self, method, fields):
+        chat_id = str(fields.get("chat_id"))
+        photos = len(json.loads(fields.get("media", "[]"))) if method == "sendMediaGroup" else int(method == "sendPhoto")
+        now = time.time()
+        with self.lock:
+            if self.chat_interval and now - self.last_sent.get(chat_id, 0) < self.chat_interval:
+                self.calls.append({"time": now, "method": method, "chat_id": chat_id, "status": 429, "photos": photos})
+                return 429, {
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+            self.last_sent[chat_id] = now
+            self.calls.append({"time": now, "method": method, "chat_id": chat_id, "status": 200, "photos": photos})
+            message_id = len(self.calls)
+        message = {"message_id": message_id, "date": int(now), "chat": {"id": int(chat_id), "type": "private"}}
+        return 200, {"ok": True, "result": [message] * photos if method == "sendMediaGroup" else message}
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, result):
+        data = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/calls":
+            with self.server.lock:
+                self.reply(200, {"calls": list(self.server.calls)})
+        else:
+            self.reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+    # Запросы бота: /bot<token>/<метод>
+    def do_POST(self):
+        method = self.path.rsplit("/", 1)[-1]
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        fields = parse_fields(self.headers.get("Content-Type", ""), body)
+        if method == "getMe":
+            self.reply(200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}})
+        elif method == "getUpdates":
+            time.sleep(min(float(fields.get("timeout", 0) or 0), 1))
+            self.reply(200, {"ok": True, "result": []})
+        elif method in SEND_METHODS:
+            self.reply(*self.server.send(method, fields))
+        else:
+            self.reply(200, {"ok": True, "result": True})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Имитация Telegram Bot API для проверки отправки уведомлений")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chat-interval", type=float, default=0, help="Минимальный интервал отправок в чат (с), 0 - без 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429 (с)")
+    args = parser.parse_args()
+    server = FakeTelegramAPI((args.host, args.port), args.chat_interval, args.retry_after)
+    print(f"Имитация Bot API: http://{args.host}:{args.port}, интервал чата {args.chat_interval} с", file=sys.stderr)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
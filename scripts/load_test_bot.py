@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+
+import requests
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# Проверка ограничения скорости и объединения уведомлений бота на имитации Telegram Bot API.
+# 1. python scripts/fake_telegram_api.py --port 8081 --chat-interval 1
+# 2. Привязка тестовых чатов 1..N к коду load-test в базе бота: python scripts/load_test_bot.py --bind bot.db --chats 5
+# 3. Бот с BOT_API_BASE_URL = "http://127.0.0.1:8081" в config/config.py: python bot/bot.py. Сервер API при этом
+#    должен быть недоступен по SERVER_URL, иначе бот при запуске отзовет неизвестные серверу привязки.
+# 4. python scripts/load_test_bot.py --bot http://127.0.0.1:5001 --api http://127.0.0.1:8081 --messages 200 --chats 5
+# Скрипт отправляет пачку /send_image в несколько чатов, ждет, пока бот разошлет очередь, и сверяет отправки,
+# принятые имитацией, с принятыми ботом снимками. Код выхода 1, если снимки потеряны.
+
+PHOTO = b"\xff\xd8\xff\xd9"  # Минимальный JPEG: бот передает байты как есть
+CODE = "load-test"
+
+
+# Привязка чатов 1..chats к тестовому коду в базе бота (BOT_DB_FILE)
+def bind_chats(db_file, chats):
+    from bot.bot import ChatRegistry
+    registry = ChatRegistry(db_file)
+    for chat_id in range(1, chats + 1):
+        registry.bind(str(chat_id), CODE)
+    registry.close()
+    print(f"Привязано чатов в {db_file}: {chats}")
+
+
+def send(bot_url, index, chats):
+    response = requests.post(
+        f"{bot_url}/send_image",
+        data={"chat_id": str(index % chats + 1), "code": CODE, "caption": f"Снимок {index}"},
+        files={"photo": (f"{index}.jpg", PHOTO, "image/jpeg")},
+        timeout=30,
+    )
+    return response.status_code
+
+
+# Отправки имитации: принятые снимки, ответы 429 и наименьший интервал между принятыми отправками в один чат
+def summarize(calls):
+    accepted = [call for call in calls if call["status"] == 200]
+    intervals = []
+    last = {}
+    for call in sorted(accepted, key=lambda call: call["time"]):
+        if call["chat_id"] in last:
+            intervals.append(call["time"] - last[call["chat_id"]])
+        last[call["chat_id"]] = call["time"]
+    return {
+        "photos": sum(call["photos"] for call in accepted),
+        "requests": len(accepted),
+        "media_groups": sum(1 for call in accepted if call["method"] == "sendMediaGroup"),
+        "rate_limited": sum(1 for call in calls if call["status"] == 429),
+        "min_chat_interval": min(intervals) if intervals else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка отправки уведомлений ботом")
+    parser.add_argument("--bot", default="http://127.0.0.1:5001")
+    parser.add_argument("--api", default="http://127.0.0.1:8081", help="Адрес fake_telegram_api.py")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=120, help="Наибольшее время ожидания рассылки (с)")
+    parser.add_argument("--bind", metavar="BOT_DB_FILE", help="Только привязать тестовые чаты в базе бота и выйти")
+    args = parser.parse_args()
+
+    if args.bind:
+        bind_chats(args.bind, args.chats)
+        return
+
+    print(f"команда: {' '.join(sys.argv)}")
+    before = len(requests.get(f"{args.api}/calls", timeout=10).json()["calls"])
+    started = time.time()
+    with concurrent.futures.ThreadPoolExecutor(args.concurrency) as executor:
+        statuses = list(executor.map(lambda index: send(args.bot, index, args.chats), range(args.messages)))
+    queued = statuses.count(202)
+    print(f"отправлено боту={args.messages}  принято={queued}  отклонено (503)={statuses.count(503)}  "
+          f"прочие ответы={args.messages - queued - statuses.count(503)}  за {time.time() - started:.1f} с")
+
+    # Ожидание, пока число снимков у имитации не перестанет расти или не достигнет принятого ботом
+    deadline = time.time() + args.timeout
+    summary = None
+    while time.time() < deadline:
+        summary = summarize(requests.get(f"{args.api}/calls", timeout=10).json()["calls"][before:])
+        if summary["photos"] >= queued:
+            break
+        time.sleep(1)
+    print(f"доставлено снимков={summary['photos']}  запросов={summary['requests']}  "
+          f"медиагрупп={summary['media_groups']}  ответов 429={summary['rate_limited']}  "
+          f"мин. интервал в чат={summary['min_chat_interval'] or 0:.2f} с  за {time.time() - started:.1f} с")
+    if summary["photos"] < queued:
+        print(f"потеряно снимков: {queued - summary['photos']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
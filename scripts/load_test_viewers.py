@@ -0,0 +1,98 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import urllib.parse
+import urllib.request
+
+# Нагрузочный тест видеопотока: N одновременных зрителей /video_feed одной камеры.
+# Пример: python scripts/load_test_viewers.py --username user1 --password pass --camera cam1 --levels 10,50,200,500
+# Результаты сопоставимы только вместе с условиями запуска: скрипт печатает команду и параметры перед замерами,
+# а источник камеры, модель и сервер нужно указать вместе с выводом.
+
+FRAME_MARKER = b'--frame\r\nContent-Type: image/jpeg'
+
+
+# Получение токена через /login
+def login(server, username, password):
+    request = urllib.request.Request(
+        f"{server}/login",
+        data=json.dumps({"username": username, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())["token"]
+
+
+# Один зритель: читает поток и считает кадры и байты
+async def viewer(host, port, path, duration):
+    stats = {"frames": 0, "bytes": 0, "error": None}
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), 10)
+    except (OSError, asyncio.TimeoutError) as e:
+        stats["error"] = f"connect: {e}"
+        return stats
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), 10)
+        if b" 200 " not in status:
+            stats["error"] = status.decode(errors="replace").strip()
+            return stats
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        tail = b""
+        while loop.time() < deadline:
+            chunk = await asyncio.wait_for(reader.read(65536), max(0.1, deadline - loop.time()) + 5)
+            if not chunk:
+                break
+            data = tail + chunk
+            stats["frames"] += data.count(FRAME_MARKER)
+            stats["bytes"] += len(chunk)
+            tail = data[-len(FRAME_MARKER):]
+    except (OSError, asyncio.TimeoutError) as e:
+        stats["error"] = f"read: {e!r}"
+    finally:
+        writer.close()
+    return stats
+
+
+async def run_level(host, port, path, viewers, duration):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(viewer(host, port, path, duration) for _ in range(viewers)))
+    elapsed = time.perf_counter() - started
+    ok = [r for r in results if not r["error"] and r["frames"]]
+    fps = sorted(r["frames"] / duration for r in ok)
+    total_mb = sum(r["bytes"] for r in results) / 1e6
+    print(f"зрителей={viewers:4d}  успешно={len(ok):4d}  ошибок={viewers - len(ok):4d}  "
+          f"FPS на зрителя: ср={sum(fps) / len(fps) if fps else 0:5.1f} мин={fps[0] if fps else 0:5.1f}  "
+          f"трафик={total_mb / elapsed:6.1f} МБ/с")
+    errors = {r["error"] for r in results if r["error"]}
+    for error in list(errors)[:3]:
+        print(f"    {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест одновременных зрителей /video_feed")
+    parser.add_argument("--server", default="http://127.0.0.1:5000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--camera", required=True)
+    parser.add_argument("--levels", default="10,50,100,200")
+    parser.add_argument("--duration", type=float, default=15)
+    args = parser.parse_args()
+
+    print(f"команда: {' '.join(sys.argv)}")
+    print(f"сервер={args.server}  камера={args.camera}  уровни={args.levels}  длительность={args.duration} с  "
+          f"начало={time.strftime('%Y-%m-%d %H:%M:%S')}")
+    token = login(args.server, args.username, args.password)
+    url = urllib.parse.urlsplit(args.server)
+    query = urllib.parse.urlencode({"username": args.username, "camera_name": args.camera, "token": token})
+    path = f"/video_feed?{query}"
+    for level in (int(value) for value in args.levels.split(",")):
+        asyncio.run(run_level(url.hostname, url.port or 80, path, level, args.duration))
+
+
+if __name__ == "__main__":
+    main()
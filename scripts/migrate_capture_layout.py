@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from config.config import CAPTURE_DB_FILE
+from server.store import CaptureStore
+from server.layout import TIMESTAMP_FORMAT, CAPTURE_ID_PATTERN, format_capture_id, capture_path
+
+# Перенос снимков и клипов из плоской раскладки static/captures/<user>/<camera>/<время>.jpg
+# в каталоги по часам с идентификаторами снимков. Запускается из рабочего каталога сервера при остановленном сервере
+# и camera_worker. Повторный запуск продолжает прерванный перенос.
+# Пример: python scripts/migrate_capture_layout.py --dry-run
+
+
+# Идентификатор для старого файла: время в мс и первый свободный номер.
+# Порядок обхода постоянный, поэтому после сбоя тот же файл получает тот же идентификатор.
+def allocate_id(created, used):
+    ms = int(created * 1000)
+    sequence = 0
+    while format_capture_id(ms, sequence) in used:
+        sequence += 1
+        if sequence > 999:
+            ms, sequence = ms + 1, 0
+    capture_id = format_capture_id(ms, sequence)
+    used.add(capture_id)
+    return capture_id
+
+
+# Время клипа по старому имени файла
+def clip_started(path, default):
+    name = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return datetime.strptime(name, TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        return default
+
+
+# Файл уже в новой раскладке (клип, перенесенный вместе с предыдущей партией)
+def migrated(path):
+    return CAPTURE_ID_PATTERN.match(os.path.splitext(os.path.basename(path))[0]) is not None
+
+
+# Перемещение файла; уже перенесенный при прошлом запуске файл пропускается
+def move(old, new, dry_run):
+    if dry_run or old == new:
+        return True
+    if not os.path.exists(old):
+        return os.path.exists(new)
+    os.makedirs(os.path.dirname(new), exist_ok=True)
+    os.replace(old, new)
+    return True
+
+
+# Снимки, еще записанные в users.json (сервер с индексом ни разу не запускался), сначала переносятся в индекс
+def import_users_db(store, db_file, dry_run):
+    if not os.path.exists(db_file):
+        return 0
+    with open(db_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    # Старый формат: {"users": {...}, "captured_images": {username: {camera: {path: timestamp}}}}
+    captured_images = data.pop("captured_images", None)
+    if not captured_images:
+        return 0
+    count = sum(len(images) for cameras in captured_images.values() for images in cameras.values())
+    if dry_run:
+        return count
+    store.import_legacy(captured_images)
+    tmp_file = f"{db_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_file, db_file)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос снимков в раскладку ГГГГ/ММ/ДД/ЧЧ с идентификаторами")
+    parser.add_argument("--db", default=CAPTURE_DB_FILE, help="Файл индекса снимков")
+    parser.add_argument("--users", default="users.json", help="База пользователей (поле captured_images)")
+    parser.add_argument("--batch", type=int, default=500, help="Снимков в одной транзакции")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет перенесено")
+    args = parser.parse_args()
+
+    store = CaptureStore(args.db)
+    imported = import_users_db(store, args.users, args.dry_run)
+    if imported:
+        print(f"Снимков в {args.users}: {imported}")
+
+    used = store.capture_ids()
+    clips = {}
+    moved = missing = 0
+    while True:
+        rows = store.unmigrated_captures(args.batch)
+        if not rows:
+            break
+        moves = []
+        batch_clips = {}
+        for row in rows:
+            capture_id = allocate_id(row["created"], used)
+            path = capture_path(row["username"], row["camera"], capture_id)
+            if move(row["path"], path, args.dry_run):
+                moved += 1
+            else:
+                missing += 1
+            moves.append((row["id"], capture_id, path))
+            clip = row["clip"]
+            if clip and clip not in clips and not migrated(clip):
+                clip_id = allocate_id(clip_started(clip, row["created"]), used)
+                clips[clip] = capture_path(row["username"], row["camera"], clip_id, os.path.splitext(clip)[1])
+                move(clip, clips[clip], args.dry_run)
+                batch_clips[clip] = clips[clip]
+            if args.dry_run:
+                print(f"{row['path']} -> {path}")
+        if args.dry_run:
+            if len(rows) < args.batch:
+                break
+            # Без записи в индекс следующая выборка вернула бы те же строки
+            print("... (в режиме --dry-run показана только первая партия)")
+            break
+        store.move_captures(moves, batch_clips)
+        print(f"Перенесено снимков: {moved}, клипов: {len(clips)}")
+
+    print(f"Готово: снимков {moved}, клипов {len(clips)}, файлов не найдено {missing}")
+
+
+if __name__ == "__main__":
+    main()
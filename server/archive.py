@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import zipfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Размер блока чтения файла снимка (байт)
+CHUNK_SIZE = 64 * 1024
+
+
+# Приемник записей ZipFile без seek: zipfile пишет в него последовательно (размеры и CRC - в дескрипторах
+# данных после каждого файла), а генератор ответа забирает накопленные байты после каждого блока.
+class ZipSink:
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# Имя снимка в архиве: <камера>/<метка времени>_<имя файла>
+def archive_name(capture):
+    return f"{capture['camera']}/{capture['timestamp']}_{os.path.basename(capture['path'])}"
+
+
+# Потоковый ZIP без сжатия (JPEG уже сжат): файлы читаются с диска блоками по CHUNK_SIZE и сразу отдаются,
+# поэтому память не зависит от числа и размера снимков. Последним файлом идет manifest.json с метками
+# времени и обнаружениями снимков, попавших в архив; отсутствующие на диске файлы пропускаются.
+def stream_zip(captures):
+    sink = ZipSink()
+    manifest = []
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        for capture in captures:
+            try:
+                source = open(capture["path"], "rb")
+            except OSError as e:
+                logger.warning(f"Снимок {capture['path']} пропущен при экспорте: {e}")
+                continue
+            with source:
+                stat = os.fstat(source.fileno())
+                info = zipfile.ZipInfo(archive_name(capture), time.localtime(stat.st_mtime)[:6])
+                info.file_size = stat.st_size
+                with archive.open(info, "w") as target:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        yield sink.take()
+            manifest.append({
+                "file": info.filename,
+                "capture_id": capture["capture_id"],
+                "camera": capture["camera"],
+                "timestamp": capture["timestamp"],
+                "created": capture["created"],
+                "detections": capture.get("detections", []),
+            })
+            yield sink.take()
+        archive.writestr("manifest.json", json.dumps({"captures": manifest}, ensure_ascii=False, indent=2))
+    yield sink.take()
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import sqlite3
+import asyncio
+import contextlib
+from urllib.parse import urlsplit
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, RedirectResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from a2wsgi import WSGIMiddleware
+
+from config.config import HTTP_THREADS, CAMERA_RUNTIME, WORKER_STREAM_MODE, SESSION_SWEEP_INTERVAL
+from server.server import (
+    app as flask_app, logger, frame_hub, event_hub, supervisor, recording_supervisor, snapshot_writer,
+    start_recordings, retention_service, session_store, capture_store, check_session, stream_error, ensure_camera_running, camera_stream_url,
+    stream_text_part, stream_frame_part, STREAM_TIMEOUT
+)
+
+# Интервал служебных сообщений в потоке событий (с)
+EVENTS_KEEPALIVE = 15
+# Период проверки индекса снимков на новые записи от camera_worker (с)
+CAPTURE_POLL_INTERVAL = 1
+
+
+# Пересылка видеопотока от camera_worker, которому принадлежит камера.
+# Медленный зритель замедляет только чтение сокета; camera_worker при этом пропускает кадры.
+async def relay_frames(url, camera_name):
+    url = urlsplit(url)
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(url.hostname, url.port), 5)
+    except (OSError, asyncio.TimeoutError) as e:
+        logger.error(f"Нет соединения с camera_worker {url.netloc} для {camera_name}: {e}")
+        yield stream_text_part("Stream interrupted")
+        return
+    try:
+        writer.write(f"GET {url.path}?{url.query} HTTP/1.0\r\nHost: {url.netloc}\r\n\r\n".encode())
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), STREAM_TIMEOUT)
+        if b" 200 " not in status:
+            logger.error(f"camera_worker не отдает камеру {camera_name}: {status!r}")
+            yield stream_text_part("Camera is not running")
+            return
+        await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), STREAM_TIMEOUT)
+        while True:
+            chunk = await asyncio.wait_for(reader.read(65536), STREAM_TIMEOUT)
+            if not chunk:
+                break
+            yield chunk
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+        logger.error(f"Ошибка получения кадров от camera_worker для {camera_name}: {e!r}")
+        yield stream_text_part("Stream interrupted")
+    finally:
+        writer.close()
+
+
+# Рассылка событий о снимках, которые camera_worker записал в индекс
+async def watch_captures():
+    last_id = await asyncio.to_thread(capture_store.max_id)
+    while True:
+        await asyncio.sleep(CAPTURE_POLL_INTERVAL)
+        try:
+            rows = await asyncio.to_thread(capture_store.captures_since, last_id)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения индекса снимков: {e}")
+            continue
+        for row in rows:
+            last_id = row["id"]
+            event_hub.publish(row["username"], {
+                "id": row["capture_id"], "camera": row["camera"], "path": row["path"], "timestamp": row["timestamp"]
+            })
+
+
+# Видеопоток: кадры из общего конвейера камеры через асинхронную очередь.
+# Если камеры работают в camera_worker, поток пересылается от узла-владельца или зритель перенаправляется к нему.
+async def video_feed(request):
+    username = request.query_params.get("username")
+    camera_name = request.query_params.get("camera_name")
+    token = request.query_params.get("token")
+    if not token or check_session(token) != username:
+        logger.error(f"Недействительная сессия для {username}, токен: {token}")
+        return JSONResponse({"error": "Недействительная сессия"}, status_code=401)
+
+    logger.info(f"Запрос стрима для пользователя {username}, камера {camera_name}")
+    error = stream_error(username, camera_name)
+    if not error and CAMERA_RUNTIME != "inprocess":
+        url = await asyncio.to_thread(camera_stream_url, username, camera_name)
+        if not url:
+            logger.error(f"Нет живых camera_worker для камеры {camera_name}")
+            return JSONResponse({"error": "Нет доступных обработчиков камер"}, status_code=503)
+        if WORKER_STREAM_MODE == "redirect":
+            return RedirectResponse(url, status_code=307)
+        return StreamingResponse(relay_frames(url, camera_name),
+                                 media_type='multipart/x-mixed-replace; boundary=frame')
+    if not error:
+        await asyncio.to_thread(ensure_camera_running, username, camera_name)
+
+    async def frames():
+        if error:
+            yield stream_text_part(error)
+            return
+        key = (username, camera_name)
+        subscriber = frame_hub.subscribe_async(key)
+        try:
+            while True:
+                try:
+                    frame_bytes = await subscriber.get(STREAM_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.error(f"Нет кадров для {camera_name} в течение {STREAM_TIMEOUT} с")
+                    yield stream_text_part("Stream interrupted")
+                    break
+                yield stream_frame_part(frame_bytes)
+        finally:
+            frame_hub.unsubscribe(key, subscriber)
+            logger.info(f"Стрим для {camera_name} закрыт, пропущено кадров: {subscriber.dropped}")
+
+    return StreamingResponse(frames(), media_type='multipart/x-mixed-replace; boundary=frame')
+
+
+# Поток событий о новых снимках (Server-Sent Events)
+async def events(request):
+    username = request.query_params.get("username")
+    token = request.query_params.get("token")
+    if not token or check_session(token) != username:
+        logger.error(f"Недействительная сессия для событий {username}")
+        return JSONResponse({"error": "Недействительная сессия"}, status_code=401)
+
+    async def stream():
+        subscriber = event_hub.subscribe_async(username)
+        try:
+            while True:
+                try:
+                    event = await subscriber.get(EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: capture\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            event_hub.unsubscribe(username, subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# Жизненный цикл: при запуске начинается непрерывная запись камер, при остановке останавливаются потоки камер.
+# Если камеры работают в camera_worker, процесс только читает индекс снимков.
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    logger.info(f"HTTP-процесс {os.getpid()} запущен, потоков WSGI: {HTTP_THREADS}, камеры: {CAMERA_RUNTIME}")
+    watcher = asyncio.create_task(watch_captures()) if CAMERA_RUNTIME != "inprocess" else None
+    if CAMERA_RUNTIME == "inprocess":
+        await asyncio.to_thread(start_recordings)
+    retention_service.start()
+    session_store.start(SESSION_SWEEP_INTERVAL)
+    yield
+    retention_service.stop()
+    session_store.stop()
+    if watcher:
+        watcher.cancel()
+    await asyncio.to_thread(supervisor.stop_all)
+    await asyncio.to_thread(recording_supervisor.stop_all)
+    await asyncio.to_thread(snapshot_writer.join)
+
+
+# ASGI-приложение: потоковые эндпоинты асинхронные, остальные маршруты обслуживает Flask
+app = Starlette(routes=[
+    Route("/video_feed", video_feed),
+    Route("/events", events),
+    Mount("/", app=WSGIMiddleware(flask_app, workers=HTTP_THREADS)),
+], lifespan=lifespan)
@@ -0,0 +1,41 @@
+import threading
+
+
+# Обратные индексы кодов авторизации Telegram: code -> (username, chat_id) и username -> {code: chat_id}.
+# Изменение auth_codes в users_db и индекса выполняется под одной блокировкой (with index.lock),
+# поэтому другой запрос не увидит код в одном из них и не увидит в другом. Чтение - без блокировки.
+class AuthCodeIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._codes = {}
+        self._users = {}
+
+    # Полная перестройка по базе пользователей (при загрузке users.json)
+    def rebuild(self, users):
+        codes = {}
+        user_codes = {}
+        for username, user in list(users.items()):
+            for code, (_, chat_id) in list(user.get("auth_codes", {}).items()):
+                codes[code] = (username, chat_id)
+                user_codes.setdefault(username, {})[code] = chat_id
+        with self.lock:
+            self._codes, self._users = codes, user_codes
+
+    # Владелец кода и привязанный чат: (username, chat_id) или (None, None)
+    def owner(self, code):
+        return self._codes.get(code, (None, None))
+
+    # Привязанные чаты пользователя: ((code, chat_id), ...)
+    def recipients(self, username):
+        codes = self._users.get(username, {}).copy()
+        return tuple((code, chat_id) for code, chat_id in codes.items() if chat_id)
+
+    def set(self, username, code, chat_id):
+        with self.lock:
+            self._codes[code] = (username, chat_id)
+            self._users.setdefault(username, {})[code] = chat_id
+
+    def remove_user(self, username):
+        with self.lock:
+            for code in self._users.pop(username, {}):
+                self._codes.pop(code, None)
@@ -0,0 +1,96 @@
+import asyncio
+import queue
+import threading
+
+
+# Подписчик для асинхронного кода: очередь живет в цикле событий подписчика
+class AsyncSubscriber:
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    # Вызывается из потока производителя и никогда не блокирует его
+    def offer(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            pass  # Цикл событий уже закрыт
+
+    # При переполнении вытесняется самый старый элемент
+    def _put(self, item):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+# Подписчик для потоков (эндпоинты Flask)
+class SyncSubscriber:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+
+# Рассылка элементов (кадров, событий) подписчикам по ключу.
+# Производитель не ждет медленных подписчиков: у каждого своя ограниченная очередь.
+class Broadcaster:
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscribers = {}  # {key: set(subscriber)}
+
+    def has_subscribers(self, key):
+        return bool(self._subscribers.get(key))
+
+    def subscriber_count(self, key=None):
+        with self._lock:
+            if key is not None:
+                return len(self._subscribers.get(key, ()))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, key, item):
+        with self._lock:
+            subscribers = list(self._subscribers.get(key, ()))
+        for subscriber in subscribers:
+            subscriber.offer(item)
+
+    def _add(self, key, subscriber):
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(subscriber)
+        return subscriber
+
+    # Подписка из корутины (в текущем цикле событий)
+    def subscribe_async(self, key, maxsize=None):
+        loop = asyncio.get_running_loop()
+        return self._add(key, AsyncSubscriber(loop, maxsize or self.maxsize))
+
+    # Подписка из обычного потока
+    def subscribe(self, key, maxsize=None):
+        return self._add(key, SyncSubscriber(maxsize or self.maxsize))
+
+    def unsubscribe(self, key, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[key]
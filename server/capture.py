@@ -0,0 +1,164 @@
+import os
+import threading
+import cv2
+
+from config.config import (
+    CAPTURE_THREADS, CAPTURE_TRANSPORT, CAPTURE_DECODE_WIDTH, RECORDING_RETENTION_HOURS,
+    SNAPSHOT_FORMAT, SNAPSHOT_QUALITY, SNAPSHOT_MAX_SIZE
+)
+from server.snapshots import SNAPSHOT_FORMATS
+from server.zones import validate_zones
+
+# Допустимые параметры записи камеры (кроме url)
+CAMERA_OPTION_KEYS = (
+    "detect_url", "transport", "threads", "decode_width", "record", "retention_hours", "max_age_days", "max_bytes",
+    "snapshot_format", "snapshot_quality", "snapshot_max_size", "zones"
+)
+TRANSPORTS = ("tcp", "udp")
+
+# Таймауты открытия и чтения потока (мс)
+OPEN_TIMEOUT_MSEC = 20000
+READ_TIMEOUT_MSEC = 10000
+
+# Переменная окружения читается OpenCV в момент открытия потока,
+# поэтому установка и открытие выполняются под общей блокировкой
+_FFMPEG_ENV = "OPENCV_FFMPEG_CAPTURE_OPTIONS"
+_FFMPEG_ENV_LOCK = threading.Lock()
+
+
+# Значение параметра записи или значение по умолчанию
+def _option(record, key, default):
+    value = record.get(key)
+    return default if value is None or value == "" else value
+
+
+# Приведение записи камеры к словарю (старый формат - строка с URL)
+def normalize_camera(record):
+    if isinstance(record, str):
+        record = {"url": record}
+    camera = {
+        "url": record.get("url"),
+        "detect_url": record.get("detect_url") or record.get("url"),
+        "transport": record.get("transport") or CAPTURE_TRANSPORT,
+        "threads": int(_option(record, "threads", CAPTURE_THREADS)),
+        "decode_width": int(_option(record, "decode_width", CAPTURE_DECODE_WIDTH)),
+        "record": bool(record.get("record", False)),
+        "retention_hours": int(_option(record, "retention_hours", RECORDING_RETENTION_HOURS)),
+        "max_age_days": int(_option(record, "max_age_days", 0)),
+        "max_bytes": int(_option(record, "max_bytes", 0)),
+        "snapshot_format": _option(record, "snapshot_format", SNAPSHOT_FORMAT),
+        "snapshot_quality": int(_option(record, "snapshot_quality", SNAPSHOT_QUALITY)),
+        "snapshot_max_size": int(_option(record, "snapshot_max_size", SNAPSHOT_MAX_SIZE)),
+        "zones": record.get("zones") or [],
+    }
+    for key, value in record.items():
+        camera.setdefault(key, value)
+    return camera
+
+
+# Сборка записи камеры из данных запроса с проверкой параметров
+def build_camera_record(url, options):
+    if not url:
+        raise ValueError("URL камеры обязателен")
+    record = {"url": url}
+    for key in CAMERA_OPTION_KEYS:
+        value = options.get(key)
+        if value is None or value == "":
+            continue
+        if key == "transport":
+            if value not in TRANSPORTS:
+                raise ValueError(f"Недопустимый транспорт: {value}")
+        elif key == "zones":
+            value = validate_zones(value)
+        elif key == "snapshot_format":
+            if value not in SNAPSHOT_FORMATS:
+                raise ValueError(f"Недопустимый формат снимков: {value}")
+        elif key == "snapshot_quality":
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Параметр {key} должен быть целым числом")
+            if not 1 <= value <= 100:
+                raise ValueError(f"Параметр {key} должен быть от 1 до 100")
+        elif key == "record":
+            if isinstance(value, str):
+                value = value.lower() in ("1", "true", "yes", "on")
+            value = bool(value)
+        elif key in ("threads", "decode_width", "retention_hours", "max_age_days", "max_bytes", "snapshot_max_size"):
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Параметр {key} должен быть целым числом")
+            if value < 0:
+                raise ValueError(f"Параметр {key} не может быть отрицательным")
+        record[key] = value
+    return record
+
+
+# Проверка камер пользователя из запроса админа: {name: url или запись камеры} -> {name: запись камеры}
+def build_camera_records(cameras):
+    if not isinstance(cameras, dict):
+        raise ValueError("Камеры должны быть объектом {имя: камера}")
+    records = {}
+    for name, camera in cameras.items():
+        if isinstance(camera, str):
+            camera = {"url": camera}
+        if not isinstance(camera, dict):
+            raise ValueError(f"Недопустимая запись камеры {name}")
+        try:
+            records[name] = build_camera_record(camera.get("url"), camera)
+        except ValueError as e:
+            raise ValueError(f"Камера {name}: {e}")
+    return records
+
+
+# Параметры демультиплексора FFmpeg в формате OpenCV: "ключ;значение|ключ;значение".
+# OpenCV передает их в avformat_open_input, до контекста декодера они не доходят.
+def ffmpeg_options(camera, url):
+    options = []
+    if camera["transport"] and (url or "").startswith("rtsp"):
+        options.append(f"rtsp_transport;{camera['transport']}")
+    return "|".join(options)
+
+
+# Открытие потока камеры; число потоков декодера задается параметром открытия CAP_PROP_N_THREADS
+def open_capture(camera, url=None):
+    url = url or camera["detect_url"]
+    options = ffmpeg_options(camera, url)
+    params = [
+        cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT_MSEC,
+        cv2.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT_MSEC,
+    ]
+    if camera["threads"]:
+        params += [cv2.CAP_PROP_N_THREADS, camera["threads"]]
+    with _FFMPEG_ENV_LOCK:
+        previous = os.environ.get(_FFMPEG_ENV)
+        if options:
+            os.environ[_FFMPEG_ENV] = options
+        else:
+            os.environ.pop(_FFMPEG_ENV, None)
+        try:
+            cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG, params)
+        finally:
+            if previous is None:
+                os.environ.pop(_FFMPEG_ENV, None)
+            else:
+                os.environ[_FFMPEG_ENV] = previous
+    return cap
+
+
+# Уменьшение кадра до ширины width (0 - без уменьшения)
+def downscale(frame, width):
+    if width and frame.shape[1] > width:
+        height = int(frame.shape[0] * width / frame.shape[1])
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+# Чтение кадра с уменьшением до ширины decode_width. Кадр декодируется в полном разрешении, уменьшение
+# сокращает только работу распознавания и снимков; декодирование дешевле только на подпотоке detect_url.
+def read_frame(cap, camera):
+    success, frame = cap.read()
+    if not success:
+        return False, None
+    return True, downscale(frame, camera["decode_width"])
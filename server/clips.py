@@ -0,0 +1,163 @@
+import os
+import queue
+import logging
+import threading
+import collections
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Кольцевой буфер сжатых кадров за последние seconds секунд: [(timestamp, jpeg_bytes)]
+class FrameRing:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._frames = collections.deque()
+
+    def append(self, timestamp, jpeg):
+        self._frames.append((timestamp, jpeg))
+        while self._frames and timestamp - self._frames[0][0] > self.seconds:
+            self._frames.popleft()
+
+    def frames(self):
+        return list(self._frames)
+
+    def clear(self):
+        self._frames.clear()
+
+
+# Запись клипа вокруг события: pre секунд до первого обнаружения и post секунд после последнего.
+# Вызывается только из потока камеры; кодирование видео и запись файла выполняет ClipWriter.
+class ClipRecorder:
+    def __init__(self, writer, path_for, on_written, pre_seconds, post_seconds, max_seconds, fps, quality):
+        self.writer = writer
+        self.path_for = path_for
+        self.on_written = on_written
+        self.post_seconds = post_seconds
+        self.max_seconds = max_seconds
+        self.interval = 1 / fps
+        self.quality = quality
+        self.ring = FrameRing(pre_seconds)
+        self._last_frame = 0
+        self._clip = None  # {"path", "frames", "started", "end", "captures"}
+
+    # Кадр камеры: в клип или в буфер предыстории (с частотой fps)
+    def add_frame(self, frame, now):
+        if now - self._last_frame >= self.interval:
+            self._last_frame = now
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ret:
+                if self._clip:
+                    self._clip["frames"].append((now, buffer.tobytes()))
+                else:
+                    self.ring.append(now, buffer.tobytes())
+        if self._clip and now >= self._clip["end"]:
+            self._finish()
+
+    # Обнаружение объекта: начало клипа или продление текущего (не дольше max_seconds).
+    # Возвращает True, если начат новый клип.
+    def trigger(self, now):
+        if self._clip is None:
+            self._clip = {
+                "path": self.path_for(now),
+                "frames": self.ring.frames(),
+                "started": now,
+                "end": now + self.post_seconds,
+                "captures": [],
+            }
+            self.ring.clear()
+            return True
+        self._clip["end"] = min(now + self.post_seconds, self._clip["started"] + self.max_seconds)
+        return False
+
+    # Снимок, сделанный во время клипа, ссылается на этот клип
+    def attach(self, capture_path):
+        if self._clip:
+            self._clip["captures"].append(capture_path)
+
+    # Завершение камеры: недописанный клип отправляется на запись
+    def close(self):
+        if self._clip:
+            self._finish()
+
+    def _finish(self):
+        clip, self._clip = self._clip, None
+        for timestamp, jpeg in clip["frames"]:
+            self.ring.append(timestamp, jpeg)
+        captures = clip["captures"]
+        self.writer.submit(clip["path"], clip["frames"], lambda path: self.on_written(path, captures))
+
+
+# Фоновая запись клипов: очередь заданий и потоки, которые декодируют кадры и пишут видеофайл.
+# При переполнении очереди клип отбрасывается, поток камеры никогда не ждет запись.
+class ClipWriter:
+    def __init__(self, codec, workers=1, max_pending=8):
+        self.codec = codec
+        self.workers = workers
+        self._queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"clip-writer-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, path, frames, on_written):
+        if not frames:
+            return False
+        self._start()
+        try:
+            self._queue.put_nowait((path, frames, on_written))
+            return True
+        except queue.Full:
+            logger.warning(f"Очередь записи клипов переполнена, клип {path} пропущен")
+            return False
+
+    def _run(self):
+        while True:
+            path, frames, on_written = self._queue.get()
+            try:
+                if self.write(path, frames):
+                    on_written(path)
+            except Exception as e:
+                logger.error(f"Ошибка записи клипа {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    # Запись кадров в файл; частота кадров клипа - фактическая частота буфера
+    def write(self, path, frames):
+        first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+        if first is None:
+            logger.error(f"Не удалось декодировать кадры клипа {path}")
+            return False
+        height, width = first.shape[:2]
+        duration = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / duration if duration > 0 else 1
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        root, extension = os.path.splitext(path)
+        partial = f"{root}.part{extension}"
+        writer = cv2.VideoWriter(partial, cv2.VideoWriter_fourcc(*self.codec), fps, (width, height))
+        if not writer.isOpened():
+            logger.error(f"Не удалось открыть запись клипа {path} (кодек {self.codec})")
+            return False
+        try:
+            for _, jpeg in frames:
+                frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    continue
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                writer.write(frame)
+        finally:
+            writer.release()
+        os.replace(partial, path)
+        logger.info(f"Сохранен клип: {path} ({len(frames)} кадров, {duration:.1f} с)")
+        return True
@@ -0,0 +1,109 @@
+import collections
+
+import numpy as np
+
+from config.config import DETECTION_CONFIDENCE, DETECTION_MIN_AREA, DETECTION_MIN_FRAMES
+
+
+# Проверка настроек распознавания из запроса: {class_id: {"detect", "notify", "confidence", "min_area",
+# "min_frames"}}. Необязательные пороги проверяются по диапазону; возвращает настройки с приведенными типами.
+def validate_detection_settings(settings):
+    if not isinstance(settings, dict):
+        raise ValueError("Настройки распознавания должны быть объектом")
+    result = {}
+    for class_id, options in settings.items():
+        if not str(class_id).isdigit() or not isinstance(options, dict):
+            raise ValueError(f"Недопустимые настройки класса {class_id}")
+        entry = {"detect": bool(options.get("detect", False)), "notify": bool(options.get("notify", False))}
+        for key, cast, low, high in (
+            ("confidence", float, 0, 1), ("min_area", float, 0, 1), ("min_frames", int, 1, 1000)
+        ):
+            value = options.get(key)
+            if value is None or value == "":
+                continue
+            try:
+                value = cast(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Параметр {key} класса {class_id} должен быть числом")
+            if not low <= value <= high:
+                raise ValueError(f"Параметр {key} класса {class_id} должен быть от {low} до {high}")
+            entry[key] = value
+        result[str(class_id)] = entry
+    return result
+
+
+# Пороги классов в виде массивов, индексируемых номером класса: класс без "detect" имеет порог
+# уверенности выше 1 и не проходит фильтр
+def compile_thresholds(settings):
+    enabled = [int(class_id) for class_id, options in settings.items() if options.get("detect")]
+    size = max(enabled, default=-1) + 1
+    confidence = np.full(size, 2.0)
+    min_area = np.zeros(size)
+    min_frames = np.ones(size, dtype=int)
+    for class_id in enabled:
+        options = settings[str(class_id)]
+        confidence[class_id] = options.get("confidence", DETECTION_CONFIDENCE)
+        min_area[class_id] = options.get("min_area", DETECTION_MIN_AREA)
+        min_frames[class_id] = options.get("min_frames", DETECTION_MIN_FRAMES)
+    return confidence, min_area, min_frames
+
+
+# Скомпилированные правила распознавания пользователя. Объект не изменяется после создания:
+# при изменении настроек создается новый и подменяется целиком, поток камеры читает ссылку один раз за кадр.
+# notify - классы с уведомлением, recipients - ((code, chat_id), ...) привязанных чатов Telegram
+DetectionRules = collections.namedtuple(
+    "DetectionRules", ["confidence", "min_area", "min_frames", "notify", "recipients"]
+)
+
+
+def compile_rules(settings, recipients):
+    confidence, min_area, min_frames = compile_thresholds(settings)
+    for array in (confidence, min_area, min_frames):
+        array.flags.writeable = False
+    notify = frozenset(
+        int(class_id) for class_id, options in settings.items() if options.get("detect") and options.get("notify")
+    )
+    return DetectionRules(confidence, min_area, min_frames, notify, tuple(recipients))
+
+
+# Правила пользователя, для которого они еще не скомпилированы: ни один класс не проходит фильтр
+EMPTY_RULES = compile_rules({}, ())
+
+
+# Маска обнаружений, прошедших пороги своего класса: classes, confidences - (N,), boxes - (N, 4) в пикселях
+def filter_detections(classes, confidences, boxes, rules, frame_area):
+    confidence, min_area = rules.confidence, rules.min_area
+    if not len(confidence):
+        return np.zeros(len(classes), dtype=bool)
+    known = classes < len(confidence)
+    index = np.where(known, classes, 0)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return known & (confidences > confidence[index]) & (areas >= min_area[index] * frame_area)
+
+
+# Маска слабых обнаружений включенных классов: ниже порога класса, но не ниже low_confidence.
+# Такие рамки не создают событий, а только продлевают уже существующие треки.
+def weak_detections(classes, confidences, rules, keep, low_confidence):
+    confidence = rules.confidence
+    if not len(confidence):
+        return np.zeros(len(classes), dtype=bool)
+    known = classes < len(confidence)
+    enabled = known & (confidence[np.where(known, classes, 0)] <= 1)
+    return enabled & ~keep & (confidences >= low_confidence)
+
+
+# Устойчивость обнаружения: сколько кадров подряд встречается каждый класс
+class PersistenceCounter:
+    def __init__(self):
+        self.streaks = np.zeros(0, dtype=int)
+
+    # classes - классы, прошедшие фильтр в этом кадре; возвращает маску классов, встреченных
+    # не менее min_frames кадров подряд
+    def update(self, classes, min_frames):
+        classes = np.asarray(classes, dtype=int)
+        if len(self.streaks) < len(min_frames):
+            self.streaks = np.concatenate([self.streaks, np.zeros(len(min_frames) - len(self.streaks), dtype=int)])
+        present = np.zeros(len(self.streaks), dtype=bool)
+        present[classes] = True
+        self.streaks = np.where(present, self.streaks + 1, 0)
+        return self.streaks[classes] >= min_frames[classes]
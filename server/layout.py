@@ -0,0 +1,67 @@
+import os
+import re
+import time
+import secrets
+import threading
+from datetime import datetime
+
+# Корневой каталог снимков и клипов
+CAPTURES_ROOT = "static/captures"
+# Метка времени снимка в API (секундная точность, как в первой версии)
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
+# Идентификатор снимка: время в миллисекундах, номер в пределах миллисекунды и метка процесса
+# (у снимков, перенесенных из старой раскладки, метки нет)
+CAPTURE_ID_PATTERN = re.compile(r"^(\d{13})-(\d{3})(?:-([0-9a-f]{6}))?$")
+
+_sequence_lock = threading.Lock()
+_last_ms = 0
+_sequence = 0
+_node = None
+_node_pid = None
+
+
+def format_capture_id(ms, sequence, node=None):
+    capture_id = f"{ms:013d}-{sequence:03d}"
+    return f"{capture_id}-{node}" if node else capture_id
+
+
+# Новый идентификатор снимка "<миллисекунды>-<номер>-<метка процесса>". Номер растет при нескольких снимках
+# в одну миллисекунду, а случайная метка процесса (новая после fork) различает снимки процессов API
+# и camera_worker, сделанные в одну миллисекунду, - идентификаторы уникальны во всем индексе.
+def new_capture_id(now=None):
+    global _last_ms, _sequence, _node, _node_pid
+    ms = int((time.time() if now is None else now) * 1000)
+    with _sequence_lock:
+        if _node_pid != os.getpid():
+            _node, _node_pid = secrets.token_hex(3), os.getpid()
+        if ms <= _last_ms:
+            if _sequence < 999:
+                _sequence += 1
+            else:
+                _last_ms += 1
+                _sequence = 0
+            ms = _last_ms
+        else:
+            _last_ms = ms
+            _sequence = 0
+        return format_capture_id(ms, _sequence, _node)
+
+
+# Время снимка (Unix-время) по идентификатору; ValueError для чужого формата
+def capture_time(capture_id):
+    match = CAPTURE_ID_PATTERN.match(capture_id or "")
+    if not match:
+        raise ValueError(f"Недопустимый идентификатор снимка: {capture_id}")
+    return int(match.group(1)) / 1000
+
+
+# Путь файла по идентификатору без обращения к индексу:
+# static/captures/<user>/<camera>/ГГГГ/ММ/ДД/ЧЧ/<id><ext>
+def capture_path(username, camera_name, capture_id, extension=".jpg"):
+    shard = datetime.fromtimestamp(capture_time(capture_id)).strftime("%Y/%m/%d/%H")
+    return f"{CAPTURES_ROOT}/{username}/{camera_name}/{shard}/{capture_id}{extension}"
+
+
+# Метка времени снимка для API
+def capture_timestamp(capture_id):
+    return datetime.fromtimestamp(capture_time(capture_id)).strftime(TIMESTAMP_FORMAT)
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import queue
+import logging
+import mimetypes
+import threading
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Наибольшее число снимков в одном запросе к боту
+MAX_BATCH = 20
+
+
+# Фоновая отправка уведомлений боту. Уведомления всех камер процесса, накопленные за batch_window
+# секунд, уходят одним запросом /send_images через постоянное соединение; изображение снимка
+# передается один раз для всех его чатов. Поток камеры не ждет бота: при переполнении очереди
+# уведомление отбрасывается.
+class NotificationDispatcher:
+    def __init__(self, url, batch_window=0.5, max_pending=256, retries=3, timeout=10):
+        self.url = url
+        self.batch_window = batch_window
+        self.retries = retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+                self._thread.start()
+
+    # recipients - ((code, chat_id), ...); image - байты снимка
+    def submit(self, recipients, caption, filename, image):
+        if not recipients:
+            return False
+        self._start()
+        try:
+            self._queue.put_nowait((recipients, caption, filename, image))
+            return True
+        except queue.Full:
+            logger.warning(f"Очередь уведомлений переполнена, уведомление о {filename} пропущено")
+            return False
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.send(batch)
+            except Exception as e:
+                logger.error(f"Ошибка отправки уведомлений: {e}")
+
+    # Один запрос на пакет; повтор всего пакета только при сетевой ошибке или недоступности бота
+    def send(self, batch):
+        files = []
+        items = []
+        for index, (recipients, caption, filename, image) in enumerate(batch):
+            name = f"photo{index}"
+            content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            files.append((name, (os.path.basename(filename), image, content_type)))
+            for code, chat_id in recipients:
+                items.append({"chat_id": chat_id, "code": code, "caption": caption, "photo": name})
+        for attempt in range(self.retries):
+            try:
+                response = self.session.post(
+                    f"{self.url}/send_images",
+                    data={"items": json.dumps(items, ensure_ascii=False)},
+                    files=files,
+                    timeout=self.timeout
+                )
+                if response.status_code >= 500:
+                    raise requests.RequestException(f"HTTP {response.status_code}: {response.text}")
+                if response.status_code != 200:
+                    logger.error(f"Бот отклонил пакет уведомлений: HTTP {response.status_code}: {response.text}")
+                    return False
+                results = response.json().get("results", [])
+                failed = [result for result in results if result.get("status") != "queued"]
+                for result in failed:
+                    logger.error(f"Уведомление для chat_id={result.get('chat_id')} не принято: {result.get('error')}")
+                logger.info(f"Уведомлений отправлено боту: {len(results) - len(failed)} из {len(items)}")
+                return True
+            except (requests.RequestException, ValueError) as e:
+                logger.warning(f"Попытка {attempt + 1}/{self.retries} отправки уведомлений не удалась: {e}")
+                if attempt < self.retries - 1:
+                    time.sleep(2)
+        logger.error(f"Не удалось отправить уведомлений: {len(items)}")
+        return False
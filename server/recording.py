@@ -0,0 +1,120 @@
+import os
+import time
+import queue
+import logging
+import threading
+import subprocess
+import collections
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Имя сегмента - локальное время его начала
+SEGMENT_NAME_FORMAT = "%Y-%m-%d_%H-%M-%S"
+# Контейнеры сегментов: расширение файла -> формат FFmpeg
+SEGMENT_FORMATS = {"mp4": "mp4", "ts": "mpegts"}
+# Время на корректное завершение FFmpeg после остановки записи (с)
+STOP_TIMEOUT = 10
+
+
+# Команда FFmpeg: видеопоток камеры без перекодирования режется на сегменты фиксированной длины.
+# Завершенные сегменты FFmpeg сообщает в stdout строками "имя,начало,конец".
+def segment_command(ffmpeg, camera, output_dir, segment_seconds, extension):
+    url = camera["url"]
+    command = [ffmpeg, "-hide_banner", "-loglevel", "error"]
+    if camera.get("transport") and url.startswith("rtsp"):
+        command += ["-rtsp_transport", camera["transport"]]
+    if "://" not in url:
+        command += ["-re"]  # Видеофайл вместо камеры читается со скоростью воспроизведения
+    command += [
+        "-i", url,
+        "-map", "0:v:0",
+        "-c", "copy",
+        "-f", "segment",
+        "-segment_time", str(segment_seconds),
+        "-segment_format", SEGMENT_FORMATS[extension],
+        "-reset_timestamps", "1",
+        "-strftime", "1",
+        "-segment_list", "pipe:1",
+        "-segment_list_type", "csv",
+        os.path.join(output_dir, f"{SEGMENT_NAME_FORMAT}.{extension}"),
+    ]
+    return command
+
+
+# Время начала сегмента по имени файла
+def segment_started(path, default):
+    name = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return datetime.strptime(name, SEGMENT_NAME_FORMAT).timestamp()
+    except ValueError:
+        return default
+
+
+# Команда "q" - штатное завершение FFmpeg: текущий сегмент дописывается и попадает в список сегментов
+def _quit(process):
+    try:
+        process.stdin.write("q")
+        process.stdin.close()
+    except OSError:
+        process.terminate()
+
+
+def _pump(stream, put):
+    for line in stream:
+        put(line.strip())
+    put(None)
+
+
+# Непрерывная запись до stop_event; при обрыве потока FFmpeg перезапускается через retry_delay.
+# on_segment(path, started, duration, size) вызывается для каждого завершенного сегмента.
+def record_segments(command, output_dir, stop_event, on_segment, name, retry_delay=5):
+    while not stop_event.is_set():
+        os.makedirs(output_dir, exist_ok=True)
+        try:
+            process = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True, errors="replace"
+            )
+        except OSError as e:
+            logger.error(f"Не удалось запустить FFmpeg для записи {name}: {e}")
+            stop_event.wait(retry_delay)
+            continue
+        logger.info(f"Запущена непрерывная запись {name}")
+
+        lines = queue.Queue()
+        errors = collections.deque(maxlen=5)
+        threading.Thread(target=_pump, args=(process.stdout, lines.put), daemon=True).start()
+        threading.Thread(target=_pump, args=(process.stderr, errors.append), daemon=True).start()
+
+        stopping = None
+        while True:
+            try:
+                line = lines.get(timeout=1)
+            except queue.Empty:
+                if stop_event.is_set() and stopping is None:
+                    stopping = time.time()
+                    _quit(process)
+                elif stopping and time.time() - stopping > STOP_TIMEOUT:
+                    process.kill()
+                continue
+            if line is None:
+                break
+            if not line:
+                continue
+            filename, start, end = line.rsplit(",", 2)
+            path = os.path.join(output_dir, os.path.basename(filename)).replace("\\", "/")
+            if not os.path.exists(path):
+                continue
+            duration = float(end) - float(start)
+            try:
+                on_segment(path, segment_started(path, time.time() - duration), duration, os.path.getsize(path))
+            except Exception as e:
+                logger.error(f"Ошибка обработки сегмента {path}: {e}")
+
+        code = process.wait()
+        if not stop_event.is_set():
+            details = "; ".join(line for line in errors if line)
+            logger.warning(f"FFmpeg записи {name} завершился с кодом {code}: {details}")
+            stop_event.wait(retry_delay)
+    logger.info(f"Непрерывная запись {name} остановлена")
@@ -0,0 +1,125 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# Фоновое удаление старых снимков по ограничениям срока и объема.
+# camera_policy(username, camera_name) -> (max_age_days, max_bytes), user_policy(username) -> max_bytes;
+# 0 означает отсутствие ограничения. Занятое место берется из счетчиков индекса, дерево файлов не обходится.
+class RetentionService:
+    def __init__(self, store, camera_policy, user_policy, interval):
+        self.store = store
+        self.camera_policy = camera_policy
+        self.user_policy = user_policy
+        self.interval = interval
+        self.owner = f"{os.getpid()}-{id(self)}"
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # Один проход по всем пользователям; возвращает (удалено файлов, освобождено байт)
+    def run_once(self):
+        now = time.time()
+        files = []
+        freed = 0
+        for username, cameras in self.store.usage().items():
+            for camera_name, usage in cameras.items():
+                max_age_days, max_bytes = self.camera_policy(username, camera_name)
+                before = now - max_age_days * 86400 if max_age_days else None
+                excess = usage["capture_bytes"] - max_bytes if max_bytes else 0
+                if before or excess > 0:
+                    removed, size = self.store.trim_captures(username, camera_name, before=before, excess=excess)
+                    files += removed
+                    freed += size
+            max_user_bytes = self.user_policy(username)
+            if max_user_bytes:
+                total = sum(usage["capture_bytes"] for usage in self.store.usage(username).get(username, {}).values())
+                if total > max_user_bytes:
+                    removed, size = self.store.trim_captures(username, excess=total - max_user_bytes)
+                    files += removed
+                    freed += size
+        remove_files(files)
+        if files:
+            logger.info(f"Очистка снимков: удалено файлов {len(files)}, освобождено {freed / 1e6:.1f} МБ")
+        return len(files), freed
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if self.store.acquire_lease("retention", self.owner, self.interval * 2):
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"Ошибка очистки снимков: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+# Удаление файлов снимков и клипов; уже удаленные файлы пропускаются
+def remove_files(paths):
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Не удалось удалить файл {path}: {e}")
+    return removed
+
+
+# Фоновое удаление файлов после удаления строк из индекса: запрос не ждет файловую систему,
+# а файлы нескольких запросов, накопившиеся в очереди, удаляются одним проходом.
+class FileRemover:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def remove(self, paths):
+        if not paths:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="file-remover", daemon=True)
+                self._thread.start()
+        self._queue.put(list(paths))
+
+    def _run(self):
+        while True:
+            paths = self._queue.get()
+            while True:
+                try:
+                    paths += self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            removed = remove_files(paths)
+            logger.info(f"Удалено файлов снимков: {removed} из {len(paths)}")
+
+
+# Проверка ограничений хранения пользователя из запроса админа: {"max_age_days": int, "max_bytes": int}
+def build_retention_policy(options):
+    if not isinstance(options, dict):
+        raise ValueError("Ограничения хранения должны быть объектом")
+    policy = {}
+    for key in ("max_age_days", "max_bytes"):
+        value = options.get(key)
+        if value is None or value == "":
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Параметр {key} должен быть целым числом")
+        if value < 0:
+            raise ValueError(f"Параметр {key} не может быть отрицательным")
+        policy[key] = value
+    return policy
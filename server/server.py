@@ -1,9 +1,11 @@
 import os
 import sys
+import sqlite3
 import cv2
-from flask import Flask, Response, request, jsonify, send_file, render_template, redirect, url_for
+from flask import Flask, Response, request, jsonify, send_file, render_template, redirect, url_for, g
 from ultralytics import YOLO
 import threading
+import functools
 import json
 import hashlib
 from datetime import datetime
@@ -11,12 +13,43 @@ import logging
 import requests
 import time
 import shutil
+import queue
+from urllib.parse import urlencode
 
 # Add the project root directory to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-sys.path.append(project_root)
-
-from config.config import SERVER_PORT, BOT_SERVER_URL, ALLOWED_EXTENSIONS
+sys.path.insert(0, project_root)
+
+from config.config import (
+    SERVER_PORT, BOT_SERVER_URL, ALLOWED_EXTENSIONS, CAMERA_RUNTIME, CAPTURE_DB_FILE,
+    WORKER_HEARTBEAT_TIMEOUT, WORKER_STREAM_MODE, WORKER_SECRET,
+    CLIP_RECORDING, CLIP_PRE_SECONDS, CLIP_POST_SECONDS, CLIP_MAX_SECONDS, CLIP_FPS, CLIP_JPEG_QUALITY,
+    CLIP_CODEC, CLIP_EXTENSION, CLIP_WRITERS, SNAPSHOT_WRITERS, SNAPSHOT_MAX_PENDING, FFMPEG_BINARY,
+    NOTIFY_BATCH_WINDOW, NOTIFY_MAX_PENDING,
+    RECORDING_SEGMENT_SECONDS, RECORDING_FORMAT,
+    TRACKING, TRACK_IOU_THRESHOLD, TRACK_MAX_AGE, TRACK_MIN_HITS, TRACK_LOW_CONFIDENCE, TRACK_MOVE_THRESHOLD,
+    RETENTION_INTERVAL, RETENTION_MAX_AGE_DAYS, RETENTION_MAX_BYTES_PER_CAMERA, RETENTION_MAX_BYTES_PER_USER,
+    SESSION_TTL, SESSION_PERSIST
+)
+from server.capture import normalize_camera, build_camera_record, build_camera_records, open_capture, downscale
+from server.broadcast import Broadcaster
+from server.supervisor import CameraSupervisor
+from server.store import CaptureStore, file_size
+from server.layout import new_capture_id, capture_path, capture_timestamp
+from server.sharding import WorkerRegistry, camera_key, stream_signature
+from server.clips import ClipRecorder, ClipWriter
+from server.snapshots import SnapshotWriter, encode_snapshot
+from server.notifications import NotificationDispatcher
+from server.tracking import IoUTracker
+from server.zones import build_zone_filter, validate_zones
+from server.auth_codes import AuthCodeIndex
+from server.sessions import SessionStore
+from server.detection import (
+    validate_detection_settings, compile_rules, EMPTY_RULES, filter_detections, weak_detections, PersistenceCounter
+)
+from server.recording import segment_command, record_segments
+from server.retention import RetentionService, FileRemover, build_retention_policy, remove_files
+from server.archive import stream_zip
 # Настройка логирования для записи в файл и консоль
 logging.basicConfig(
     level=logging.DEBUG,
@@ -30,22 +63,29 @@ logger = logging.getLogger(__name__)
 
 # Инициализация Flask-приложения
 app = Flask(__name__)
-app.logger.disabled = True
 app.secret_key = 'supersecretkey123'
 
-# Инициализация модели YOLO
-model = YOLO("yolov8n.pt")
+# Модель YOLO загружается лениво - только в процессе, где работают камеры
+model = None
+MODEL_LOCK = threading.Lock()
 
 # Хранилища данных
-captured_images = {}  # Снимки: {username: {camera_name: {path: timestamp}}}
-new_images = {}  # Новые снимки для уведомлений
 users_db = {}  # База пользователей: {username: {password, auth_codes, cameras, detection_settings, role}}
-sessions = {}  # Сессии: {token: {username, expires}}
-active_cameras = {}  # Активные камеры: {username: {camera_name: thread}}
+detection_rules = {}  # Скомпилированные правила распознавания: {username: DetectionRules}, подменяются целиком
+auth_code_index = AuthCodeIndex()  # Обратные индексы кодов Telegram: code -> (username, chat_id), username -> чаты
+frame_hub = Broadcaster(maxsize=2)  # Кадры для зрителей: {(username, camera_name): подписчики}
+event_hub = Broadcaster(maxsize=100)  # События о новых снимках: {username: подписчики}
 
 # Константы и пути
 DB_FILE = "users.json"
 DB_LOCK = threading.Lock()
+RULES_LOCK = threading.Lock()
+STREAM_TIMEOUT = 10  # Время ожидания кадра зрителем, после которого стрим закрывается (с)
+VIEW_IDLE_INTERVAL = 0.5  # Период проверки появления зрителей потоком просмотра (с)
+WORKER_STREAM_TTL = 60  # Срок действия подписанной ссылки на поток camera_worker (с)
+CAPTURE_MAX_AGE = 365 * 86400  # Срок кэширования снимков и клипов клиентом (с): файлы не изменяются
+ADMIN_USERS_PAGE_SIZE = 50  # Пользователей на странице списка админа по умолчанию
+ADMIN_USERS_MAX_PAGE_SIZE = 200  # Наибольший размер страницы списка пользователей
 
 # Классы для обнаружения объектов
 DETECTION_CLASSES = {
@@ -73,23 +113,75 @@ def load_db():
                 return {}, {}
         return {}, {}
 
-# Сохранение базы данных в файл
+# Сохранение базы данных в файл (атомарно: процессы camera_worker читают файл параллельно)
 def save_db():
     with DB_LOCK:
         try:
-            with open(DB_FILE, 'w', encoding='utf-8') as f:
-                data = {"users": users_db, "captured_images": captured_images}
+            tmp_file = f"{DB_FILE}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                data = {"users": users_db}
                 json.dump(data, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_file, DB_FILE)
             logger.info("База данных сохранена")
         except Exception as e:
             logger.error(f"Ошибка сохранения базы данных: {e}")
 
+# Перекомпиляция правил распознавания пользователя после изменения его настроек или чатов Telegram.
+# Потоки камер не читают users_db: они берут готовый объект правил, который здесь заменяется одной операцией.
+def refresh_detection_rules(username):
+    with RULES_LOCK:
+        if username in users_db:
+            detection_rules[username] = compile_rules(
+                users_db[username].get("detection_settings", {}), auth_code_index.recipients(username)
+            )
+        else:
+            detection_rules.pop(username, None)
+
 # Инициализация базы данных
-users_db, captured_images = load_db()
+users_db, legacy_captured_images = load_db()
 if not users_db:
     with open(DB_FILE, 'w', encoding='utf-8') as f:
-        json.dump({"users": {}, "captured_images": {}}, f)
+        json.dump({"users": {}}, f)
     logger.info("Создана новая база данных")
+auth_code_index.rebuild(users_db)
+for username in users_db:
+    refresh_detection_rules(username)
+
+# Индекс снимков (общий для API и camera_worker); снимки из users.json переносятся один раз
+capture_store = CaptureStore(CAPTURE_DB_FILE)
+if capture_store.import_legacy(legacy_captured_images) and legacy_captured_images:
+    save_db()
+    logger.info("Снимки перенесены из users.json в индекс снимков")
+del legacy_captured_images
+
+# Сессии пользователей (при SESSION_PERSIST сохраняются в индексе снимков и переживают перезапуск)
+session_store = SessionStore(SESSION_TTL, capture_store if SESSION_PERSIST else None)
+if session_store.load():
+    logger.info("Сессии пользователей восстановлены из индекса снимков")
+
+# Фоновая запись клипов событий (потоки запускаются при первом клипе)
+clip_writer = ClipWriter(CLIP_CODEC, workers=CLIP_WRITERS)
+
+# Фоновая запись снимков: поток камеры только кодирует кадр в память
+snapshot_writer = SnapshotWriter(workers=SNAPSHOT_WRITERS, max_pending=SNAPSHOT_MAX_PENDING)
+
+# Фоновая отправка уведомлений боту пакетами (поток запускается при первом уведомлении)
+notification_dispatcher = NotificationDispatcher(
+    BOT_SERVER_URL, batch_window=NOTIFY_BATCH_WINDOW, max_pending=NOTIFY_MAX_PENDING
+)
+
+# Реестр живых camera_worker: камеры распределяются между ними консистентным хешированием
+worker_registry = WorkerRegistry(capture_store, WORKER_HEARTBEAT_TIMEOUT)
+
+# Получение модели YOLO (загрузка при первом обращении)
+def get_model():
+    global model
+    if model is None:
+        with MODEL_LOCK:
+            if model is None:
+                model = YOLO("yolov8n.pt")
+                logger.info("Модель YOLO загружена")
+    return model
 
 # Генерация токена для сессии
 def generate_token(username):
@@ -97,198 +189,423 @@ def generate_token(username):
     logger.info(f"Сгенерирован токен для пользователя {username}")
     return token
 
-# Сохранение кадра в файловую систему
-def save_frame(username, camera_name, frame):
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    image_dir = os.path.join("static/captures", username, camera_name).replace("\\", "/")
-    os.makedirs(image_dir, exist_ok=True)
-    filename = f"{image_dir}/{timestamp}.jpg".replace("\\", "/")
-    success = cv2.imwrite(filename, frame)
-    if success:
-        logger.info(f"Сохранен кадр: {filename}")
-    else:
-        logger.error(f"Не удалось сохранить кадр: {filename}")
-    return filename, timestamp
+# Сохранение кадра: кодирование в память по настройкам камеры, запись файла - в фоне.
+# Файл снимка: static/captures/<user>/<camera>/ГГГГ/ММ/ДД/ЧЧ/<id>.<формат>, см. server/layout.py.
+# Снимок попадает в индекс (вместе с обнаружениями) и в события после записи файла.
+# Возвращает (путь, метка времени, байты) или None.
+def save_frame(username, camera_name, frame, camera, detections):
+    image, extension = encode_snapshot(
+        frame, camera["snapshot_format"], camera["snapshot_quality"], camera["snapshot_max_size"]
+    )
+    if image is None:
+        logger.error(f"Не удалось закодировать кадр камеры {camera_name}")
+        return None
+    capture_id = new_capture_id()
+    timestamp = capture_timestamp(capture_id)
+    filename = capture_path(username, camera_name, capture_id, extension)
+    height, width = frame.shape[:2]
+    boxes = [
+        (class_id, round(confidence, 3),
+         (round(x1 / width, 4), round(y1 / height, 4), round(x2 / width, 4), round(y2 / height, 4)))
+        for class_id, confidence, (x1, y1, x2, y2) in detections
+    ]
 
-# Генерация видеопотока для клиента
-def generate_frames(username, camera_name):
-    logger.info(f"Запрос стрима для пользователя {username}, камера {camera_name}")
+    def on_written(path):
+        try:
+            capture_store.add_capture(username, camera_name, path, timestamp, len(image), capture_id, boxes)
+        except sqlite3.IntegrityError as e:
+            # Снимок без строки индекса нельзя ни показать, ни удалить, ни очистить по сроку - файл удаляется
+            logger.error(f"Снимок {path} не добавлен в индекс ({e}), файл удален")
+            os.remove(path)
+            return
+        event_hub.publish(username, {"id": capture_id, "camera": camera_name, "path": path, "timestamp": timestamp})
+
+    snapshot_writer.submit(filename, image, on_written)
+    return filename, timestamp, image
+
+# Путь клипа события рядом со снимками камеры
+def clip_path(username, camera_name, started):
+    return capture_path(username, camera_name, new_capture_id(started), CLIP_EXTENSION)
+
+# Привязка записанного клипа к снимкам события. Клип, на который не ссылается ни один снимок (снимок
+# не сохранен или не попал в индекс), удаляется: очистка по индексу снимков его бы не нашла.
+def index_clip(path, captures):
+    if not capture_store.set_clip(captures, path, file_size(path)):
+        logger.warning(f"Клип {path} не привязан ни к одному снимку и удален")
+        remove_files([path])
+
+# Запись клипов события для камеры (None, если запись клипов выключена)
+def create_clip_recorder(username, camera_name):
+    if not CLIP_RECORDING:
+        return None
+    return ClipRecorder(
+        clip_writer,
+        path_for=lambda started: clip_path(username, camera_name, started),
+        on_written=index_clip,
+        pre_seconds=CLIP_PRE_SECONDS,
+        post_seconds=CLIP_POST_SECONDS,
+        max_seconds=CLIP_MAX_SECONDS,
+        fps=CLIP_FPS,
+        quality=CLIP_JPEG_QUALITY
+    )
+
+# Трекер объектов камеры (None, если трекинг выключен и снимки делаются при любом обнаружении)
+def create_tracker():
+    if not TRACKING:
+        return None
+    return IoUTracker(
+        iou_threshold=TRACK_IOU_THRESHOLD,
+        max_age=TRACK_MAX_AGE,
+        min_hits=TRACK_MIN_HITS,
+        move_threshold=TRACK_MOVE_THRESHOLD
+    )
+
+# Части multipart-ответа видеопотока
+def stream_text_part(text):
+    return b'--frame\r\nContent-Type: text/plain\r\n\r\n' + text.encode() + b'\r\n'
+
+def stream_frame_part(frame_bytes):
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n'
+
+# Проверка, что камеру можно показать; возвращает текст ошибки или None
+def stream_error(username, camera_name):
     if username not in users_db:
         logger.error(f"Пользователь {username} не найден")
-        yield b'--frame\r\nContent-Type: text/plain\r\n\r\nUser not found\r\n'
-        return
+        return "User not found"
     if camera_name not in users_db[username]["cameras"]:
         logger.error(f"Камера {camera_name} не найдена для пользователя {username}")
-        yield b'--frame\r\nContent-Type: text/plain\r\n\r\nCamera not found\r\n'
+        return "Camera not found"
+    return None
+
+# Запуск обработки камеры, если зритель пришел раньше, чем она была запущена
+def ensure_camera_running(username, camera_name):
+    if CAMERA_RUNTIME == "inprocess" and not supervisor.is_running(username, camera_name):
+        update_active_cameras(username)
+
+# Подписанная ссылка на поток кадров camera_worker, которому принадлежит камера (None, если узлов нет)
+def camera_stream_url(username, camera_name):
+    node_id, url = worker_registry.owner(username, camera_name)
+    if not url:
+        return None
+    expires = int(time.time()) + WORKER_STREAM_TTL
+    query = urlencode({
+        "username": username,
+        "camera_name": camera_name,
+        "expires": expires,
+        "signature": stream_signature(WORKER_SECRET, username, camera_name, expires),
+    })
+    return f"{url}/frames?{query}"
+
+# Пересылка видеопотока от camera_worker, которому принадлежит камера
+def relay_frames(username, camera_name):
+    url = camera_stream_url(username, camera_name)
+    if not url:
+        logger.error(f"Нет живых camera_worker для камеры {camera_name}")
+        yield stream_text_part("No camera workers")
         return
-    url = users_db[username]["cameras"][camera_name]
-    logger.info(f"URL камеры: {url}")
-
-    cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
-    cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 20000)
-    cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, 10000)
-    if not cap.isOpened():
-        logger.error(f"Не удалось открыть стрим для {url}")
-        time.sleep(2)
-        cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
-        if not cap.isOpened():
-            logger.error(f"Повторное подключение к {url} не удалось")
-            yield b'--frame\r\nContent-Type: text/plain\r\n\r\nFailed to open stream\r\n'
-            return
+    try:
+        with requests.get(url, stream=True, timeout=(5, STREAM_TIMEOUT)) as response:
+            if response.status_code != 200:
+                logger.error(f"camera_worker не отдает камеру {camera_name}: {response.status_code}")
+                yield stream_text_part("Camera is not running")
+                return
+            for chunk in response.iter_content(chunk_size=65536):
+                yield chunk
+    except requests.RequestException as e:
+        logger.error(f"Ошибка получения кадров от camera_worker для {camera_name}: {e}")
+        yield stream_text_part("Stream interrupted")
+
+# Отправка кадра с разметкой зрителям камеры (кодирование один раз на всех зрителей).
+# size - (высота, ширина) кадра распознавания, в координатах которого заданы рамки.
+def publish_frame(username, camera_name, frame, detections, size=None):
+    frame = frame.copy()
+    scale_y, scale_x = (frame.shape[0] / size[0], frame.shape[1] / size[1]) if size else (1, 1)
+    for class_id, confidence, box in detections:
+        x1, y1, x2, y2 = (int(value * scale) for value, scale in zip(box, (scale_x, scale_y, scale_x, scale_y)))
+        label = f"{DETECTION_CLASSES[class_id]} {confidence:.2f}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    ret, buffer = cv2.imencode('.jpg', frame)
+    if not ret:
+        logger.warning(f"Не удалось закодировать кадр для {camera_name}")
+        return
+    frame_hub.publish((username, camera_name), buffer.tobytes())
+
+# Генерация видеопотока для клиента из общего конвейера камеры
+def generate_frames(username, camera_name):
+    logger.info(f"Запрос стрима для пользователя {username}, камера {camera_name}")
+    error = stream_error(username, camera_name)
+    if error:
+        yield stream_text_part(error)
+        return
+    if CAMERA_RUNTIME != "inprocess":
+        yield from relay_frames(username, camera_name)
+        return
+    ensure_camera_running(username, camera_name)
 
+    key = (username, camera_name)
+    subscriber = frame_hub.subscribe(key)
     try:
         logger.info(f"Стрим для {camera_name} успешно открыт")
         while True:
-            success, frame = cap.read()
-            if not success:
-                logger.error(f"Не удалось прочитать кадр для {camera_name}")
-                yield b'--frame\r\nContent-Type: text/plain\r\n\r\nStream interrupted\r\n'
+            try:
+                frame_bytes = subscriber.get(STREAM_TIMEOUT)
+            except queue.Empty:
+                logger.error(f"Нет кадров для {camera_name} в течение {STREAM_TIMEOUT} с")
+                yield stream_text_part("Stream interrupted")
                 break
+            yield stream_frame_part(frame_bytes)
+    finally:
+        frame_hub.unsubscribe(key, subscriber)
+        logger.info(f"Стрим для {camera_name} закрыт")
 
-            results = model(frame, verbose=False)
-            for result in results:
-                for box in result.boxes:
-                    class_id = int(box.cls[0].item())
-                    confidence = box.conf[0].item()
-                    if str(class_id) in users_db[username]["detection_settings"] and \
-                            users_db[username]["detection_settings"][str(class_id)]["detect"] and confidence > 0.5:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        label = f"{DETECTION_CLASSES[class_id]} {confidence:.2f}"
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                logger.warning(f"Не удалось закодировать кадр для {camera_name}")
+# Уведомления в Telegram о снимке: изображение передается байтами, без повторного чтения файла.
+# Отправку выполняет notification_dispatcher, поток камеры не ждет бота.
+def notify_detection(rules, camera_name, detected_classes, timestamp, filename, image):
+    classes = sorted(class_id for class_id in detected_classes if class_id in rules.notify)
+    if not classes or not rules.recipients:
+        return
+    names = ", ".join(DETECTION_CLASSES[class_id] for class_id in classes)
+    caption = (
+        f"Обнаружен объект: {names}\n"
+        f"Камера: {camera_name}\n"
+        f"Дата и время: {timestamp}"
+    )
+    logger.info(f"Отправка уведомления для классов {classes}, чатов: {len(rules.recipients)}")
+    notification_dispatcher.submit(rules.recipients, caption, filename, image)
+
+# Просмотр камеры с отдельным подпотоком распознавания: зрители получают кадры основного потока url
+# в полном разрешении с рамками последнего распознавания (overlay: {"detections": (размер кадра, рамки)}).
+# Поток url открывается, только пока у камеры есть зрители.
+def view_camera(username, camera_name, camera, stop_event, overlay):
+    key = (username, camera_name)
+    cap = None
+    try:
+        while not stop_event.is_set():
+            if not frame_hub.has_subscribers(key):
+                if cap is not None:
+                    cap.release()
+                    cap = None
+                stop_event.wait(VIEW_IDLE_INTERVAL)
                 continue
-            frame_bytes = buffer.tobytes()
-            logger.debug(f"Отправка кадра для {camera_name}, размер: {len(frame_bytes)}")
-            yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.033)
-    except Exception as e:
-        logger.error(f"Ошибка в стриме для {camera_name}: {e}")
-        yield b'--frame\r\nContent-Type: text/plain\r\n\r\nStream error\r\n'
+            if cap is None:
+                cap = open_capture(camera, camera["url"])
+                if not cap.isOpened():
+                    logger.warning(f"Не удалось открыть поток просмотра камеры {camera_name}")
+                    cap.release()
+                    cap = None
+                    stop_event.wait(5)
+                    continue
+            success, frame = cap.read()
+            if not success:
+                logger.warning(f"Не удалось получить кадр просмотра для {camera_name}")
+                cap.release()
+                cap = None
+                continue
+            size, detections = overlay.get("detections", (None, []))
+            publish_frame(username, camera_name, frame, detections, size)
     finally:
-        cap.release()
-        logger.info(f"Стрим для {camera_name} закрыт")
+        if cap is not None:
+            cap.release()
 
 # Обработка камеры для обнаружения объектов
-def process_camera(username, camera_name, url):
+def process_camera(username, camera_name, camera, stop_event):
     logger.info(f"Запуск обработки камеры {camera_name} для {username}")
+    model = get_model()
     retries = 3
     cap = None
     for attempt in range(retries):
-        cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
-        cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 20000)
-        cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, 10000)
+        cap = open_capture(camera)
         if cap.isOpened():
             logger.info(f"Камера {camera_name} успешно открыта на попытке {attempt + 1}")
             break
         logger.warning(f"Не удалось открыть камеру {camera_name}, попытка {attempt + 1}/{retries}")
-        time.sleep(5)
+        if stop_event.wait(5):
+            cap.release()
+            return
     else:
         logger.error(f"Не удалось открыть камеру {camera_name} после {retries} попыток")
-        if username in active_cameras and camera_name in active_cameras[username]:
-            del active_cameras[username][camera_name]
         return
 
     last_snapshot_time = 0
     detection_interval = 5
+    recorder = create_clip_recorder(username, camera_name)
+    tracker = create_tracker()
+    zone_filter = build_zone_filter(camera["zones"])
+    persistence = PersistenceCounter()
+    # Классы с событием (новый трек или смещение), еще не попавшие в снимок из-за интервала
+    pending_classes = set()
+    # Если распознавание идет по подпотоку, зрителям отдается основной поток из отдельного потока просмотра
+    overlay = {}
+    view_stop = threading.Event()
+    if camera["detect_url"] != camera["url"]:
+        threading.Thread(
+            target=view_camera, args=(username, camera_name, camera, view_stop, overlay),
+            name=f"view-{username}-{camera_name}", daemon=True
+        ).start()
 
     try:
-        while cap.isOpened():
-            success, frame = cap.read()
+        while cap.isOpened() and not stop_event.is_set():
+            success, full_frame = cap.read()
             if not success:
                 logger.error(f"Не удалось получить кадр для {camera_name}")
                 break
+            frame = downscale(full_frame, camera["decode_width"])
 
-            results = model(frame, verbose=False)
-            detected_classes = set()
+            # Распознавание только в прямоугольнике зон включения; рамки переводятся в координаты кадра
+            region, (offset_x, offset_y) = zone_filter.crop(frame) if zone_filter else (frame, (0, 0))
+            results = model(region, verbose=False)
+            rules = detection_rules.get(username, EMPTY_RULES)
+            frame_area = frame.shape[0] * frame.shape[1]
+            detections = []
+            weak = []  # Рамки ниже порога класса: только для продления треков
 
+            # Пороги классов применяются ко всем рамкам результата сразу
             for result in results:
-                for box in result.boxes:
-                    class_id = int(box.cls[0].item())
-                    confidence = box.conf[0].item()
-                    if confidence > 0.5 and str(class_id) in users_db[username]["detection_settings"] and \
-                            users_db[username]["detection_settings"][str(class_id)]["detect"]:
-                        detected_classes.add(class_id)
+                classes = result.boxes.cls.cpu().numpy().astype(int)
+                confidences = result.boxes.conf.cpu().numpy()
+                boxes = result.boxes.xyxy.cpu().numpy() + (offset_x, offset_y, offset_x, offset_y)
+                keep = filter_detections(classes, confidences, boxes, rules, frame_area)
+                masks = [(keep, detections)]
+                if tracker:
+                    masks.append((weak_detections(classes, confidences, rules, keep, TRACK_LOW_CONFIDENCE), weak))
+                for mask, target in masks:
+                    for class_id, confidence, box in zip(classes[mask], confidences[mask], boxes[mask].astype(int)):
+                        xyxy = tuple(int(value) for value in box)
+                        if zone_filter and not zone_filter.accepts(xyxy):
+                            continue
+                        target.append((int(class_id), float(confidence), xyxy))
+
+            # Класс считается обнаруженным, если он встречается min_frames кадров подряд
+            stable = persistence.update([class_id for class_id, _, _ in detections], rules.min_frames)
+            detections = [detection for detection, ok in zip(detections, stable) if ok]
+            detected_classes = {class_id for class_id, _, _ in detections}
+
+            # Зрителям - кадр до уменьшения (decode_width), рамки пересчитываются из кадра распознавания
+            if camera["detect_url"] != camera["url"]:
+                overlay["detections"] = (frame.shape[:2], detections)
+            elif frame_hub.has_subscribers((username, camera_name)):
+                publish_frame(username, camera_name, full_frame, detections, frame.shape[:2])
 
             current_time = time.time()
-            if detected_classes and current_time - last_snapshot_time >= detection_interval:
+            if tracker:
+                events = tracker.update(detections, current_time, weak)
+                pending_classes.update(track.class_id for track in events)
+                pending_classes &= detected_classes
+            else:
+                events = detections
+                pending_classes = set(detected_classes)
+            if recorder:
+                recorder.add_frame(frame, current_time)
+                # Каждый клип начинается со снимка, чтобы клип был привязан к событию в индексе, поэтому
+                # клип начинают только события классов, которые попадут в снимок (не слабые и не отфильтрованные)
+                if events and pending_classes and recorder.trigger(current_time):
+                    last_snapshot_time = 0
+            if pending_classes and current_time - last_snapshot_time >= detection_interval:
                 last_snapshot_time = current_time
-                filename, timestamp = save_frame(username, camera_name, frame)
-                if username not in captured_images:
-                    captured_images[username] = {}
-                if camera_name not in captured_images[username]:
-                    captured_images[username][camera_name] = {}
-                captured_images[username][camera_name][filename] = timestamp
-                if username not in new_images:
-                    new_images[username] = {}
-                if camera_name not in new_images[username]:
-                    new_images[username][camera_name] = {}
-                new_images[username][camera_name][filename] = timestamp
-                save_db()
-
-                if "auth_codes" in users_db[username] and users_db[username]["auth_codes"]:
-                    for code, (user, chat_id) in users_db[username]["auth_codes"].items():
-                        if chat_id:
-                            for class_id in detected_classes:
-                                if users_db[username]["detection_settings"].get(str(class_id), {}).get("notify", False):
-                                    logger.info(f"Отправка уведомления для class_id={class_id}, chat_id={chat_id}")
-                                    caption = (
-                                        f"Обнаружен объект: {DETECTION_CLASSES[class_id]}\n"
-                                        f"Камера: {camera_name}\n"
-                                        f"Дата и время: {timestamp}"
-                                    )
-                                    for attempt in range(3):
-                                        try:
-                                            with open(filename, 'rb') as photo:
-                                                files = {'photo': photo}
-                                                data = {
-                                                    'chat_id': chat_id,
-                                                    'code': code,
-                                                    'caption': caption
-                                                }
-                                                response = requests.post(
-                                                    f"{BOT_SERVER_URL}/send_image",
-                                                    files=files,
-                                                    data=data,
-                                                    timeout=5
-                                                )
-                                                logger.info(f"Уведомление отправлено: {response.text}")
-                                                break
-                                        except requests.RequestException as e:
-                                            logger.warning(f"Попытка {attempt + 1}/3 не удалась: {e}")
-                                            if attempt < 2:
-                                                time.sleep(2)
-                                            else:
-                                                logger.error(f"Не удалось отправить уведомление: {e}")
+                saved = save_frame(username, camera_name, frame, camera, detections)
+                if saved is not None:
+                    filename, timestamp, image = saved
+                    if recorder:
+                        recorder.attach(filename)
+                    notify_detection(rules, camera_name, pending_classes, timestamp, filename, image)
+                pending_classes = set()
 
             time.sleep(0.033)
     except Exception as e:
         logger.error(f"Ошибка обработки камеры {camera_name}: {e}")
     finally:
+        view_stop.set()
         cap.release()
-        if username in active_cameras and camera_name in active_cameras[username]:
-            del active_cameras[username][camera_name]
+        if recorder:
+            recorder.close()
         logger.info(f"Обработка камеры {camera_name} завершена")
 
+# Потоки обработки камер: {(username, camera_name): (thread, stop_event, camera)}
+supervisor = CameraSupervisor(process_camera)
+
+# Непрерывная запись камеры сегментами без перекодирования, с удалением сегментов старше срока хранения
+def record_camera(username, camera_name, camera, stop_event):
+    output_dir = os.path.join("static/recordings", username, camera_name).replace("\\", "/")
+    command = segment_command(FFMPEG_BINARY, camera, output_dir, RECORDING_SEGMENT_SECONDS, RECORDING_FORMAT)
+
+    def on_segment(path, started, duration, size):
+        capture_store.add_segment(username, camera_name, path, started, duration, size)
+        if camera["retention_hours"]:
+            before = time.time() - camera["retention_hours"] * 3600
+            for expired in capture_store.expire_segments(username, camera_name, before):
+                if os.path.exists(expired):
+                    os.remove(expired)
+
+    record_segments(command, output_dir, stop_event, on_segment, f"{camera_name} для {username}")
+
+# Потоки непрерывной записи камер с параметром "record"
+recording_supervisor = CameraSupervisor(record_camera)
+
+# Приведение непрерывной записи пользователя к его камерам с параметром "record"
+def sync_recordings(username, cameras):
+    recording_supervisor.sync_user(username, {name: camera for name, camera in cameras.items() if camera["record"]})
+
+# Ограничения хранения снимков камеры: (max_age_days, max_bytes).
+# Срок берется из параметров камеры, затем из ограничений пользователя, затем из настроек.
+def camera_retention(username, camera_name):
+    user = users_db.get(username, {})
+    record = user.get("cameras", {}).get(camera_name)
+    camera = normalize_camera(record) if record else {}
+    policy = user.get("retention", {})
+    max_age_days = camera.get("max_age_days") or policy.get("max_age_days") or RETENTION_MAX_AGE_DAYS
+    return max_age_days, camera.get("max_bytes") or RETENTION_MAX_BYTES_PER_CAMERA
+
+# Ограничение общего объема снимков пользователя (байт)
+def user_retention(username):
+    return users_db.get(username, {}).get("retention", {}).get("max_bytes") or RETENTION_MAX_BYTES_PER_USER
+
+# Фоновая очистка снимков (в нескольких процессах API выполняется одним из них)
+retention_service = RetentionService(capture_store, camera_retention, user_retention, RETENTION_INTERVAL)
+# Фоновое удаление файлов удаленных снимков
+file_remover = FileRemover()
+
+# Запуск непрерывной записи всех пользователей (запись не зависит от входа пользователя в систему)
+def start_recordings():
+    for username, user in list(users_db.items()):
+        sync_recordings(username, {name: normalize_camera(r) for name, r in user.get("cameras", {}).items()})
+
 # Проверка валидности сессии
 def check_session(token):
-    if token in sessions and sessions[token]["expires"] > time.time():
-        return sessions[token]["username"]
-    logger.warning(f"Недействительный или истекший токен: {token}")
-    return None
+    username = session_store.get(token)
+    if username is None:
+        logger.warning(f"Недействительный или истекший токен: {token}")
+    return username
 
 # Проверка админской сессии
 def check_admin_session(token):
-    if token in sessions and sessions[token]["expires"] > time.time():
-        username = sessions[token]["username"]
-        if username in users_db and users_db[username]["role"] == "admin":
-            return username
+    username = session_store.get(token)
+    if username in users_db and users_db[username]["role"] == "admin":
+        return username
     logger.warning(f"Недействительный или не админский токен: {token}")
     return None
 
+# Пользователь сессии текущего запроса: токен и username берутся из JSON-тела или параметров запроса.
+# Сессия проверяется один раз за запрос, результат хранится в flask.g; None, если сессия не принадлежит username.
+def session_user():
+    if "session_user" not in g:
+        data = request.get_json(silent=True) if request.is_json else None
+        params = data if isinstance(data, dict) else request.args
+        username = params.get("username")
+        owner = check_session(params.get("token"))
+        g.session_user = owner if owner is not None and owner == username else None
+    return g.session_user
+
+# Декоратор эндпоинтов пользователя: 401 без действующей сессии того пользователя, который указан в запросе
+def require_session(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if session_user() is None:
+            logger.error(f"Недействительная сессия для {request.path}")
+            return jsonify({"error": "Недействительная сессия"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
 # Обновление активных камер для пользователя
 def update_active_cameras(username):
     if username not in users_db:
@@ -296,20 +613,12 @@ def update_active_cameras(username):
         return
     if "detection_settings" not in users_db[username]:
         users_db[username]["detection_settings"] = {}
-    if username in active_cameras:
-        current_cameras = set(users_db[username]["cameras"].keys())
-        active_camera_names = set(active_cameras[username].keys())
-        for camera_name in active_camera_names - current_cameras:
-            del active_cameras[username][camera_name]
-            logger.info(f"Удалена неактивная камера {camera_name} для {username}")
-    for name, url in users_db[username]["cameras"].items():
-        if username not in active_cameras or name not in active_cameras[username]:
-            thread = threading.Thread(target=process_camera, args=(username, name, url), daemon=True)
-            if username not in active_cameras:
-                active_cameras[username] = {}
-            active_cameras[username][name] = thread
-            thread.start()
-            logger.info(f"Запущена обработка камеры {name} для {username}")
+    refresh_detection_rules(username)
+    if CAMERA_RUNTIME != "inprocess":
+        return  # Камеры запускают процессы camera_worker по изменениям users.json
+    cameras = {name: normalize_camera(record) for name, record in users_db[username]["cameras"].items()}
+    supervisor.sync_user(username, cameras)
+    sync_recordings(username, cameras)
 
 # Корневой маршрут
 @app.route('/')
@@ -319,13 +628,15 @@ def index():
 
 # Эндпоинт для видеопотока
 @app.route('/video_feed', methods=['GET'])
+@require_session
 def video_feed():
     username = request.args.get("username")
     camera_name = request.args.get("camera_name")
-    token = request.args.get("token")
-    if not check_session(token) or check_session(token) != username:
-        logger.error(f"Недействительная сессия для {username}, токен: {token}")
-        return jsonify({"error": "Недействительная сессия"}), 401
+    if CAMERA_RUNTIME != "inprocess" and WORKER_STREAM_MODE == "redirect" and not stream_error(username, camera_name):
+        url = camera_stream_url(username, camera_name)
+        if not url:
+            return jsonify({"error": "Нет доступных обработчиков камер"}), 503
+        return redirect(url, code=307)
     return Response(generate_frames(username, camera_name), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 # Эндпоинт для регистрации
@@ -349,7 +660,7 @@ def register():
         "detection_settings": {},
         "role": "user"
     }
-    sessions[token] = {"username": username, "expires": time.time() + 3600}
+    session_store.create(token, username)
     save_db()
     logger.info(f"Зарегистрирован пользователь {username}")
     return jsonify({
@@ -371,13 +682,14 @@ def login():
     hashed_password = hashlib.sha256(password.encode()).hexdigest()
     if username in users_db and users_db[username]["password"] == hashed_password:
         token = generate_token(username)
-        sessions[token] = {"username": username, "expires": time.time() + 3600}
+        session_store.create(token, username)
         if "detection_settings" not in users_db[username]:
             users_db[username]["detection_settings"] = {}
         if "role" not in users_db[username]:
             users_db[username]["role"] = "user"
         if "auth_codes" not in users_db[username]:
             users_db[username]["auth_codes"] = {}
+        users_db[username]["last_login"] = time.time()
         save_db()
         update_active_cameras(username)
         logger.info(f"Вход выполнен для {username}")
@@ -396,29 +708,42 @@ def logout():
     data = request.json
     username = data.get("username")
     token = data.get("token")
-    if check_session(token) == username and token in sessions:
-        del sessions[token]
-        if username in active_cameras:
-            del active_cameras[username]
+    if check_session(token) == username and session_store.delete(token):
+        # Камеры останавливаются, когда у пользователя не остается сессий
+        if not session_store.user_sessions(username):
+            supervisor.stop(username)
         logger.info(f"Выход выполнен для {username}")
     return jsonify({"status": "success"}), 200
 
+# Эндпоинт для выхода со всех устройств
+@app.route('/logout_all', methods=['POST'])
+@require_session
+def logout_all():
+    username = session_user()
+    count = session_store.delete_user(username)
+    supervisor.stop(username)
+    logger.info(f"Выход со всех устройств для {username}, завершено сессий: {count}")
+    return jsonify({"status": "success", "sessions": count}), 200
+
 # Эндпоинт для обновления кода авторизации
 @app.route('/update_auth_code', methods=['POST'])
+@require_session
 def update_auth_code():
     data = request.json
     username = data.get("username")
     code = data.get("code")
-    token = data.get("token")
-    if not check_session(token) or check_session(token) != username:
-        logger.error(f"Недействительная сессия для обновления auth_code: {username}")
-        return jsonify({"error": "Недействительная сессия"}), 401
-    if users_db[username]["auth_codes"]:
-        existing_code = next(iter(users_db[username]["auth_codes"]))
-        logger.info(f"Попытка обновления auth_code для {username}, но код уже существует: {existing_code}")
-        return jsonify({"error": "Код уже сгенерирован для этого аккаунта", "auth_code": existing_code}), 400
-    users_db[username]["auth_codes"][code] = [username, None]
+    with auth_code_index.lock:
+        if users_db[username]["auth_codes"]:
+            existing_code = next(iter(users_db[username]["auth_codes"]))
+            logger.info(f"Попытка обновления auth_code для {username}, но код уже существует: {existing_code}")
+            return jsonify({"error": "Код уже сгенерирован для этого аккаунта", "auth_code": existing_code}), 400
+        if auth_code_index.owner(code)[0] is not None:
+            logger.error(f"Код {code} уже используется другим пользователем")
+            return jsonify({"error": "Код уже используется"}), 409
+        users_db[username]["auth_codes"][code] = [username, None]
+        auth_code_index.set(username, code, None)
     save_db()
+    refresh_detection_rules(username)
     logger.info(f"Обновлен auth_code для {username}: {code}")
     return jsonify({"status": "success", "auth_code": code}), 200
 
@@ -430,68 +755,104 @@ def update_chat_id():
     chat_id = data.get("chat_id")
     logger.info(f"Получен запрос на обновление chat_id: code={code}, chat_id={chat_id}")
 
-    username = None
-    for user, user_data in users_db.items():
-        if code in user_data.get("auth_codes", {}):
-            username = user
-            break
-
-    if username is None:
-        logger.error(f"Код {code} не найден ни для одного пользователя")
-        return jsonify({"error": "Код не найден"}), 404
-
-    users_db[username]["auth_codes"][code][1] = chat_id
+    with auth_code_index.lock:
+        username, _ = auth_code_index.owner(code)
+        if username is None:
+            logger.error(f"Код {code} не найден ни для одного пользователя")
+            return jsonify({"error": "Код не найден"}), 404
+        users_db[username]["auth_codes"][code][1] = chat_id
+        auth_code_index.set(username, code, chat_id)
     save_db()
+    refresh_detection_rules(username)
     logger.info(f"Обновлен chat_id для {username}: {chat_id}")
     return jsonify({"status": "success"}), 200
 
+# Эндпоинт для проверки привязок чатов бота одним запросом: {"bindings": {chat_id: code}} -> {chat_id: bool}
+@app.route('/verify_chat_codes', methods=['POST'])
+def verify_chat_codes():
+    bindings = (request.json or {}).get("bindings")
+    if not isinstance(bindings, dict):
+        logger.error("Проверка привязок чатов: привязки не указаны")
+        return jsonify({"error": "Привязки должны быть объектом"}), 400
+    results = {}
+    for chat_id, code in bindings.items():
+        bound = auth_code_index.owner(code)[1]
+        results[chat_id] = bound is not None and str(bound) == str(chat_id)
+    logger.info(f"Проверено привязок чатов: {len(results)}, действительных: {sum(results.values())}")
+    return jsonify({"results": results}), 200
+
 # Эндпоинт для обновления настроек обнаружения
 @app.route('/update_detection_settings', methods=['POST'])
+@require_session
 def update_detection_settings():
     data = request.json
     username = data.get("username")
-    token = data.get("token")
-    detection_settings = data.get("detection_settings")
-    if not check_session(token) or check_session(token) != username:
-        logger.error(f"Недействительная сессия для обновления настроек: {username}")
-        return jsonify({"error": "Недействительная сессия"}), 401
+    try:
+        detection_settings = validate_detection_settings(data.get("detection_settings"))
+    except ValueError as e:
+        logger.error(f"Неверные настройки распознавания для {username}: {e}")
+        return jsonify({"error": str(e)}), 400
     users_db[username]["detection_settings"] = detection_settings
     save_db()
+    refresh_detection_rules(username)
     logger.info(f"Настройки распознавания обновлены для {username}")
     return jsonify({"status": "success"}), 200
 
 # Эндпоинт для добавления камеры
 @app.route('/add_camera', methods=['POST'])
+@require_session
 def add_camera():
     data = request.json
     username = data.get("username")
     name = data.get("name")
     url = data.get("url")
-    token = data.get("token")
-    if not check_session(token) or check_session(token) != username:
-        logger.error(f"Недействительная сессия для добавления камеры: {username}")
-        return jsonify({"error": "Недействительная сессия"}), 401
-    users_db[username]["cameras"][name] = url
+    try:
+        camera = build_camera_record(url, data)
+    except ValueError as e:
+        logger.error(f"Неверные параметры камеры {name} для {username}: {e}")
+        return jsonify({"error": str(e)}), 400
+    users_db[username]["cameras"][name] = camera
     save_db()
     update_active_cameras(username)
     logger.info(f"Добавлена камера {name} для {username}")
     return jsonify({"status": "success"}), 200
 
+# Эндпоинт для изменения зон распознавания камеры
+@app.route('/update_camera_zones', methods=['POST'])
+@require_session
+def update_camera_zones():
+    data = request.json
+    username = data.get("username")
+    name = data.get("name")
+    if name not in users_db[username]["cameras"]:
+        logger.error(f"Камера {name} не найдена для {username}")
+        return jsonify({"error": "Камера не найдена"}), 404
+    try:
+        zones = validate_zones(data.get("zones", []))
+    except ValueError as e:
+        logger.error(f"Неверные зоны камеры {name} для {username}: {e}")
+        return jsonify({"error": str(e)}), 400
+    camera = users_db[username]["cameras"][name]
+    if isinstance(camera, str):
+        camera = {"url": camera}
+    users_db[username]["cameras"][name] = dict(camera, zones=zones)
+    save_db()
+    update_active_cameras(username)
+    logger.info(f"Зоны камеры {name} обновлены для {username}")
+    return jsonify({"status": "success"}), 200
+
 # Эндпоинт для удаления камеры
 @app.route('/delete_camera', methods=['POST'])
+@require_session
 def delete_camera():
     data = request.json
     username = data.get("username")
     name = data.get("name")
-    token = data.get("token")
-    if not check_session(token) or check_session(token) != username:
-        logger.error(f"Недействительная сессия для удаления камеры: {username}")
-        return jsonify({"error": "Недействительная сессия"}), 401
     if name in users_db[username]["cameras"]:
         del users_db[username]["cameras"][name]
         save_db()
-        if username in active_cameras and name in active_cameras[username]:
-            del active_cameras[username][name]
+        supervisor.stop(username, name)
+        recording_supervisor.stop(username, name)
         logger.info(f"Удалена камера {name} для {username}")
         return jsonify({"status": "success"}), 200
     logger.error(f"Камера {name} не найдена для {username}")
@@ -499,66 +860,229 @@ def delete_camera():
 
 # Эндпоинт для получения списка камер
 @app.route('/get_cameras', methods=['GET'])
+@require_session
 def get_cameras():
     username = request.args.get("username")
-    token = request.args.get("token")
-    if not check_session(token) or check_session(token) != username:
-        logger.error(f"Недействительная сессия для получения камер: {username}")
-        return jsonify({"error": "Недействительная сессия"}), 401
     logger.info(f"Возвращены камеры для {username}")
     return jsonify({"cameras": users_db[username]["cameras"]}), 200
 
 # Эндпоинт для получения снимков
 @app.route('/get_images', methods=['GET'])
+@require_session
 def get_images():
     username = request.args.get("username")
-    token = request.args.get("token")
-    if not check_session(token) or check_session(token) != username:
-        logger.error(f"Недействительная сессия для получения снимков: {username}")
-        return jsonify({"error": "Недействительная сессия"}), 401
-    images = captured_images.get(username, {})
+    images = capture_store.captures(username)
     filtered_images = {}
     for camera_name, image_dict in images.items():
         filtered_images[camera_name] = {path: ts for path, ts in image_dict.items() if os.path.exists(path)}
+    ids, viewed = capture_store.capture_states(username)
     logger.info(f"Возвращены снимки для {username}")
-    return jsonify({"images": filtered_images}), 200
+    return jsonify({"images": filtered_images, "ids": ids, "viewed": viewed}), 200
+
+# Снимок по идентификатору из события или индекса
+@app.route('/captures/<capture_id>', methods=['GET'])
+@require_session
+def get_capture(capture_id):
+    username = request.args.get("username")
+    row = capture_store.capture(username, capture_id)
+    response = send_capture(row["path"]) if row is not None else None
+    if response is None:
+        return jsonify({"error": "Снимок не найден"}), 404
+    return response
+
+# Поиск снимков по обнаруженным объектам: камера, классы (через запятую), уверенность и интервал времени
+@app.route('/search_captures', methods=['GET'])
+@require_session
+def search_captures():
+    username = request.args.get("username")
+    try:
+        classes = request.args.get("classes")
+        class_ids = [int(class_id) for class_id in classes.split(",")] if classes else None
+        min_confidence = float(request.args.get("min_confidence", 0))
+        start = float(request.args["start"]) if request.args.get("start") else None
+        end = float(request.args["end"]) if request.args.get("end") else None
+        limit = min(int(request.args.get("limit", 100)), 500)
+    except ValueError:
+        return jsonify({"error": "Недопустимые параметры поиска"}), 400
+    captures = capture_store.search_captures(
+        username, request.args.get("camera_name") or None, class_ids, min_confidence, start, end, limit
+    )
+    for capture in captures:
+        for detection in capture["detections"]:
+            detection["class"] = DETECTION_CLASSES.get(detection["class_id"])
+    return jsonify({"captures": captures}), 200
+
+# Эндпоинт для получения клипов событий: {camera_name: {image_path: clip_path}}
+@app.route('/get_clips', methods=['GET'])
+@require_session
+def get_clips():
+    username = request.args.get("username")
+    clips = capture_store.clips(username)
+    filtered_clips = {}
+    for camera_name, clip_dict in clips.items():
+        filtered_clips[camera_name] = {path: clip for path, clip in clip_dict.items() if os.path.exists(clip)}
+    logger.info(f"Возвращены клипы для {username}")
+    return jsonify({"clips": filtered_clips}), 200
+
+# Эндпоинт для получения сегментов непрерывной записи камеры за интервал (start, end - Unix-время)
+@app.route('/get_recordings', methods=['GET'])
+@require_session
+def get_recordings():
+    username = request.args.get("username")
+    camera_name = request.args.get("camera_name")
+    try:
+        start = float(request.args["start"]) if request.args.get("start") else None
+        end = float(request.args["end"]) if request.args.get("end") else None
+    except ValueError:
+        return jsonify({"error": "Параметры start и end должны быть числами"}), 400
+    segments = [dict(row) for row in capture_store.segments(username, camera_name, start, end)]
+    logger.info(f"Возвращены сегменты записи {camera_name} для {username}: {len(segments)}")
+    return jsonify({"segments": segments}), 200
+
+# Эндпоинт для перемотки записи к моменту времени: сегмент и смещение в нем (с)
+@app.route('/recording_at', methods=['GET'])
+@require_session
+def recording_at():
+    username = request.args.get("username")
+    camera_name = request.args.get("camera_name")
+    try:
+        moment = float(request.args.get("time", ""))
+    except ValueError:
+        return jsonify({"error": "Параметр time должен быть числом"}), 400
+    segment = capture_store.segment_at(username, camera_name, moment)
+    if segment is None or moment > segment["started"] + segment["duration"]:
+        return jsonify({"error": "Запись за это время не найдена"}), 404
+    return jsonify({"segment": dict(segment), "offset": moment - segment["started"]}), 200
 
 # Эндпоинт для проверки новых снимков
 @app.route('/new_images_count', methods=['GET'])
+@require_session
 def new_images_count():
     username = request.args.get("username")
-    token = request.args.get("token")
-    if not check_session(token) or check_session(token) != username:
-        logger.error(f"Недействительная сессия для проверки новых снимков: {username}")
-        return jsonify({"error": "Недействительная сессия"}), 401
-    new = new_images.get(username, {})
-    new_images[username] = {}
-    save_db()
+    new = capture_store.take_new(username)
     logger.info(f"Возвращены новые снимки для {username}")
     return jsonify({"new_images": new}), 200
 
 # Эндпоинт для удаления снимка
 @app.route('/delete_image', methods=['POST'])
+@require_session
 def delete_image():
     data = request.json
     username = data.get("username")
     image_path = data.get("image_path").replace("\\", "/")
-    token = data.get("token")
-    if not check_session(token) or check_session(token) != username:
-        logger.error(f"Недействительная сессия для удаления снимка: {username}")
-        return jsonify({"error": "Недействительная сессия"}), 401
-    for camera_name in captured_images.get(username, {}):
-        if image_path in captured_images[username][camera_name]:
-            del captured_images[username][camera_name][image_path]
-            if os.path.exists(image_path):
-                os.remove(image_path)
-            save_db()
-            logger.info(f"Удален снимок {image_path} для {username}")
-            return jsonify({"status": "success"}), 200
+    files = capture_store.delete_capture(username, image_path)
+    if files:
+        file_remover.remove(files)
+        logger.info(f"Удален снимок {image_path} для {username}")
+        return jsonify({"status": "success"}), 200
     logger.error(f"Снимок {image_path} не найден для {username}")
     return jsonify({"error": "Изображение не найдено"}), 404
 
-# Эндпоинт для отдачи изображений
+# Выбор снимков для пакетных операций из тела запроса: ids (идентификаторы снимков) и paths (пути снимков
+# без идентификатора), camera_name и интервал start/end (Unix-время). Нужен хотя бы один критерий,
+# чтобы пустой запрос не затронул все снимки пользователя.
+def capture_selection(data):
+    selection = {}
+    for key, name in (("ids", "capture_ids"), ("paths", "paths")):
+        values = data.get(key)
+        if values is not None:
+            if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                raise ValueError(f"Параметр {key} должен быть списком строк")
+            selection[name] = [value.replace("\\", "/") for value in values] if key == "paths" else values
+    if data.get("camera_name"):
+        selection["camera_name"] = data["camera_name"]
+    for key in ("start", "end"):
+        if data.get(key) not in (None, ""):
+            try:
+                selection[key] = float(data[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"Параметр {key} должен быть числом")
+    if not selection:
+        raise ValueError("Не указаны снимки: ids, paths, camera_name, start или end")
+    return selection
+
+# Эндпоинт для пакетного удаления снимков: строки индекса удаляются одной транзакцией, файлы - в фоне
+@app.route('/delete_captures', methods=['POST'])
+@require_session
+def delete_captures():
+    data = request.json
+    username = data.get("username")
+    try:
+        selection = capture_selection(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    paths, files = capture_store.delete_captures(username, **selection)
+    file_remover.remove(files)
+    logger.info(f"Удалено снимков для {username}: {len(paths)}")
+    return jsonify({"deleted": len(paths), "paths": paths}), 200
+
+# Эндпоинт для пакетной отметки снимков просмотренными (viewed: false снимает отметку)
+@app.route('/mark_captures_viewed', methods=['POST'])
+@require_session
+def mark_captures_viewed():
+    data = request.json
+    username = data.get("username")
+    try:
+        selection = capture_selection(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    paths = capture_store.mark_viewed(username, bool(data.get("viewed", True)), **selection)
+    logger.info(f"Изменена отметка просмотра снимков для {username}: {len(paths)}")
+    return jsonify({"updated": len(paths), "paths": paths}), 200
+
+# Эндпоинт для экспорта снимков: список с метаданными и ссылками на файлы или, с format=zip,
+# потоковый ZIP-архив самих снимков с manifest.json (метки времени и обнаружения)
+@app.route('/export_captures', methods=['POST'])
+@require_session
+def export_captures():
+    data = request.json
+    username = data.get("username")
+    export_format = data.get("format", "json")
+    if export_format not in ("json", "zip"):
+        return jsonify({"error": "Параметр format должен быть json или zip"}), 400
+    try:
+        selection = capture_selection(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if export_format == "zip":
+        captures = capture_store.export_captures(username, detections=True, **selection)
+        for capture in captures:
+            for detection in capture["detections"]:
+                detection["class"] = DETECTION_CLASSES.get(detection["class_id"])
+        logger.info(f"Архив снимков для {username}: {len(captures)}")
+        return Response(
+            stream_zip(captures),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="captures-{time.strftime("%Y-%m-%d_%H-%M-%S")}.zip"'}
+        )
+    captures = capture_store.export_captures(username, **selection)
+    for capture in captures:
+        capture["url"] = f"/captures/{capture['capture_id']}" if capture["capture_id"] else f"/{capture['path']}"
+    logger.info(f"Экспортировано снимков для {username}: {len(captures)}")
+    return jsonify({"captures": captures}), 200
+
+# Отдача файла снимка или клипа. Файлы не изменяются после записи, поэтому ETag строгий (имя, размер, время),
+# Cache-Control - immutable, а If-None-Match (304) и Range (206) обрабатывает send_file.
+# None, если файла нет: проверка выполняется тем же os.stat, что дает размер для ETag.
+def send_capture(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    response = send_file(
+        os.path.abspath(path),
+        conditional=True,
+        etag=f"{os.path.basename(path)}-{stat.st_size}-{int(stat.st_mtime)}",
+        last_modified=stat.st_mtime,
+        max_age=CAPTURE_MAX_AGE
+    )
+    # Доступ к снимкам - по токену сессии: ответ кэширует только клиент, но не общие прокси
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+# Эндпоинт для отдачи снимков и клипов (клипы - с поддержкой Range-запросов для перемотки)
 @app.route('/static/captures/<path:path>')
 def serve_image(path):
     token = request.args.get("token")
@@ -566,10 +1090,23 @@ def serve_image(path):
         logger.error("Недействительный токен для доступа к изображению")
         return jsonify({"error": "Недействительная сессия"}), 401
     full_path = os.path.join('static/captures', path).replace("\\", "/")
-    logger.info(f"Запрос изображения: {full_path}")
+    response = send_capture(full_path)
+    if response is None:
+        logger.error(f"Файл не найден: {full_path}")
+        return jsonify({"error": "Файл не найден"}), 404
+    return response
+
+# Эндпоинт для отдачи сегментов записи (с поддержкой Range-запросов)
+@app.route('/static/recordings/<path:path>')
+def serve_recording(path):
+    token = request.args.get("token")
+    username = check_session(token) if token else None
+    if not username or path.split("/", 1)[0] != username:
+        logger.error("Недействительный токен для доступа к записи")
+        return jsonify({"error": "Недействительная сессия"}), 401
+    full_path = os.path.join('static/recordings', path).replace("\\", "/")
     if os.path.exists(full_path):
-        logger.info(f"Файл найден, отправка: {full_path}")
-        return send_file(full_path)
+        return send_file(os.path.abspath(full_path), conditional=True)
     logger.error(f"Файл не найден: {full_path}")
     return jsonify({"error": "Файл не найден"}), 404
 
@@ -584,7 +1121,7 @@ def admin_login():
 
         if username == ADMIN_USERNAME and hashed_password == ADMIN_PASSWORD_HASH:
             token = generate_token(username)
-            sessions[token] = {"username": username, "expires": time.time() + 3600}
+            session_store.create(token, username)
             if username not in users_db:
                 users_db[username] = {
                     "password": hashed_password,
@@ -612,15 +1149,26 @@ def admin_panel():
         logger.warning("Неавторизованный доступ к /admin/panel")
         return redirect(url_for('admin_login'))
 
+    search = request.args.get("search", "")
+    try:
+        page, per_page = admin_page_params(request.args)
+    except ValueError:
+        page, per_page = 1, ADMIN_USERS_PAGE_SIZE
+    users, total = admin_user_page(search, page, per_page)
+    for user in users:
+        user["last_activity"] = (
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(user["last_activity"])) if user["last_activity"] else "—"
+        )
     logger.info("Доступ к админ-панели")
-    return render_template('admin_panel.html', users=users_db)
+    return render_template(
+        'admin_panel.html', users=users, search=search, page=page, pages=max(1, -(-total // per_page)), total=total
+    )
 
 # Эндпоинт для выхода админа
 @app.route('/admin/logout', methods=['POST'])
 def admin_logout():
     token = request.cookies.get('admin_token')
-    if token in sessions:
-        del sessions[token]
+    if session_store.delete(token):
         logger.info("Админ вышел из системы")
     response = jsonify({"status": "success"})
     response.delete_cookie('admin_token')
@@ -639,16 +1187,18 @@ def delete_user(username):
             logger.error("Админ не может удалить сам себя")
             return jsonify({"error": "Нельзя удалить самого себя"}), 403
 
-        del users_db[username]
-        if username in active_cameras:
-            del active_cameras[username]
-        if username in captured_images:
-            user_image_dir = os.path.join("static/captures", username).replace("\\", "/")
-            if os.path.exists(user_image_dir):
-                shutil.rmtree(user_image_dir)
-            del captured_images[username]
-        if username in new_images:
-            del new_images[username]
+        with auth_code_index.lock:
+            del users_db[username]
+            auth_code_index.remove_user(username)
+        refresh_detection_rules(username)
+        session_store.delete_user(username)
+        supervisor.stop(username)
+        recording_supervisor.stop(username)
+        capture_store.delete_user(username)
+        for root in ("static/captures", "static/recordings"):
+            user_dir = os.path.join(root, username).replace("\\", "/")
+            if os.path.exists(user_dir):
+                shutil.rmtree(user_dir)
 
         save_db()
         logger.info(f"Пользователь {username} удален админом")
@@ -657,15 +1207,68 @@ def delete_user(username):
     logger.error(f"Пользователь {username} не найден")
     return jsonify({"error": "Пользователь не найден"}), 404
 
-# Эндпоинт для получения списка пользователей
+# Параметры страницы списка пользователей: (page, per_page); ValueError при нечисловых значениях
+def admin_page_params(args):
+    page = max(int(args.get("page", 1)), 1)
+    per_page = min(max(int(args.get("per_page", ADMIN_USERS_PAGE_SIZE)), 1), ADMIN_USERS_MAX_PAGE_SIZE)
+    return page, per_page
+
+# Страница списка пользователей для админа: поиск по подстроке имени, итоги по счетчикам индекса снимков
+# и сессиям, без обхода снимков. Пароли, камеры и настройки в список не попадают. Возвращает (пользователи, всего).
+def admin_user_page(search, page, per_page):
+    search = search.lower()
+    usernames = sorted(username for username in list(users_db) if search in username.lower())
+    page_usernames = usernames[(page - 1) * per_page:page * per_page]
+    totals = capture_store.user_totals(page_usernames)
+    users = []
+    for username in page_usernames:
+        user = users_db.get(username, {})
+        usage = totals.get(username, {})
+        activity = [moment for moment in (
+            session_store.last_seen(username), user.get("last_login"), usage.get("last_capture")
+        ) if moment]
+        users.append({
+            "username": username,
+            "role": user.get("role", "user"),
+            "camera_count": len(user.get("cameras", {})),
+            "capture_count": usage.get("capture_count") or 0,
+            "disk_bytes": (usage.get("capture_bytes") or 0) + (usage.get("segment_bytes") or 0),
+            "last_activity": max(activity) if activity else None,
+            "online": session_store.user_sessions(username) > 0,
+        })
+    return users, len(usernames)
+
+# Эндпоинт для получения списка пользователей: страница с итогами, поиск по имени (search)
 @app.route('/admin/users', methods=['GET'])
 def admin_users():
     token = request.args.get("token")
     if not check_admin_session(token):
         logger.error("Недействительная сессия или недостаточно прав для доступа к пользователям")
         return jsonify({"error": "Недействительная сессия или недостаточно прав"}), 401
+    try:
+        page, per_page = admin_page_params(request.args)
+    except ValueError:
+        return jsonify({"error": "Параметры page и per_page должны быть целыми числами"}), 400
+    users, total = admin_user_page(request.args.get("search", ""), page, per_page)
     logger.info("Возвращены данные пользователей для админа")
-    return jsonify({"users": users_db}), 200
+    return jsonify({"users": users, "total": total, "page": page, "per_page": per_page}), 200
+
+# Эндпоинт для получения занятого места по пользователям (из счетчиков индекса)
+@app.route('/admin/usage', methods=['GET'])
+def admin_usage():
+    token = request.args.get("token")
+    if not check_admin_session(token):
+        logger.error("Недействительная сессия или недостаточно прав для доступа к занятому месту")
+        return jsonify({"error": "Недействительная сессия или недостаточно прав"}), 401
+    usage = {}
+    for username, cameras in capture_store.usage().items():
+        totals = {key: sum(camera[key] for camera in cameras.values())
+                  for key in ("capture_count", "capture_bytes", "segment_count", "segment_bytes")}
+        totals["max_bytes"] = user_retention(username)
+        totals["cameras"] = cameras
+        usage[username] = totals
+    logger.info("Возвращено занятое место для админа")
+    return jsonify({"usage": usage}), 200
 
 # Эндпоинт для получения данных пользователя
 @app.route('/admin/user/<username>', methods=['GET'])
@@ -676,7 +1279,8 @@ def get_user(username):
         return jsonify({"error": "Недействительная сессия или недостаточно прав"}), 401
     if username in users_db:
         logger.info(f"Возвращены данные пользователя {username}")
-        return jsonify({"user": users_db[username]}), 200
+        user = {key: value for key, value in users_db[username].items() if key != "password"}
+        return jsonify({"user": user, "usage": capture_store.usage(username).get(username, {})}), 200
     logger.error(f"Пользователь {username} не найден")
     return jsonify({"error": "Пользователь не найден"}), 404
 
@@ -689,9 +1293,19 @@ def update_user(username):
         return jsonify({"error": "Недействительная сессия или недостаточно прав"}), 401
     data = request.json
     if username in users_db:
-        users_db[username]["cameras"] = data.get("cameras", users_db[username]["cameras"])
-        users_db[username]["detection_settings"] = data.get("detection_settings",
-                                                            users_db[username]["detection_settings"])
+        # Все поля проверяются до изменения пользователя: неверная запись не должна попасть в users.json
+        changes = {}
+        try:
+            if "retention" in data:
+                changes["retention"] = build_retention_policy(data["retention"])
+            if "detection_settings" in data:
+                changes["detection_settings"] = validate_detection_settings(data["detection_settings"])
+            if "cameras" in data:
+                changes["cameras"] = build_camera_records(data["cameras"])
+        except ValueError as e:
+            logger.error(f"Неверные данные пользователя {username}: {e}")
+            return jsonify({"error": str(e)}), 400
+        users_db[username].update(changes)
         users_db[username]["role"] = data.get("role", users_db[username]["role"])
         save_db()
         update_active_cameras(username)
@@ -700,6 +1314,33 @@ def update_user(username):
     logger.error(f"Пользователь {username} не найден")
     return jsonify({"error": "Пользователь не найден"}), 404
 
+# Эндпоинт для получения списка camera_worker и распределения камер между ними
+@app.route('/admin/workers', methods=['GET'])
+def admin_workers():
+    token = request.args.get("token")
+    if not check_admin_session(token):
+        logger.error("Недействительная сессия или недостаточно прав для доступа к camera_worker")
+        return jsonify({"error": "Недействительная сессия или недостаточно прав"}), 401
+    ring, _ = worker_registry.refresh(force=True)
+    assigned = {}
+    for username, user in users_db.items():
+        for camera_name in user.get("cameras", {}):
+            node_id = ring.node_for(camera_key(username, camera_name))
+            assigned.setdefault(node_id, []).append({"username": username, "camera_name": camera_name})
+    workers = [
+        {
+            "node_id": row["node_id"],
+            "url": row["url"],
+            "pid": row["pid"],
+            "started": row["started"],
+            "heartbeat": row["heartbeat"],
+            "cameras": assigned.get(row["node_id"], []),
+        }
+        for row in capture_store.live_workers(WORKER_HEARTBEAT_TIMEOUT)
+    ]
+    logger.info("Возвращен список camera_worker для админа")
+    return jsonify({"runtime": CAMERA_RUNTIME, "workers": workers, "unassigned": assigned.get(None, [])}), 200
+
 # Эндпоинт для получения логов
 @app.route('/admin/logs', methods=['GET'])
 def get_logs():
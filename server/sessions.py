@@ -0,0 +1,132 @@
+import heapq
+import hashlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Ключ сессии - хеш токена: в памяти и в индексе снимков не хранятся сами токены
+def session_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+# Хранилище сессий: {ключ: (username, expires)}, индекс сессий пользователя для выхода со всех устройств
+# и куча сроков действия, по которой sweep() удаляет истекшие сессии без обхода всех сессий.
+# persist - необязательное хранилище (CaptureStore), чтобы сессии переживали перезапуск сервера.
+class SessionStore:
+    def __init__(self, ttl, persist=None):
+        self.ttl = ttl
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._users = {}
+        self._last_seen = {}  # {username: время последнего запроса с действующей сессией}
+        self._expiry = []  # [(expires, key)]; запись устаревает, если сессия удалена или продлена
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _add(self, key, username, expires):
+        self._sessions[key] = (username, expires)
+        self._users.setdefault(username, set()).add(key)
+        heapq.heappush(self._expiry, (expires, key))
+
+    def _remove(self, key):
+        username, _ = self._sessions.pop(key)
+        keys = self._users.get(username)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._users[username]
+
+    # Загрузка действующих сессий из постоянного хранилища
+    def load(self):
+        if not self.persist:
+            return 0
+        sessions = self.persist.load_sessions(time.time())
+        with self._lock:
+            for key, username, expires in sessions:
+                self._add(key, username, expires)
+        return len(sessions)
+
+    def create(self, token, username):
+        key = session_key(token)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._add(key, username, expires)
+        self._last_seen[username] = time.time()
+        if self.persist:
+            self.persist.save_session(key, username, expires)
+
+    # Владелец действующей сессии или None
+    def get(self, token):
+        if not token:
+            return None
+        session = self._sessions.get(session_key(token))
+        now = time.time()
+        if session is None or session[1] <= now:
+            return None
+        self._last_seen[session[0]] = now
+        return session[0]
+
+    def delete(self, token):
+        if not token:
+            return False
+        key = session_key(token)
+        with self._lock:
+            if key not in self._sessions:
+                return False
+            self._remove(key)
+        if self.persist:
+            self.persist.delete_sessions([key])
+        return True
+
+    # Выход со всех устройств; возвращает число завершенных сессий
+    def delete_user(self, username):
+        with self._lock:
+            keys = list(self._users.get(username, ()))
+            for key in keys:
+                self._remove(key)
+        if self.persist and keys:
+            self.persist.delete_sessions(keys)
+        return len(keys)
+
+    def user_sessions(self, username):
+        return len(self._users.get(username, ()))
+
+    # Время последнего запроса пользователя в этом процессе или None
+    def last_seen(self, username):
+        return self._last_seen.get(username)
+
+    # Удаление истекших сессий: из кучи извлекаются только записи со сроком до now
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires, key = heapq.heappop(self._expiry)
+                session = self._sessions.get(key)
+                if session is not None and session[1] == expires:
+                    self._remove(key)
+                    expired.append(key)
+        if self.persist:
+            self.persist.delete_expired_sessions(now)
+        if expired:
+            logger.info(f"Удалено истекших сессий: {len(expired)}")
+        return len(expired)
+
+    def _run(self, interval):
+        while not self._stop_event.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Ошибка очистки сессий: {e}")
+
+    def start(self, interval):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="sessions", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,82 @@
+import hmac
+import time
+import bisect
+import hashlib
+import threading
+
+# Число виртуальных точек узла на кольце (равномернее распределение камер)
+DEFAULT_REPLICAS = 128
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+# Ключ камеры на кольце
+def camera_key(username, camera_name):
+    return f"{username}/{camera_name}"
+
+
+# Консистентное хеширование: при добавлении или удалении узла переезжают только камеры этого узла
+class HashRing:
+    def __init__(self, nodes=(), replicas=DEFAULT_REPLICAS):
+        self.nodes = frozenset(nodes)
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key):
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+# Реестр живых camera_worker по heartbeat в общем хранилище.
+# Состав узлов кешируется на cache_ttl секунд, кольцо пересобирается только при его изменении.
+class WorkerRegistry:
+    def __init__(self, store, timeout, cache_ttl=1):
+        self.store = store
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._workers = {}  # {node_id: url}
+        self._ring = HashRing()
+
+    def refresh(self, force=False):
+        now = time.time()
+        with self._lock:
+            if not force and now - self._checked < self.cache_ttl:
+                return self._ring, self._workers
+            workers = {row["node_id"]: row["url"] for row in self.store.live_workers(self.timeout)}
+            if set(workers) != self._ring.nodes:
+                self._ring = HashRing(workers)
+            self._workers = workers
+            self._checked = now
+            return self._ring, self._workers
+
+    def workers(self):
+        return self.refresh()[1]
+
+    # Узел-владелец камеры: (node_id, url) или (None, None), если живых узлов нет
+    def owner(self, username, camera_name):
+        ring, workers = self.refresh()
+        node_id = ring.node_for(camera_key(username, camera_name))
+        return node_id, workers.get(node_id)
+
+
+# Подпись ссылки на поток кадров camera_worker (сервер кадров не проверяет сессии пользователей)
+def stream_signature(secret, username, camera_name, expires):
+    message = f"{username}\n{camera_name}\n{expires}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_stream_signature(secret, username, camera_name, expires, signature):
+    try:
+        if float(expires) < time.time():
+            return False
+    except (TypeError, ValueError):
+        return False
+    expected = stream_signature(secret, username, camera_name, expires)
+    return hmac.compare_digest(expected, signature or "")
@@ -0,0 +1,87 @@
+import os
+import queue
+import logging
+import threading
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Форматы снимков: имя -> (расширение файла, параметр качества OpenCV)
+SNAPSHOT_FORMATS = {
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+# Кодирование снимка в память один раз: уменьшение до max_size по большей стороне (0 - без уменьшения)
+# и сжатие в заданном формате. Возвращает (байты, расширение) или (None, расширение) при ошибке.
+def encode_snapshot(frame, image_format, quality, max_size=0):
+    extension, quality_flag = SNAPSHOT_FORMATS[image_format]
+    height, width = frame.shape[:2]
+    if max_size and max(height, width) > max_size:
+        scale = max_size / max(height, width)
+        frame = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode(extension, frame, [quality_flag, quality])
+    return (buffer.tobytes() if ret else None), extension
+
+
+# Запись файла через временный файл, чтобы читатели не видели недописанный снимок
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.part"
+    with open(partial, "wb") as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+# Фоновая запись снимков: поток камеры передает готовые байты и не ждет диск.
+# on_written(path) вызывается в потоке записи после появления файла.
+# При переполнении очереди снимок пишется в потоке камеры, чтобы событие не потерялось.
+class SnapshotWriter:
+    def __init__(self, workers=2, max_pending=64):
+        self.workers = workers
+        self._queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"snapshot-writer-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, path, data, on_written):
+        self._start()
+        try:
+            self._queue.put_nowait((path, data, on_written))
+        except queue.Full:
+            logger.warning(f"Очередь записи снимков переполнена, снимок {path} записывается синхронно")
+            self._write(path, data, on_written)
+
+    def _run(self):
+        while True:
+            path, data, on_written = self._queue.get()
+            try:
+                self._write(path, data, on_written)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path, data, on_written):
+        try:
+            write_file(path, data)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить кадр: {path}: {e}")
+            return
+        logger.info(f"Сохранен кадр: {path}")
+        try:
+            on_written(path)
+        except Exception as e:
+            logger.error(f"Ошибка обработки снимка {path}: {e}")
+
+    # Ожидание записи всех поставленных снимков (при остановке сервера)
+    def join(self):
+        self._queue.join()
@@ -0,0 +1,657 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import contextlib
+from datetime import datetime
+
+# Схема индекса снимков. Файл базы общий для API и процессов camera_worker (режим WAL).
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    timestamp TEXT NOT NULL,
+    created REAL NOT NULL,
+    is_new INTEGER NOT NULL DEFAULT 1,
+    clip TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    clip_size INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS captures_user_camera ON captures (username, camera, created);
+CREATE INDEX IF NOT EXISTS captures_user_created ON captures (username, created);
+CREATE INDEX IF NOT EXISTS captures_new ON captures (username) WHERE is_new = 1;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_user_camera ON segments (username, camera, started);
+CREATE TABLE IF NOT EXISTS usage (
+    username TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    capture_count INTEGER NOT NULL DEFAULT 0,
+    capture_bytes INTEGER NOT NULL DEFAULT 0,
+    segment_count INTEGER NOT NULL DEFAULT 0,
+    segment_bytes INTEGER NOT NULL DEFAULT 0,
+    last_capture REAL,
+    PRIMARY KEY (username, camera)
+);
+CREATE TABLE IF NOT EXISTS detections (
+    capture INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    class_id INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    x1 REAL NOT NULL,
+    y1 REAL NOT NULL,
+    x2 REAL NOT NULL,
+    y2 REAL NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS detections_capture ON detections (capture);
+CREATE INDEX IF NOT EXISTS detections_user_class ON detections (username, class_id, created);
+CREATE INDEX IF NOT EXISTS detections_user_camera_class ON detections (username, camera, class_id, created);
+CREATE TABLE IF NOT EXISTS sessions (
+    key TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires);
+CREATE TABLE IF NOT EXISTS workers (
+    node_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    pid INTEGER,
+    started REAL NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+# Столбцы снимков, добавленные после первой версии схемы
+CAPTURE_COLUMNS = {
+    "clip": "TEXT",
+    "size": "INTEGER NOT NULL DEFAULT 0",
+    "clip_size": "INTEGER NOT NULL DEFAULT 0",
+    "capture_id": "TEXT",
+    "viewed": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Учет занятого места: счетчики usage меняются триггерами в той же транзакции, что и индекс.
+# Размер клипа учитывается у одного снимка события (clip_size), чтобы не считать его дважды.
+USAGE_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS usage_capture_insert AFTER INSERT ON captures BEGIN
+        INSERT INTO usage (username, camera, capture_count, capture_bytes)
+        VALUES (NEW.username, NEW.camera, 1, NEW.size + NEW.clip_size)
+        ON CONFLICT (username, camera) DO UPDATE SET
+            capture_count = capture_count + 1, capture_bytes = capture_bytes + excluded.capture_bytes;
+    END""",
+    # Время последнего снимка камеры; вставка с ON CONFLICT не зависит от порядка срабатывания триггеров
+    """CREATE TRIGGER IF NOT EXISTS usage_capture_last AFTER INSERT ON captures BEGIN
+        INSERT INTO usage (username, camera, last_capture) VALUES (NEW.username, NEW.camera, NEW.created)
+        ON CONFLICT (username, camera) DO UPDATE SET
+            last_capture = MAX(COALESCE(last_capture, 0), excluded.last_capture);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS usage_capture_delete AFTER DELETE ON captures BEGIN
+        UPDATE usage SET capture_count = capture_count - 1, capture_bytes = capture_bytes - OLD.size - OLD.clip_size
+        WHERE username = OLD.username AND camera = OLD.camera;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS usage_capture_update AFTER UPDATE OF size, clip_size ON captures BEGIN
+        UPDATE usage SET capture_bytes = capture_bytes + NEW.size + NEW.clip_size - OLD.size - OLD.clip_size
+        WHERE username = NEW.username AND camera = NEW.camera;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS usage_segment_insert AFTER INSERT ON segments BEGIN
+        INSERT INTO usage (username, camera, segment_count, segment_bytes)
+        VALUES (NEW.username, NEW.camera, 1, NEW.size)
+        ON CONFLICT (username, camera) DO UPDATE SET
+            segment_count = segment_count + 1, segment_bytes = segment_bytes + excluded.segment_bytes;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS usage_segment_delete AFTER DELETE ON segments BEGIN
+        UPDATE usage SET segment_count = segment_count - 1, segment_bytes = segment_bytes - OLD.size
+        WHERE username = OLD.username AND camera = OLD.camera;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS usage_segment_update AFTER UPDATE OF size ON segments BEGIN
+        UPDATE usage SET segment_bytes = segment_bytes + NEW.size - OLD.size
+        WHERE username = NEW.username AND camera = NEW.camera;
+    END""",
+)
+
+# Обнаружения удаляются вместе со снимком (в том числе при очистке и удалении пользователя)
+DETECTION_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS detections_capture_delete AFTER DELETE ON captures BEGIN
+        DELETE FROM detections WHERE capture = OLD.id;
+    END""",
+)
+
+
+# Время создания снимка по его метке "%Y-%m-%d_%H-%M-%S" (для перенесенных снимков)
+def parse_timestamp(timestamp, default):
+    try:
+        return datetime.strptime(timestamp, "%Y-%m-%d_%H-%M-%S").timestamp()
+    except (TypeError, ValueError):
+        return default
+
+
+# Размер файла или 0, если файла нет
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+# Группировка строк снимков в формат API: {camera_name: {path: timestamp}}
+def group_by_camera(rows):
+    result = {}
+    for row in rows:
+        result.setdefault(row["camera"], {})[row["path"]] = row["timestamp"]
+    return result
+
+
+# Индекс снимков в SQLite: одно соединение на поток, запись в явных транзакциях
+class CaptureStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.connection().executescript(SCHEMA)
+        self.migrate()
+
+    def connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # Добавление столбцов, появившихся после создания базы, и однократный подсчет занятого места
+    def migrate(self):
+        with self.transaction() as db:
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(captures)")}
+            for name, definition in CAPTURE_COLUMNS.items():
+                if name not in columns:
+                    db.execute(f"ALTER TABLE captures ADD COLUMN {name} {definition}")
+            db.execute("CREATE INDEX IF NOT EXISTS captures_clip ON captures (clip) WHERE clip IS NOT NULL")
+            db.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS captures_capture_id ON captures (capture_id) "
+                "WHERE capture_id IS NOT NULL"
+            )
+            if "last_capture" not in {row["name"] for row in db.execute("PRAGMA table_info(usage)")}:
+                db.execute("ALTER TABLE usage ADD COLUMN last_capture REAL")
+                db.execute(
+                    "UPDATE usage SET last_capture = (SELECT MAX(created) FROM captures "
+                    "WHERE captures.username = usage.username AND captures.camera = usage.camera)"
+                )
+            if not db.execute("SELECT 1 FROM meta WHERE key = 'usage_tracked'").fetchone():
+                self._count_usage(db)
+                db.execute("INSERT INTO meta (key, value) VALUES ('usage_tracked', '1')")
+            for trigger in USAGE_TRIGGERS + DETECTION_TRIGGERS:
+                db.execute(trigger)
+
+    # Размеры файлов существующих снимков и начальные значения счетчиков usage
+    def _count_usage(self, db):
+        clips = set()
+        updates = []
+        for row in db.execute("SELECT id, path, clip FROM captures ORDER BY created").fetchall():
+            clip_size = 0
+            if row["clip"] and row["clip"] not in clips:
+                clips.add(row["clip"])
+                clip_size = file_size(row["clip"])
+            updates.append((file_size(row["path"]), clip_size, row["id"]))
+        db.executemany("UPDATE captures SET size = ?, clip_size = ? WHERE id = ?", updates)
+        db.execute("DELETE FROM usage")
+        db.execute(
+            "INSERT INTO usage (username, camera, capture_count, capture_bytes, last_capture) "
+            "SELECT username, camera, COUNT(*), SUM(size + clip_size), MAX(created) FROM captures "
+            "GROUP BY username, camera"
+        )
+        db.execute(
+            "INSERT INTO usage (username, camera, segment_count, segment_bytes) "
+            "SELECT username, camera, COUNT(*), SUM(size) FROM segments WHERE true GROUP BY username, camera "
+            "ON CONFLICT (username, camera) DO UPDATE SET "
+            "segment_count = excluded.segment_count, segment_bytes = excluded.segment_bytes"
+        )
+
+    @contextlib.contextmanager
+    def transaction(self):
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    # Снимок и его обнаружения одной транзакцией.
+    # detections - [(class_id, confidence, (x1, y1, x2, y2))], рамки в долях ширины и высоты кадра.
+    def add_capture(self, username, camera_name, path, timestamp, size=0, capture_id=None, detections=()):
+        created = time.time()
+        with self.transaction() as db:
+            db.execute(
+                "INSERT INTO captures (username, camera, path, timestamp, created, size, capture_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET timestamp = excluded.timestamp, created = excluded.created, "
+                "size = excluded.size, capture_id = excluded.capture_id, is_new = 1",
+                (username, camera_name, path, timestamp, created, size, capture_id)
+            )
+            row_id = db.execute("SELECT id FROM captures WHERE path = ?", (path,)).fetchone()[0]
+            db.execute("DELETE FROM detections WHERE capture = ?", (row_id,))
+            db.executemany(
+                "INSERT INTO detections (capture, username, camera, class_id, confidence, x1, y1, x2, y2, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (row_id, username, camera_name, class_id, confidence, *box, created)
+                    for class_id, confidence, box in detections
+                ]
+            )
+            return row_id
+
+    # Поиск снимков по обнаруженным объектам, новые первыми: камера, классы, минимальная уверенность
+    # и интервал времени создания необязательны. Возвращает [{id, capture_id, camera, path, timestamp,
+    # created, detections: [{class_id, confidence, box}]}].
+    def search_captures(self, username, camera_name=None, class_ids=None, min_confidence=0,
+                        start=None, end=None, limit=100):
+        query = "SELECT capture FROM detections WHERE username = ?"
+        params = [username]
+        if camera_name is not None:
+            query += " AND camera = ?"
+            params.append(camera_name)
+        if class_ids:
+            query += f" AND class_id IN ({', '.join('?' * len(class_ids))})"
+            params += list(class_ids)
+        if min_confidence:
+            query += " AND confidence >= ?"
+            params.append(min_confidence)
+        if start is not None:
+            query += " AND created >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND created <= ?"
+            params.append(end)
+        db = self.connection()
+        rows = db.execute(
+            "SELECT id, capture_id, camera, path, timestamp, created FROM captures "
+            f"WHERE id IN ({query}) ORDER BY created DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return self._with_detections(db, rows)
+
+    # Строки снимков (со столбцом id) с их обнаружениями: [{..., detections: [{class_id, confidence, box}]}]
+    def _with_detections(self, db, rows):
+        result = {row["id"]: dict(row, detections=[]) for row in rows}
+        if result:
+            for row in db.execute(
+                "SELECT capture, class_id, confidence, x1, y1, x2, y2 FROM detections "
+                "WHERE capture IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(result)),)
+            ):
+                result[row["capture"]]["detections"].append({
+                    "class_id": row["class_id"],
+                    "confidence": row["confidence"],
+                    "box": [row["x1"], row["y1"], row["x2"], row["y2"]],
+                })
+        for capture in result.values():
+            del capture["id"]
+        return list(result.values())
+
+    # Снимок по идентификатору (для ссылок вида /captures/<id>)
+    def capture(self, username, capture_id):
+        return self.connection().execute(
+            "SELECT camera, path, timestamp, clip FROM captures WHERE capture_id = ? AND username = ?",
+            (capture_id, username)
+        ).fetchone()
+
+    # Снимки, еще не перенесенные в раскладку с идентификаторами (для инструмента миграции)
+    def unmigrated_captures(self, limit):
+        return self.connection().execute(
+            "SELECT id, username, camera, path, clip, created FROM captures WHERE capture_id IS NULL "
+            "ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+
+    def capture_ids(self):
+        return {row[0] for row in self.connection().execute(
+            "SELECT capture_id FROM captures WHERE capture_id IS NOT NULL"
+        )}
+
+    # Перенос путей одной транзакцией: moves - [(row_id, capture_id, path)], clips - {old_clip: new_clip}
+    def move_captures(self, moves, clips):
+        with self.transaction() as db:
+            db.executemany(
+                "UPDATE captures SET capture_id = ?, path = ? WHERE id = ?",
+                [(capture_id, path, row_id) for row_id, capture_id, path in moves]
+            )
+            db.executemany("UPDATE captures SET clip = ? WHERE clip = ?", [(new, old) for old, new in clips.items()])
+
+    def captures(self, username):
+        rows = self.connection().execute(
+            "SELECT camera, path, timestamp FROM captures WHERE username = ? ORDER BY created", (username,)
+        )
+        return group_by_camera(rows)
+
+    # Новые снимки пользователя; после выдачи перестают быть новыми
+    def take_new(self, username):
+        with self.transaction() as db:
+            rows = db.execute(
+                "SELECT camera, path, timestamp FROM captures WHERE username = ? AND is_new = 1 ORDER BY created",
+                (username,)
+            ).fetchall()
+            db.execute("UPDATE captures SET is_new = 0 WHERE username = ? AND is_new = 1", (username,))
+        return group_by_camera(rows)
+
+    # Удаление строк снимков внутри транзакции; возвращает файлы для удаления.
+    # Клип удаляется, только если на него больше не ссылаются снимки, иначе его размер переходит к оставшемуся.
+    def _delete_rows(self, db, rows):
+        db.executemany("DELETE FROM captures WHERE id = ?", [(row["id"],) for row in rows])
+        files = [row["path"] for row in rows]
+        clips = {}
+        for row in rows:
+            if row["clip"]:
+                clips[row["clip"]] = clips.get(row["clip"], 0) + row["clip_size"]
+        for clip, clip_size in clips.items():
+            if not db.execute("SELECT 1 FROM captures WHERE clip = ?", (clip,)).fetchone():
+                files.append(clip)
+            elif clip_size:
+                db.execute(
+                    "UPDATE captures SET clip_size = clip_size + ? "
+                    "WHERE id = (SELECT id FROM captures WHERE clip = ? ORDER BY created LIMIT 1)",
+                    (clip_size, clip)
+                )
+        return files
+
+    # Удаление снимка; возвращает файлы для удаления
+    def delete_capture(self, username, path):
+        with self.transaction() as db:
+            rows = db.execute(
+                "SELECT id, path, clip, clip_size FROM captures WHERE username = ? AND path = ?", (username, path)
+            ).fetchall()
+            return self._delete_rows(db, rows)
+
+    # Условие выбора снимков пользователя для пакетных операций: перечисленные снимки, камера и
+    # интервал времени создания (все необязательны, заданные объединяются через AND). Снимки перечисляются
+    # идентификаторами и путями (у снимков, не перенесенных в новую раскладку, идентификатора нет) - выбирается
+    # снимок из любого из двух списков. Списки передаются одним параметром JSON каждый, поэтому их длина
+    # не ограничена числом параметров SQLite.
+    def _selection(self, username, capture_ids=None, paths=None, camera_name=None, start=None, end=None):
+        query = "username = ?"
+        params = [username]
+        if capture_ids is not None or paths is not None:
+            query += (
+                " AND (capture_id IN (SELECT value FROM json_each(?)) OR path IN (SELECT value FROM json_each(?)))"
+            )
+            params += [json.dumps(list(capture_ids or ())), json.dumps(list(paths or ()))]
+        if camera_name is not None:
+            query += " AND camera = ?"
+            params.append(camera_name)
+        if start is not None:
+            query += " AND created >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND created <= ?"
+            params.append(end)
+        return query, params
+
+    # Пакетное удаление снимков одной транзакцией; возвращает (пути удаленных снимков, файлы для удаления)
+    def delete_captures(self, username, **selection):
+        query, params = self._selection(username, **selection)
+        with self.transaction() as db:
+            rows = db.execute(f"SELECT id, path, clip, clip_size FROM captures WHERE {query}", params).fetchall()
+            if not rows:
+                return [], []
+            return [row["path"] for row in rows], self._delete_rows(db, rows)
+
+    # Пакетная отметка снимков просмотренными (или непросмотренными); возвращает пути выбранных снимков
+    def mark_viewed(self, username, viewed=True, **selection):
+        query, params = self._selection(username, **selection)
+        with self.transaction() as db:
+            paths = [row[0] for row in db.execute(f"SELECT path FROM captures WHERE {query}", params)]
+            if paths:
+                db.execute(f"UPDATE captures SET viewed = ? WHERE {query}", [int(viewed)] + params)
+            return paths
+
+    # Снимки для экспорта, старые первыми: [{capture_id, camera, path, timestamp, created, size, clip, viewed}];
+    # с detections=True - вместе с обнаружениями, как в search_captures
+    def export_captures(self, username, detections=False, **selection):
+        query, params = self._selection(username, **selection)
+        db = self.connection()
+        rows = db.execute(
+            "SELECT id, capture_id, camera, path, timestamp, created, size, clip, viewed FROM captures "
+            f"WHERE {query} ORDER BY created",
+            params
+        ).fetchall()
+        if detections:
+            captures = self._with_detections(db, rows)
+        else:
+            captures = [dict(row) for row in rows]
+            for capture in captures:
+                del capture["id"]
+        for capture in captures:
+            capture["viewed"] = bool(capture["viewed"])
+        return captures
+
+    # Идентификаторы снимков пользователя и просмотренные снимки: ({path: capture_id или None}, [path])
+    def capture_states(self, username):
+        ids = {}
+        viewed = []
+        for row in self.connection().execute(
+            "SELECT path, capture_id, viewed FROM captures WHERE username = ?", (username,)
+        ):
+            ids[row["path"]] = row["capture_id"]
+            if row["viewed"]:
+                viewed.append(row["path"])
+        return ids, viewed
+
+    # Удаление самых старых снимков пользователя (или одной камеры) одной транзакцией:
+    # все снимки старше before и далее по возрасту, пока не освобождено excess байт.
+    # Возвращает (файлы для удаления, освобождено байт).
+    def trim_captures(self, username, camera_name=None, before=None, excess=0):
+        query = "SELECT id, path, clip, size, clip_size, created FROM captures WHERE username = ?"
+        params = [username]
+        if camera_name is not None:
+            query += " AND camera = ?"
+            params.append(camera_name)
+        with self.transaction() as db:
+            rows = []
+            freed = 0
+            cursor = db.execute(query + " ORDER BY created", params)
+            for row in cursor:
+                if not (before and row["created"] < before) and freed >= excess:
+                    break
+                rows.append(row)
+                freed += row["size"] + row["clip_size"]
+            cursor.close()
+            if not rows:
+                return [], 0
+            return self._delete_rows(db, rows), freed
+
+    # Привязка записанного клипа к снимкам события; размер клипа учитывается у первого снимка, найденного
+    # в индексе. Возвращает число привязанных снимков (0 - на клип не ссылается ни один снимок).
+    def set_clip(self, paths, clip, size=0):
+        with self.transaction() as db:
+            attached = [
+                path for path in paths
+                if db.execute("UPDATE captures SET clip = ? WHERE path = ?", (clip, path)).rowcount
+            ]
+            if attached:
+                db.execute("UPDATE captures SET clip_size = ? WHERE path = ?", (size, attached[0]))
+        return len(attached)
+
+    # Клипы пользователя: {camera_name: {path: clip}}
+    def clips(self, username):
+        rows = self.connection().execute(
+            "SELECT camera, path, clip FROM captures WHERE username = ? AND clip IS NOT NULL ORDER BY created",
+            (username,)
+        )
+        result = {}
+        for row in rows:
+            result.setdefault(row["camera"], {})[row["path"]] = row["clip"]
+        return result
+
+    def delete_user(self, username):
+        with self.transaction() as db:
+            db.execute("DELETE FROM captures WHERE username = ?", (username,))
+            db.execute("DELETE FROM segments WHERE username = ?", (username,))
+            db.execute("DELETE FROM usage WHERE username = ?", (username,))
+
+    # Занятое место: {username: {camera_name: {capture_count, capture_bytes, segment_count, segment_bytes}}}
+    def usage(self, username=None):
+        query = "SELECT * FROM usage"
+        params = ()
+        if username is not None:
+            query += " WHERE username = ?"
+            params = (username,)
+        result = {}
+        for row in self.connection().execute(query + " ORDER BY username, camera", params):
+            counters = dict(row)
+            result.setdefault(counters.pop("username"), {})[counters.pop("camera")] = counters
+        return result
+
+    # Итоги пользователей по счетчикам usage (без обхода снимков):
+    # {username: {capture_count, capture_bytes, segment_count, segment_bytes, last_capture}}
+    def user_totals(self, usernames):
+        rows = self.connection().execute(
+            "SELECT username, SUM(capture_count) AS capture_count, SUM(capture_bytes) AS capture_bytes, "
+            "SUM(segment_count) AS segment_count, SUM(segment_bytes) AS segment_bytes, "
+            "MAX(last_capture) AS last_capture FROM usage "
+            "WHERE username IN (SELECT value FROM json_each(?)) GROUP BY username",
+            (json.dumps(list(usernames)),)
+        )
+        return {row["username"]: dict(row) for row in rows}
+
+    # Аренда фоновой задачи, чтобы из нескольких процессов ее выполнял один (продлевается владельцем)
+    def acquire_lease(self, name, owner, ttl):
+        key = f"lease:{name}"
+        with self.transaction() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            if row:
+                holder, expires = row["value"].rsplit("|", 1)
+                if holder != owner and float(expires) > time.time():
+                    return False
+            db.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, f"{owner}|{time.time() + ttl}")
+            )
+        return True
+
+    # Сессии пользователей (ключ - хеш токена), если включено их сохранение между перезапусками
+    def save_session(self, key, username, expires):
+        with self.transaction() as db:
+            db.execute(
+                "INSERT INTO sessions (key, username, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET expires = excluded.expires",
+                (key, username, expires)
+            )
+
+    def load_sessions(self, now):
+        return [
+            tuple(row) for row in self.connection().execute(
+                "SELECT key, username, expires FROM sessions WHERE expires > ?", (now,)
+            )
+        ]
+
+    def delete_sessions(self, keys):
+        with self.transaction() as db:
+            db.executemany("DELETE FROM sessions WHERE key = ?", [(key,) for key in keys])
+
+    def delete_expired_sessions(self, now):
+        with self.transaction() as db:
+            db.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+
+    # Снимки, добавленные после last_id (для рассылки событий в процессах API)
+    def captures_since(self, last_id):
+        return self.connection().execute(
+            "SELECT id, username, camera, path, timestamp, capture_id FROM captures WHERE id > ? ORDER BY id",
+            (last_id,)
+        ).fetchall()
+
+    def max_id(self):
+        return self.connection().execute("SELECT COALESCE(MAX(id), 0) FROM captures").fetchone()[0]
+
+    def add_segment(self, username, camera_name, path, started, duration, size):
+        with self.transaction() as db:
+            db.execute(
+                "INSERT INTO segments (username, camera, path, started, duration, size) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET started = excluded.started, duration = excluded.duration, "
+                "size = excluded.size",
+                (username, camera_name, path, started, duration, size)
+            )
+
+    # Сегменты записи камеры, пересекающиеся с интервалом [start, end]
+    def segments(self, username, camera_name, start=None, end=None):
+        return self.connection().execute(
+            "SELECT path, started, duration, size FROM segments "
+            "WHERE username = ? AND camera = ? AND started <= ? AND started + duration >= ? ORDER BY started",
+            (username, camera_name, end if end is not None else float("inf"), start or 0)
+        ).fetchall()
+
+    # Сегмент, содержащий момент времени (для перемотки к событию)
+    def segment_at(self, username, camera_name, moment):
+        return self.connection().execute(
+            "SELECT path, started, duration, size FROM segments "
+            "WHERE username = ? AND camera = ? AND started <= ? ORDER BY started DESC LIMIT 1",
+            (username, camera_name, moment)
+        ).fetchone()
+
+    # Удаление сегментов, начатых раньше before; возвращает пути файлов для удаления
+    def expire_segments(self, username, camera_name, before):
+        with self.transaction() as db:
+            rows = db.execute(
+                "SELECT path FROM segments WHERE username = ? AND camera = ? AND started < ?",
+                (username, camera_name, before)
+            ).fetchall()
+            db.execute(
+                "DELETE FROM segments WHERE username = ? AND camera = ? AND started < ?",
+                (username, camera_name, before)
+            )
+        return [row["path"] for row in rows]
+
+    # Heartbeat процесса camera_worker (регистрация при первом вызове)
+    def heartbeat(self, node_id, url, pid, started):
+        with self.transaction() as db:
+            db.execute(
+                "INSERT INTO workers (node_id, url, pid, started, heartbeat) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (node_id) DO UPDATE SET url = excluded.url, pid = excluded.pid, "
+                "started = excluded.started, heartbeat = excluded.heartbeat",
+                (node_id, url, pid, started, time.time())
+            )
+
+    def remove_worker(self, node_id):
+        with self.transaction() as db:
+            db.execute("DELETE FROM workers WHERE node_id = ?", (node_id,))
+
+    # Узлы, приславшие heartbeat не позднее max_age секунд назад
+    def live_workers(self, max_age):
+        return self.connection().execute(
+            "SELECT node_id, url, pid, started, heartbeat FROM workers WHERE heartbeat >= ? ORDER BY node_id",
+            (time.time() - max_age,)
+        ).fetchall()
+
+    # Однократный перенос снимков из users.json; возвращает True, если перенос выполнен сейчас
+    def import_legacy(self, captured_images):
+        with self.transaction() as db:
+            if db.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+                return False
+            now = time.time()
+            db.executemany(
+                "INSERT OR IGNORE INTO captures (username, camera, path, timestamp, created, is_new, size) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?)",
+                [
+                    (username, camera_name, path, timestamp, parse_timestamp(timestamp, now), file_size(path))
+                    for username, cameras in captured_images.items()
+                    for camera_name, images in cameras.items()
+                    for path, timestamp in images.items()
+                ]
+            )
+            db.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', '1')")
+        return True
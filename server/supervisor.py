@@ -0,0 +1,87 @@
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Управление потоками обработки камер: запуск, перезапуск при изменении записи и остановка.
+# target(username, camera_name, camera, stop_event) должен завершаться после stop_event.set().
+class CameraSupervisor:
+    def __init__(self, target):
+        self.target = target
+        self._lock = threading.Lock()
+        self._workers = {}  # {(username, camera_name): (thread, stop_event, camera)}
+
+    def _run(self, key, camera, stop_event):
+        try:
+            self.target(key[0], key[1], camera, stop_event)
+        finally:
+            with self._lock:
+                current = self._workers.get(key)
+                if current and current[1] is stop_event:
+                    del self._workers[key]
+
+    # Запуск камеры; уже работающая камера с той же записью не перезапускается
+    def start(self, username, camera_name, camera):
+        key = (username, camera_name)
+        with self._lock:
+            current = self._workers.get(key)
+            if current and current[0].is_alive() and current[2] == camera:
+                return False
+            if current:
+                current[1].set()
+            stop_event = threading.Event()
+            thread = threading.Thread(
+                target=self._run,
+                args=(key, camera, stop_event),
+                name=f"camera-{username}-{camera_name}",
+                daemon=True
+            )
+            self._workers[key] = (thread, stop_event, camera)
+            thread.start()
+        logger.info(f"Запущена обработка камеры {camera_name} для {username}")
+        return True
+
+    # Остановка одной камеры или всех камер пользователя
+    def stop(self, username, camera_name=None):
+        with self._lock:
+            keys = [key for key in self._workers
+                    if key[0] == username and (camera_name is None or key[1] == camera_name)]
+            stopped = [self._workers.pop(key) for key in keys]
+        for thread, stop_event, _ in stopped:
+            stop_event.set()
+        for key in keys:
+            logger.info(f"Остановлена обработка камеры {key[1]} для {key[0]}")
+        return len(keys)
+
+    # Приведение камер пользователя к заданному набору {camera_name: camera}
+    def sync_user(self, username, cameras):
+        for camera_name in set(self.cameras(username)) - set(cameras):
+            self.stop(username, camera_name)
+        for camera_name, camera in cameras.items():
+            self.start(username, camera_name, camera)
+
+    def is_running(self, username, camera_name):
+        with self._lock:
+            current = self._workers.get((username, camera_name))
+        return bool(current and current[0].is_alive())
+
+    # Имена работающих камер пользователя
+    def cameras(self, username):
+        with self._lock:
+            return [key[1] for key in self._workers if key[0] == username]
+
+    # Ключи всех работающих камер
+    def running(self):
+        with self._lock:
+            return list(self._workers)
+
+    def stop_all(self, timeout=5):
+        with self._lock:
+            stopped = list(self._workers.values())
+            self._workers.clear()
+        for _, stop_event, _ in stopped:
+            stop_event.set()
+        for thread, _, _ in stopped:
+            thread.join(timeout)
+        logger.info(f"Остановлена обработка {len(stopped)} камер")
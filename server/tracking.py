@@ -0,0 +1,119 @@
+import itertools
+
+import numpy as np
+
+
+# Попарный IoU рамок: a - (N, 4), b - (M, 4) в формате x1, y1, x2, y2; результат (N, M)
+def iou_matrix(a, b):
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0)
+
+
+# Жадное сопоставление по убыванию IoU; возвращает [(строка, столбец)] с IoU не ниже threshold
+def greedy_match(iou, threshold):
+    pairs = []
+    if not iou.size:
+        return pairs
+    iou = iou.copy()
+    while True:
+        row, column = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[row, column] < threshold:
+            return pairs
+        pairs.append((row, column))
+        iou[row, :] = -1
+        iou[:, column] = -1
+
+
+class Track:
+    def __init__(self, track_id, class_id, box, confidence, now):
+        self.id = track_id
+        self.class_id = class_id
+        self.box = box
+        self.confidence = confidence
+        self.hits = 1
+        self.last_seen = now
+        self.confirmed = False
+        self.anchor = None  # Положение рамки при последнем событии трека
+
+
+# Трекер объектов по IoU в духе ByteTrack, только CPU: сначала с треками сопоставляются обнаружения,
+# прошедшие пороги классов, затем оставшиеся треки продлеваются слабыми (ниже порога). Новые треки создаются
+# только из прошедших порог обнаружений и подтверждаются после min_hits кадров; трек без обнаружений дольше
+# max_age секунд удаляется. Событие - подтверждение трека или смещение рамки больше move_threshold
+# ее диагонали с прошлого события (стоящий объект событий не порождает).
+class IoUTracker:
+    def __init__(self, iou_threshold=0.3, max_age=3.0, min_hits=2, move_threshold=0.5):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.move_threshold = move_threshold
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    # detections и weak - [(class_id, confidence, (x1, y1, x2, y2))]; возвращает треки с событием в этом кадре
+    def update(self, detections, now, weak=()):
+        self.tracks = [track for track in self.tracks if now - track.last_seen <= self.max_age]
+        strong = len(detections)
+        detections = list(detections) + list(weak)
+        if detections:
+            classes = np.array([class_id for class_id, _, _ in detections])
+            confidences = np.array([confidence for _, confidence, _ in detections])
+            boxes = np.array([box for _, _, box in detections], dtype=float)
+        else:
+            classes, confidences, boxes = np.zeros(0, int), np.zeros(0), np.zeros((0, 4))
+
+        unmatched_tracks = list(range(len(self.tracks)))
+        new_detections = set(range(strong))
+        events = []
+        for stage in (np.arange(strong), np.arange(strong, len(detections))):
+            if not len(stage) or not unmatched_tracks:
+                continue
+            track_boxes = np.array([self.tracks[i].box for i in unmatched_tracks])
+            track_classes = np.array([self.tracks[i].class_id for i in unmatched_tracks])
+            iou = iou_matrix(track_boxes, boxes[stage])
+            iou[track_classes[:, None] != classes[stage][None, :]] = 0
+            matched = set()
+            for row, column in greedy_match(iou, self.iou_threshold):
+                track = self.tracks[unmatched_tracks[row]]
+                detection = stage[column]
+                track.box = boxes[detection]
+                track.confidence = confidences[detection]
+                track.hits += 1
+                track.last_seen = now
+                matched.add(row)
+                new_detections.discard(detection)
+                if self._changed(track):
+                    events.append(track)
+            unmatched_tracks = [index for row, index in enumerate(unmatched_tracks) if row not in matched]
+
+        for index in sorted(new_detections):
+            track = Track(next(self._ids), int(classes[index]), boxes[index], confidences[index], now)
+            self.tracks.append(track)
+            if self._changed(track):
+                events.append(track)
+        return events
+
+    # Подтверждение нового трека или заметное смещение подтвержденного
+    def _changed(self, track):
+        if not track.confirmed:
+            if track.hits < self.min_hits:
+                return False
+            track.confirmed = True
+            track.anchor = track.box
+            return True
+        center = (track.box[:2] + track.box[2:]) / 2
+        anchor_center = (track.anchor[:2] + track.anchor[2:]) / 2
+        diagonal = np.hypot(*(track.anchor[2:] - track.anchor[:2]))
+        if np.hypot(*(center - anchor_center)) > self.move_threshold * max(diagonal, 1):
+            track.anchor = track.box
+            return True
+        return False
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from config.config import WORKER_HOST, WORKER_BASE_PORT, WORKER_SYNC_INTERVAL, WORKER_SECRET
+from server.server import (
+    logger, users_db, load_db, auth_code_index, refresh_detection_rules, DB_FILE, supervisor, recording_supervisor, sync_recordings, frame_hub, normalize_camera, capture_store, worker_registry,
+    snapshot_writer, stream_text_part, stream_frame_part, STREAM_TIMEOUT
+)
+from server.sharding import camera_key, verify_stream_signature
+
+
+# Камеры, которые кольцо узлов отдает этому узлу: {username: {camera_name: camera}}
+def owned_cameras(ring, node_id):
+    owned = {}
+    for username, user in users_db.items():
+        for camera_name, record in user.get("cameras", {}).items():
+            if ring.node_for(camera_key(username, camera_name)) == node_id:
+                owned.setdefault(username, {})[camera_name] = normalize_camera(record)
+    return owned
+
+
+# Перечитывание users.json без промежутка, в котором пользователь отсутствует в users_db
+def reload_users():
+    users, _ = load_db()
+    if not users:
+        return False
+    with auth_code_index.lock:
+        users_db.update(users)
+        removed = set(users_db) - set(users)
+        for username in removed:
+            del users_db[username]
+        auth_code_index.rebuild(users_db)
+    for username in removed | set(users):
+        refresh_detection_rules(username)
+    return True
+
+
+# Приведение запущенных камер к набору камер узла
+def sync_cameras(ring, node_id):
+    owned = owned_cameras(ring, node_id)
+    usernames = set(owned) | {username for username, _ in supervisor.running() + recording_supervisor.running()}
+    for username in usernames:
+        supervisor.sync_user(username, owned.get(username, {}))
+        sync_recordings(username, owned.get(username, {}))
+
+
+# Сервер кадров узла: API пересылает зрителям поток /frames или перенаправляет их сюда по подписанной ссылке
+class FrameRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/health":
+            body = json.dumps({
+                "pid": os.getpid(),
+                "cameras": [list(key) for key in supervisor.running()],
+                "viewers": frame_hub.subscriber_count(),
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/frames":
+            username, camera_name = params.get("username"), params.get("camera_name")
+            if not verify_stream_signature(WORKER_SECRET, username, camera_name,
+                                           params.get("expires"), params.get("signature")):
+                self.send_error(403, "Invalid signature")
+                return
+            self.stream_frames(username, camera_name)
+        else:
+            self.send_error(404)
+
+    def stream_frames(self, username, camera_name):
+        key = (username, camera_name)
+        if not supervisor.is_running(username, camera_name):
+            self.send_error(404, "Camera is not running")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.end_headers()
+        subscriber = frame_hub.subscribe(key)
+        try:
+            while True:
+                try:
+                    frame_bytes = subscriber.get(STREAM_TIMEOUT)
+                except queue.Empty:
+                    self.wfile.write(stream_text_part("Stream interrupted"))
+                    break
+                self.wfile.write(stream_frame_part(frame_bytes))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            frame_hub.unsubscribe(key, subscriber)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Процесс обработки камер (декодирование, распознавание, снимки)")
+    parser.add_argument("--host", default=WORKER_HOST, help="Адрес сервера кадров")
+    parser.add_argument("--port", type=int, default=WORKER_BASE_PORT, help="Порт сервера кадров")
+    parser.add_argument("--node-id", help="Имя узла на кольце (по умолчанию host:port)")
+    parser.add_argument("--advertise-url", help="Адрес сервера кадров для API и зрителей (по умолчанию http://host:port)")
+    args = parser.parse_args()
+    node_id = args.node_id or f"{args.host}:{args.port}"
+    advertise_url = (args.advertise_url or f"http://{args.host}:{args.port}").rstrip("/")
+    started = time.time()
+
+    frame_server = ThreadingHTTPServer((args.host, args.port), FrameRequestHandler)
+    frame_server.daemon_threads = True
+    threading.Thread(target=frame_server.serve_forever, name="frame-server", daemon=True).start()
+    logger.info(f"camera_worker {node_id} запущен, сервер кадров {advertise_url}")
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    # Каждый цикл: heartbeat, перечитывание состава узлов и перераспределение камер.
+    # При входе или выходе узла переезжают только камеры, которые кольцо отдает другому узлу.
+    last_mtime = None
+    nodes = None
+    while not stop_event.is_set():
+        try:
+            capture_store.heartbeat(node_id, advertise_url, os.getpid(), started)
+            ring, _ = worker_registry.refresh(force=True)
+            if ring.nodes != nodes:
+                logger.info(f"Состав camera_worker изменился: {', '.join(sorted(ring.nodes))}")
+                nodes = ring.nodes
+            mtime = os.path.getmtime(DB_FILE)
+            if mtime != last_mtime and reload_users():
+                last_mtime = mtime
+            sync_cameras(ring, node_id)
+        except Exception as e:
+            logger.error(f"Ошибка синхронизации камер camera_worker {node_id}: {e}")
+        stop_event.wait(WORKER_SYNC_INTERVAL)
+
+    capture_store.remove_worker(node_id)
+    frame_server.shutdown()
+    supervisor.stop_all()
+    recording_supervisor.stop_all()
+    snapshot_writer.join()
+    logger.info(f"camera_worker {node_id} остановлен")
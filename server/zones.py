@@ -0,0 +1,78 @@
+import math
+
+import cv2
+import numpy as np
+
+# Типы зон: "include" - распознавание только внутри, "exclude" - обнаружения внутри отбрасываются
+ZONE_TYPES = ("include", "exclude")
+
+
+# Проверка зон из запроса: [{"type": "include"|"exclude", "points": [[x, y], ...]}],
+# координаты - доли ширины и высоты кадра, поэтому зоны не зависят от разрешения потока
+def validate_zones(zones):
+    if not isinstance(zones, list):
+        raise ValueError("Зоны должны быть списком")
+    result = []
+    for zone in zones:
+        if not isinstance(zone, dict) or zone.get("type") not in ZONE_TYPES:
+            raise ValueError(f"Тип зоны должен быть одним из: {', '.join(ZONE_TYPES)}")
+        points = zone.get("points")
+        if not isinstance(points, list) or len(points) < 3:
+            raise ValueError("Зона должна содержать не менее трех точек")
+        try:
+            points = [[float(x), float(y)] for x, y in points]
+        except (TypeError, ValueError):
+            raise ValueError("Точки зоны должны быть парами чисел")
+        if any(not 0 <= value <= 1 for point in points for value in point):
+            raise ValueError("Координаты точек зоны задаются долями кадра (от 0 до 1)")
+        result.append({"type": zone["type"], "points": points})
+    return result
+
+
+# Зоны камеры в пикселях кадра. До распознавания кадр обрезается до прямоугольника, охватывающего
+# зоны включения; после распознавания рамка принимается по положению ее центра.
+# Пиксельные координаты пересчитываются только при смене размера кадра.
+class ZoneFilter:
+    def __init__(self, zones):
+        self.zones = zones
+        self._shape = None
+        self._include = []
+        self._exclude = []
+        self._rect = None
+
+    def _prepare(self, shape):
+        height, width = shape[:2]
+        self._shape = shape[:2]
+        polygons = {zone_type: [] for zone_type in ZONE_TYPES}
+        for zone in self.zones:
+            points = (np.array(zone["points"]) * (width, height)).astype(np.float32)
+            polygons[zone["type"]].append(points.reshape(-1, 1, 2))
+        self._include = polygons["include"]
+        self._exclude = polygons["exclude"]
+        if self._include:
+            points = np.concatenate(self._include).reshape(-1, 2)
+            x1, y1 = (max(0, math.floor(value)) for value in points.min(axis=0))
+            x2 = min(width, max(x1 + 1, math.ceil(points[:, 0].max())))
+            y2 = min(height, max(y1 + 1, math.ceil(points[:, 1].max())))
+            self._rect = (x1, y1, x2, y2)
+        else:
+            self._rect = (0, 0, width, height)
+
+    # Часть кадра для распознавания и ее смещение (x, y) в кадре
+    def crop(self, frame):
+        if frame.shape[:2] != self._shape:
+            self._prepare(frame.shape)
+        x1, y1, x2, y2 = self._rect
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    # Центр рамки (x1, y1, x2, y2) в пикселях кадра: внутри зон включения (если они есть) и вне зон исключения
+    def accepts(self, box):
+        center = ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+        if self._include and not any(cv2.pointPolygonTest(zone, center, False) >= 0 for zone in self._include):
+            return False
+        return not any(cv2.pointPolygonTest(zone, center, False) >= 0 for zone in self._exclude)
+
+
+# Фильтр зон камеры (None, если зоны не заданы)
+def build_zone_filter(zones):
+    return ZoneFilter(zones) if zones else None
@@ -0,0 +1,55 @@
+import io
+import json
+import zipfile
+
+from server import archive
+from server.archive import stream_zip, archive_name
+
+
+def capture(path, camera="cam", timestamp="2025-05-16_10-30-00", capture_id="1747380600000-000-aaaaaa"):
+    return {
+        "capture_id": capture_id, "camera": camera, "path": str(path), "timestamp": timestamp,
+        "created": 1747380600.0, "detections": [{"class_id": 0, "confidence": 0.9, "box": [0, 0, 1, 1]}],
+    }
+
+
+def test_archive_contains_files_and_manifest(tmp_path):
+    first = tmp_path / "a.jpg"
+    second = tmp_path / "b.jpg"
+    first.write_bytes(b"\xff\xd8first\xff\xd9")
+    second.write_bytes(b"\xff\xd8second\xff\xd9")
+    captures = [capture(first), capture(tmp_path / "missing.jpg"), capture(second, camera="door")]
+
+    data = b"".join(stream_zip(captures))
+    with zipfile.ZipFile(io.BytesIO(data)) as result:
+        assert result.testzip() is None
+        assert result.namelist() == [
+            "cam/2025-05-16_10-30-00_a.jpg", "door/2025-05-16_10-30-00_b.jpg", "manifest.json"
+        ]
+        assert result.read("cam/2025-05-16_10-30-00_a.jpg") == first.read_bytes()
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in result.infolist())
+        manifest = json.loads(result.read("manifest.json"))
+
+    # Отсутствующий на диске снимок пропускается и в архиве, и в манифесте
+    assert [entry["file"] for entry in manifest["captures"]] == [
+        "cam/2025-05-16_10-30-00_a.jpg", "door/2025-05-16_10-30-00_b.jpg"
+    ]
+    assert manifest["captures"][0]["detections"][0]["class_id"] == 0
+
+
+def test_large_file_is_streamed_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "CHUNK_SIZE", 1024)
+    path = tmp_path / "big.jpg"
+    path.write_bytes(bytes(range(256)) * 64)
+
+    chunks = list(stream_zip([capture(path)]))
+    # Ни один блок ответа не содержит файл целиком
+    assert max(len(chunk) for chunk in chunks) < 4 * 1024
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as result:
+        assert result.read(archive_name(capture(path))) == path.read_bytes()
+
+
+def test_empty_selection_gives_manifest_only():
+    with zipfile.ZipFile(io.BytesIO(b"".join(stream_zip([])))) as result:
+        assert result.namelist() == ["manifest.json"]
+        assert json.loads(result.read("manifest.json")) == {"captures": []}
@@ -0,0 +1,101 @@
+import io
+import json
+import time
+import types
+import asyncio
+import threading
+
+import pytest
+
+from bot import bot
+from bot.bot import ChatRegistry, OutboundScheduler
+from tests.test_outbound_scheduler import FakeBot
+
+
+# Цикл бота в отдельном потоке с запущенным планировщиком: эндпоинты Flask ставят сообщения в очередь из
+# потоков запросов, как в работающем боте
+@pytest.fixture
+def running_bot(monkeypatch):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    fake_bot = FakeBot()
+
+    async def start():
+        scheduler = OutboundScheduler(
+            fake_bot, max_pending=2, chat_interval=0.01, global_rate=1000, group_window=0.01, max_retries=1
+        )
+        return scheduler, asyncio.create_task(scheduler.run())
+
+    scheduler, task = asyncio.run_coroutine_threadsafe(start(), loop).result(5)
+    application = types.SimpleNamespace(bot_data={"user_codes": {"1": "code-1", "2": "code-2"}})
+    monkeypatch.setattr(bot, "bot_application", application)
+    monkeypatch.setattr(bot, "bot_loop", loop)
+    monkeypatch.setattr(bot, "scheduler", scheduler)
+    yield fake_bot, scheduler
+    loop.call_soon_threadsafe(task.cancel)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def wait_sent(fake_bot, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while sum(sent for _, sent in fake_bot.sent) < count:
+        assert time.monotonic() < deadline, "Сообщения не отправлены"
+        time.sleep(0.01)
+
+
+def test_send_image_is_queued_and_sent(running_bot):
+    fake_bot, scheduler = running_bot
+    client = bot.app.test_client()
+    response = client.post("/send_image", data={
+        "chat_id": "1", "code": "code-1", "caption": "Снимок", "photo": (io.BytesIO(b"jpeg"), "a.jpg"),
+    })
+    assert response.status_code == 202
+    wait_sent(fake_bot, 1)
+    assert fake_bot.sent == [("1", 1)]
+
+    response = client.post("/send_image", data={
+        "chat_id": "1", "code": "wrong", "caption": "Снимок", "photo": (io.BytesIO(b"jpeg"), "a.jpg"),
+    })
+    assert response.status_code == 401
+
+
+def test_send_images_reports_each_item(running_bot):
+    fake_bot, scheduler = running_bot
+    items = [
+        {"chat_id": "1", "code": "code-1", "caption": "Снимок", "photo": "shared"},
+        {"chat_id": "2", "code": "wrong", "caption": "Снимок", "photo": "shared"},
+        {"chat_id": "2", "code": "code-2", "caption": "Снимок", "photo": "missing"},
+        {"chat_id": "2", "code": "code-2", "caption": "Снимок", "photo": "shared"},
+    ]
+    response = bot.app.test_client().post("/send_images", data={
+        "items": json.dumps(items), "shared": (io.BytesIO(b"jpeg"), "a.jpg"),
+    })
+    assert response.status_code == 200
+    statuses = [result["status"] for result in response.get_json()["results"]]
+    assert statuses == ["queued", "error", "error", "queued"]
+    wait_sent(fake_bot, 2)
+    assert sorted(fake_bot.sent) == [("1", 1), ("2", 1)]
+
+
+def test_full_queue_is_rejected(running_bot):
+    fake_bot, scheduler = running_bot
+    scheduler.pending = scheduler.max_pending
+    response = bot.app.test_client().post("/send_image", data={
+        "chat_id": "1", "code": "code-1", "caption": "Снимок", "photo": (io.BytesIO(b"jpeg"), "a.jpg"),
+    })
+    assert response.status_code == 503
+
+
+def test_chat_registry_keeps_rebound_chats(tmp_path):
+    path = str(tmp_path / "bot.db")
+    registry = ChatRegistry(path)
+    registry.bind("1", "old")
+    registry.bind("2", "code-2")
+    registry.bind("1", "new")
+    # Отзыв старой привязки не удаляет чат, привязанный заново после проверки
+    registry.remove({"1": "old", "2": "code-2"})
+    registry.close()
+    assert ChatRegistry(path).load() == {"1": "new"}
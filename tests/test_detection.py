@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from server.detection import (
+    validate_detection_settings, compile_rules, filter_detections, weak_detections, PersistenceCounter, EMPTY_RULES
+)
+
+PERSON = 0
+CAR = 2
+SETTINGS = {
+    "0": {"detect": True, "notify": True, "confidence": 0.6, "min_area": 0.1},
+    "2": {"detect": True, "notify": False, "min_frames": 3},
+    "5": {"detect": False, "notify": True},
+}
+
+
+def test_validate_detection_settings():
+    settings = validate_detection_settings({0: {"detect": 1, "confidence": "0.7", "min_frames": "2"}})
+    assert settings == {"0": {"detect": True, "notify": False, "confidence": 0.7, "min_frames": 2}}
+
+
+@pytest.mark.parametrize("settings", [
+    [],
+    {"person": {"detect": True}},
+    {"0": {"detect": True, "confidence": 1.5}},
+    {"0": {"detect": True, "min_frames": 0}},
+    {"0": {"detect": True, "min_area": "large"}},
+])
+def test_validate_detection_settings_rejects_invalid(settings):
+    with pytest.raises(ValueError):
+        validate_detection_settings(settings)
+
+
+def test_compiled_rules_are_read_only():
+    rules = compile_rules(SETTINGS, [("code", "1")])
+    assert rules.notify == frozenset({PERSON})
+    assert rules.recipients == (("code", "1"),)
+    with pytest.raises(ValueError):
+        rules.confidence[0] = 0
+
+
+def test_filter_detections_applies_class_thresholds():
+    rules = compile_rules(SETTINGS, [])
+    classes = np.array([PERSON, PERSON, PERSON, CAR, 5, 80])
+    confidences = np.array([0.9, 0.5, 0.9, 0.55, 0.99, 0.99])
+    boxes = np.array([
+        [0, 0, 50, 50],   # 2500 из 10000 - проходит
+        [0, 0, 50, 50],   # ниже порога уверенности класса
+        [0, 0, 20, 20],   # меньше min_area
+        [0, 0, 1, 1],     # порог по умолчанию, без ограничения площади
+        [0, 0, 50, 50],   # класс выключен
+        [0, 0, 50, 50],   # класс не настроен
+    ], dtype=float)
+    keep = filter_detections(classes, confidences, boxes, rules, frame_area=10000)
+    assert keep.tolist() == [True, False, False, True, False, False]
+    assert not filter_detections(classes, confidences, boxes, EMPTY_RULES, 10000).any()
+
+
+def test_weak_detections_only_for_enabled_classes():
+    rules = compile_rules(SETTINGS, [])
+    classes = np.array([PERSON, PERSON, PERSON, 5])
+    confidences = np.array([0.9, 0.3, 0.05, 0.3])
+    keep = np.array([True, False, False, False])
+    weak = weak_detections(classes, confidences, rules, keep, low_confidence=0.1)
+    assert weak.tolist() == [False, True, False, False]
+
+
+def test_persistence_counter_requires_consecutive_frames():
+    rules = compile_rules(SETTINGS, [])
+    counter = PersistenceCounter()
+    assert counter.update([PERSON, CAR], rules.min_frames).tolist() == [True, False]
+    assert counter.update([CAR], rules.min_frames).tolist() == [False]
+    assert counter.update([CAR], rules.min_frames).tolist() == [True]
+    # Пропуск кадра сбрасывает серию
+    assert counter.update([], rules.min_frames).tolist() == []
+    assert counter.update([CAR], rules.min_frames).tolist() == [False]
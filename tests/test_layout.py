@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from server import layout
+from server.layout import (
+    CAPTURE_ID_PATTERN, new_capture_id, format_capture_id, capture_time, capture_path, capture_timestamp
+)
+
+
+def test_ids_are_unique_and_ordered_within_one_millisecond():
+    now = 1747380600.123
+    ids = [new_capture_id(now) for _ in range(1500)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert all(CAPTURE_ID_PATTERN.match(capture_id) for capture_id in ids)
+    # После 999 снимков в одну миллисекунду номер переходит на следующую миллисекунду
+    assert capture_time(ids[-1]) > now
+
+
+def test_ids_do_not_go_back_when_clock_does():
+    first = new_capture_id(1747380600.5)
+    second = new_capture_id(1747380600.0)
+    assert second > first
+
+
+def test_ids_of_different_processes_differ(monkeypatch):
+    first = new_capture_id(1800000000.0)
+    # Новый процесс (после fork) получает новую метку и начинает номера заново
+    monkeypatch.setattr(layout, "_node_pid", None)
+    monkeypatch.setattr(layout, "_last_ms", 0)
+    second = new_capture_id(1800000000.0)
+    assert first.rsplit("-", 1)[0] == second.rsplit("-", 1)[0]
+    assert first != second
+
+
+def test_legacy_ids_without_node_are_accepted():
+    capture_id = format_capture_id(1747380600123, 7)
+    assert capture_id == "1747380600123-007"
+    assert capture_time(capture_id) == 1747380600.123
+
+
+@pytest.mark.parametrize("capture_id", [None, "", "123-001", "1747380600123-1", "1747380600123-001-XYZ123", "../x"])
+def test_foreign_ids_are_rejected(capture_id):
+    with pytest.raises(ValueError):
+        capture_time(capture_id)
+
+
+def test_path_is_sharded_by_local_hour():
+    capture_id = format_capture_id(1747380600123, 0, "abcdef")
+    moment = datetime.fromtimestamp(1747380600.123)
+    assert capture_path("u", "cam", capture_id) == (
+        f"static/captures/u/cam/{moment:%Y/%m/%d/%H}/1747380600123-000-abcdef.jpg"
+    )
+    assert capture_path("u", "cam", capture_id, ".mp4").endswith(".mp4")
+    assert capture_timestamp(capture_id) == moment.strftime("%Y-%m-%d_%H-%M-%S")
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from telegram.error import NetworkError
+
+from bot.bot import OutboundScheduler
+
+
+# Имитация бота: записывает отправки, первые failures вызовов завершаются сетевой ошибкой
+class FakeBot:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    async def _call(self, chat_id, count):
+        if self.failures:
+            self.failures -= 1
+            raise NetworkError("connection reset")
+        self.sent.append((chat_id, count))
+
+    async def send_photo(self, chat_id, photo, caption):
+        await self._call(chat_id, 1)
+
+    async def send_media_group(self, chat_id, media):
+        await self._call(chat_id, len(media))
+
+
+def make_scheduler(bot, max_pending=100, max_retries=1):
+    return OutboundScheduler(
+        bot, max_pending=max_pending, chat_interval=0.01, global_rate=1000, group_window=0.01,
+        max_retries=max_retries
+    )
+
+
+def message(chat_id, index=0):
+    return {"chat_id": chat_id, "photo": b"jpeg", "caption": f"Снимок {index}"}
+
+
+# Ожидание условия с выполнением цикла событий; ошибка, если задача планировщика завершилась
+async def wait_for(condition, task, timeout=2):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if task.done():
+            task.result()
+            pytest.fail("Задача планировщика завершилась")
+        if loop.time() > deadline:
+            pytest.fail("Условие не выполнено за отведенное время")
+        await asyncio.sleep(0.01)
+
+
+async def run_scheduler(scheduler, scenario):
+    task = asyncio.create_task(scheduler.run())
+    try:
+        await scenario(task)
+        assert not task.done()
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def test_retry_exhaustion_keeps_scheduler_running():
+    bot = FakeBot(failures=2)
+    scheduler = make_scheduler(bot, max_retries=1)
+
+    async def scenario(task):
+        assert scheduler.submit(message("1"))
+        await wait_for(lambda: scheduler.pending == 0, task)
+        assert bot.sent == []
+        assert "1" not in scheduler._chats
+        # Планировщик продолжает отправку после отброшенного сообщения
+        assert scheduler.submit(message("1", 1))
+        await wait_for(lambda: bot.sent, task)
+        assert bot.sent == [("1", 1)]
+
+    asyncio.run(run_scheduler(scheduler, scenario))
+
+
+def test_retry_resends_batch():
+    bot = FakeBot(failures=1)
+    scheduler = make_scheduler(bot, max_retries=2)
+
+    async def scenario(task):
+        assert scheduler.submit(message("1"))
+        await wait_for(lambda: scheduler.pending == 0, task)
+        assert bot.sent == [("1", 1)]
+
+    asyncio.run(run_scheduler(scheduler, scenario))
+
+
+def test_messages_of_one_chat_are_grouped():
+    bot = FakeBot()
+    scheduler = make_scheduler(bot)
+
+    async def scenario(task):
+        for index in range(12):
+            assert scheduler.submit(message("1", index))
+        assert scheduler.submit(message("2"))
+        await wait_for(lambda: scheduler.pending == 0, task)
+        assert sorted(bot.sent) == [("1", 2), ("1", 10), ("2", 1)]
+
+    asyncio.run(run_scheduler(scheduler, scenario))
+
+
+def test_submit_rejects_when_queue_is_full():
+    scheduler = make_scheduler(FakeBot(), max_pending=2)
+
+    async def scenario():
+        assert scheduler.submit(message("1"))
+        assert scheduler.submit(message("1"))
+        assert not scheduler.submit(message("1"))
+        assert scheduler.pending == 2
+
+    asyncio.run(scenario())
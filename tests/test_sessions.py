@@ -0,0 +1,59 @@
+import time
+
+from server.store import CaptureStore
+from server.sessions import SessionStore, session_key
+
+
+def test_create_get_and_delete():
+    sessions = SessionStore(ttl=60)
+    sessions.create("token-1", "alice")
+    assert sessions.get("token-1") == "alice"
+    assert sessions.get("other") is None
+    assert sessions.get(None) is None
+    assert sessions.last_seen("alice") is not None
+    assert sessions.delete("token-1")
+    assert not sessions.delete("token-1")
+    assert sessions.get("token-1") is None
+
+
+def test_expired_session_is_rejected_and_swept():
+    sessions = SessionStore(ttl=60)
+    sessions.create("token-1", "alice")
+    sessions.create("token-2", "bob")
+    now = time.time()
+    assert sessions.sweep(now) == 0
+    sessions.ttl = -1
+    sessions.create("token-3", "alice")
+    assert sessions.get("token-3") is None
+    assert sessions.sweep(now) == 1
+    assert sessions.user_sessions("alice") == 1
+    # Через ttl истекают и остальные
+    assert sessions.sweep(now + 61) == 2
+    assert sessions.user_sessions("alice") == sessions.user_sessions("bob") == 0
+
+
+def test_delete_user_ends_all_sessions():
+    sessions = SessionStore(ttl=60)
+    for index in range(3):
+        sessions.create(f"alice-{index}", "alice")
+    sessions.create("bob", "bob")
+    assert sessions.delete_user("alice") == 3
+    assert sessions.get("alice-0") is None
+    assert sessions.get("bob") == "bob"
+    assert sessions.delete_user("alice") == 0
+
+
+def test_sessions_survive_restart_without_storing_tokens(tmp_path):
+    store = CaptureStore(str(tmp_path / "captures.db"))
+    sessions = SessionStore(ttl=60, persist=store)
+    sessions.create("token-1", "alice")
+    sessions.create("token-2", "bob")
+    sessions.delete("token-2")
+
+    rows = store.load_sessions(time.time())
+    assert [(key, username) for key, username, _ in rows] == [(session_key("token-1"), "alice")]
+
+    restarted = SessionStore(ttl=60, persist=store)
+    assert restarted.load() == 1
+    assert restarted.get("token-1") == "alice"
+    assert restarted.get("token-2") is None
@@ -0,0 +1,60 @@
+import time
+import collections
+
+from server.store import CaptureStore
+from server.sharding import HashRing, WorkerRegistry, camera_key, stream_signature, verify_stream_signature
+
+CAMERAS = [camera_key(f"user{user}", f"cam{camera}") for user in range(50) for camera in range(20)]
+
+
+def assignment(ring):
+    return {key: ring.node_for(key) for key in CAMERAS}
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing().node_for("u/c") is None
+
+
+def test_assignment_is_deterministic_and_balanced():
+    nodes = ["a:5100", "b:5101", "c:5102", "d:5103"]
+    first = assignment(HashRing(nodes))
+    assert first == assignment(HashRing(reversed(nodes)))
+    counts = collections.Counter(first.values())
+    assert set(counts) == set(nodes)
+    assert min(counts.values()) > len(CAMERAS) / len(nodes) * 0.5
+
+
+def test_only_cameras_of_changed_node_move():
+    before = assignment(HashRing(["a", "b", "c"]))
+    added = assignment(HashRing(["a", "b", "c", "d"]))
+    assert all(added[key] in (before[key], "d") for key in CAMERAS)
+
+    removed = assignment(HashRing(["a", "c"]))
+    assert all(removed[key] == before[key] for key in CAMERAS if before[key] != "b")
+
+
+def test_registry_follows_heartbeats(tmp_path):
+    store = CaptureStore(str(tmp_path / "captures.db"))
+    registry = WorkerRegistry(store, timeout=30, cache_ttl=0)
+    assert registry.owner("u", "c") == (None, None)
+
+    store.heartbeat("a", "http://a:5100", 1, time.time())
+    store.heartbeat("b", "http://b:5101", 2, time.time())
+    node_id, url = registry.owner("u", "c")
+    assert url == {"a": "http://a:5100", "b": "http://b:5101"}[node_id]
+
+    # Узел без heartbeat дольше timeout выпадает из кольца
+    with store.transaction() as db:
+        db.execute("UPDATE workers SET heartbeat = ? WHERE node_id = ?", (time.time() - 60, node_id))
+    assert registry.owner("u", "c")[0] == ({"a", "b"} - {node_id}).pop()
+
+
+def test_stream_signature():
+    expires = int(time.time()) + 60
+    signature = stream_signature("secret", "u", "c", expires)
+    assert verify_stream_signature("secret", "u", "c", expires, signature)
+    assert not verify_stream_signature("other", "u", "c", expires, signature)
+    assert not verify_stream_signature("secret", "u", "other", expires, signature)
+    assert not verify_stream_signature("secret", "u", "c", expires, None)
+    expired = int(time.time()) - 1
+    assert not verify_stream_signature("secret", "u", "c", expired, stream_signature("secret", "u", "c", expired))
@@ -0,0 +1,199 @@
+import os
+import time
+
+import pytest
+
+from server.store import CaptureStore
+from server.retention import RetentionService
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CaptureStore(str(tmp_path / "captures.db"))
+
+
+def counters(store, username="u", camera_name="c"):
+    return store.usage(username)[username][camera_name]
+
+
+# Время создания снимка задается явно, чтобы проверять очистку по возрасту
+def set_created(store, path, created):
+    with store.transaction() as db:
+        db.execute("UPDATE captures SET created = ? WHERE path = ?", (created, path))
+
+
+def test_usage_follows_capture_insert_update_and_delete(store):
+    store.add_capture("u", "c", "a.jpg", "t", size=100)
+    store.add_capture("u", "c", "b.jpg", "t", size=50)
+    store.add_capture("u", "d", "c.jpg", "t", size=7)
+    assert counters(store)["capture_count"] == 2
+    assert counters(store)["capture_bytes"] == 150
+    assert counters(store, camera_name="d")["capture_bytes"] == 7
+
+    # Повторная запись того же пути обновляет размер, а не добавляет снимок
+    store.add_capture("u", "c", "a.jpg", "t", size=120)
+    assert counters(store)["capture_count"] == 2
+    assert counters(store)["capture_bytes"] == 170
+
+    assert store.delete_capture("u", "b.jpg") == ["b.jpg"]
+    assert counters(store)["capture_count"] == 1
+    assert counters(store)["capture_bytes"] == 120
+
+
+def test_usage_follows_segments(store):
+    store.add_segment("u", "c", "s1.mp4", 0, 60, 1000)
+    store.add_segment("u", "c", "s2.mp4", 60, 60, 500)
+    store.add_segment("u", "c", "s2.mp4", 60, 60, 800)
+    assert counters(store)["segment_count"] == 2
+    assert counters(store)["segment_bytes"] == 1800
+
+    assert store.expire_segments("u", "c", before=30) == ["s1.mp4"]
+    assert counters(store)["segment_count"] == 1
+    assert counters(store)["segment_bytes"] == 800
+
+
+def test_usage_is_counted_once_on_reopen(tmp_path):
+    path = str(tmp_path / "captures.db")
+    store = CaptureStore(path)
+    store.add_capture("u", "c", "a.jpg", "t", size=100)
+    reopened = CaptureStore(path)
+    assert counters(reopened)["capture_count"] == 1
+    assert counters(reopened)["capture_bytes"] == 100
+
+
+def test_clip_size_is_counted_once_and_moves_to_remaining_capture(store):
+    store.add_capture("u", "c", "a.jpg", "t", size=10)
+    store.add_capture("u", "c", "b.jpg", "t", size=10)
+    assert store.set_clip(["a.jpg", "b.jpg"], "clip.mp4", 1000) == 2
+    assert counters(store)["capture_bytes"] == 1020
+
+    # Клип остается, пока на него ссылается хотя бы один снимок
+    assert store.delete_capture("u", "a.jpg") == ["a.jpg"]
+    assert counters(store)["capture_bytes"] == 1010
+    assert store.delete_capture("u", "b.jpg") == ["b.jpg", "clip.mp4"]
+    assert counters(store)["capture_bytes"] == 0
+
+
+def test_set_clip_skips_captures_missing_from_index(store):
+    store.add_capture("u", "c", "a.jpg", "t", size=10)
+    assert store.set_clip(["missing.jpg", "a.jpg"], "clip.mp4", 1000) == 1
+    assert counters(store)["capture_bytes"] == 1010
+    assert store.set_clip(["missing.jpg"], "orphan.mp4", 1000) == 0
+    assert store.set_clip([], "orphan.mp4", 1000) == 0
+
+
+def test_trim_captures_by_age_and_excess(store):
+    now = time.time()
+    for index, path in enumerate(["a.jpg", "b.jpg", "c.jpg", "d.jpg"]):
+        store.add_capture("u", "c", path, "t", size=100)
+        set_created(store, path, now - 3600 * (4 - index))
+
+    files, freed = store.trim_captures("u", "c", before=now - 3 * 3600 - 1)
+    assert (files, freed) == (["a.jpg"], 100)
+
+    # По объему удаляются самые старые снимки, пока не освобождено excess байт
+    files, freed = store.trim_captures("u", "c", excess=150)
+    assert (files, freed) == (["b.jpg", "c.jpg"], 200)
+    assert counters(store)["capture_count"] == 1
+    assert store.trim_captures("u", "c", excess=0) == ([], 0)
+
+
+def test_retention_service_removes_files_over_quota(store, tmp_path):
+    paths = []
+    for index in range(3):
+        path = str(tmp_path / f"{index}.jpg")
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+        store.add_capture("u", "c", path, "t", size=100)
+        set_created(store, path, time.time() - 10 + index)
+        paths.append(path)
+
+    service = RetentionService(store, lambda username, camera_name: (0, 250), lambda username: 0, interval=60)
+    assert service.run_once() == (1, 100)
+    assert not os.path.exists(paths[0])
+    assert all(os.path.exists(path) for path in paths[1:])
+    assert counters(store)["capture_bytes"] == 200
+
+
+def test_acquire_lease_is_exclusive_until_expiry(store):
+    assert store.acquire_lease("retention", "first", 60)
+    assert store.acquire_lease("retention", "first", 60)
+    assert not store.acquire_lease("retention", "second", 60)
+    assert store.acquire_lease("retention", "first", -1)
+    assert store.acquire_lease("retention", "second", 60)
+
+
+def test_selection_by_ids_or_paths(store):
+    store.add_capture("u", "c", "a.jpg", "t", capture_id="1747380600000-000-aaaaaa")
+    store.add_capture("u", "c", "b.jpg", "t", capture_id="1747380600000-001-aaaaaa")
+    store.add_capture("u", "d", "legacy.jpg", "t")
+    store.add_capture("other", "c", "x.jpg", "t", capture_id="1747380600000-002-aaaaaa")
+
+    # Снимки без идентификатора выбираются по пути; чужие снимки не выбираются
+    paths = store.mark_viewed(
+        "u", capture_ids=["1747380600000-000-aaaaaa", "1747380600000-002-aaaaaa"], paths=["legacy.jpg"]
+    )
+    assert sorted(paths) == ["a.jpg", "legacy.jpg"]
+    ids, viewed = store.capture_states("u")
+    assert ids == {"a.jpg": "1747380600000-000-aaaaaa", "b.jpg": "1747380600000-001-aaaaaa", "legacy.jpg": None}
+    assert sorted(viewed) == ["a.jpg", "legacy.jpg"]
+
+    assert store.mark_viewed("u", capture_ids=[], paths=[]) == []
+    assert sorted(capture["path"] for capture in store.export_captures("u", camera_name="c")) == ["a.jpg", "b.jpg"]
+
+    deleted, files = store.delete_captures("u", paths=["b.jpg", "x.jpg"])
+    assert deleted == ["b.jpg"] and files == ["b.jpg"]
+    assert store.delete_captures("u", capture_ids=["missing"]) == ([], [])
+    assert store.captures("other") == {"c": {"x.jpg": "t"}}
+
+
+def test_selection_is_not_limited_by_sqlite_parameters(store):
+    paths = [f"{index}.jpg" for index in range(40000)]
+    with store.transaction() as db:
+        db.executemany(
+            "INSERT INTO captures (username, camera, path, timestamp, created) VALUES ('u', 'c', ?, 't', 0)",
+            [(path,) for path in paths]
+        )
+    assert len(store.mark_viewed("u", paths=paths)) == 40000
+
+
+def test_export_includes_detections(store):
+    store.add_capture("u", "c", "a.jpg", "t", capture_id="1747380600000-000-aaaaaa",
+                      detections=[(0, 0.9, (0.1, 0.2, 0.3, 0.4))])
+    store.add_capture("u", "c", "b.jpg", "t")
+    exported = {capture["path"]: capture for capture in store.export_captures("u", detections=True)}
+    assert exported["a.jpg"]["detections"] == [{"class_id": 0, "confidence": 0.9, "box": [0.1, 0.2, 0.3, 0.4]}]
+    assert exported["b.jpg"]["detections"] == [] and exported["b.jpg"]["viewed"] is False
+
+
+def test_user_totals_and_last_capture(store):
+    store.add_capture("u", "c", "a.jpg", "t", size=10)
+    store.add_capture("u", "d", "b.jpg", "t", size=20)
+    store.add_segment("u", "c", "s.mp4", 0, 60, 300)
+    store.add_capture("v", "c", "c.jpg", "t", size=5)
+    set_created(store, "a.jpg", 100.0)
+
+    totals = store.user_totals(["u", "missing"])
+    assert list(totals) == ["u"]
+    assert totals["u"]["capture_count"] == 2
+    assert totals["u"]["capture_bytes"] == 30
+    assert totals["u"]["segment_bytes"] == 300
+    last_capture = counters(store, camera_name="d")["last_capture"]
+    assert totals["u"]["last_capture"] == last_capture
+
+    # Время последнего снимка не уменьшается при удалении снимков
+    store.delete_capture("u", "b.jpg")
+    assert store.user_totals(["u"])["u"]["last_capture"] == last_capture
+
+
+def test_last_capture_is_backfilled_on_upgrade(tmp_path):
+    path = str(tmp_path / "captures.db")
+    store = CaptureStore(path)
+    store.add_capture("u", "c", "a.jpg", "t", size=10)
+    created = store.connection().execute("SELECT created FROM captures").fetchone()[0]
+    # База версии без last_capture: столбец и его триггер удаляются
+    with store.transaction() as db:
+        db.execute("DROP TRIGGER usage_capture_last")
+        db.execute("ALTER TABLE usage DROP COLUMN last_capture")
+
+    assert counters(CaptureStore(path))["last_capture"] == created
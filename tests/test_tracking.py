@@ -0,0 +1,83 @@
+import numpy as np
+
+from server.tracking import IoUTracker, iou_matrix, greedy_match
+
+PERSON = 0
+CAR = 2
+
+
+def detection(box, class_id=PERSON, confidence=0.9):
+    return (class_id, confidence, box)
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=float)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10]], dtype=float)
+    iou = iou_matrix(a, b)
+    assert iou.shape == (2, 2)
+    assert np.allclose(iou[0], [1, 50 / 150])
+    assert np.allclose(iou[1], [0, 0])
+    assert iou_matrix(a, np.zeros((0, 4))).shape == (2, 0)
+
+
+def test_greedy_match_takes_best_pairs_above_threshold():
+    iou = np.array([[0.9, 0.8], [0.85, 0.1]])
+    assert greedy_match(iou, 0.3) == [(0, 0)]
+    assert greedy_match(iou, 0.05) == [(0, 0), (1, 1)]
+    assert greedy_match(np.zeros((0, 0)), 0.3) == []
+
+
+def test_standing_object_produces_one_event():
+    tracker = IoUTracker(min_hits=2)
+    box = (100, 100, 200, 300)
+    assert tracker.update([detection(box)], 0.0) == []
+    events = tracker.update([detection(box)], 0.1)
+    assert len(events) == 1 and events[0].class_id == PERSON
+    for frame in range(2, 50):
+        assert tracker.update([detection((101, 100, 201, 300))], frame * 0.1) == []
+    assert len(tracker.tracks) == 1
+
+
+def test_moving_object_produces_event_per_move():
+    tracker = IoUTracker(min_hits=1, move_threshold=0.5)
+    first = tracker.update([detection((0, 0, 100, 100))], 0.0)
+    assert len(first) == 1
+    # Небольшие смещения подряд сопоставляются с треком; событие - после смещения на полдиагонали
+    events = []
+    for step in range(1, 20):
+        x = step * 10
+        events += tracker.update([detection((x, 0, x + 100, 100))], step * 0.1)
+    assert len(events) >= 2
+    assert {track.id for track in events} == {first[0].id}
+
+
+def test_track_expires_after_max_age():
+    tracker = IoUTracker(min_hits=1, max_age=1.0)
+    box = (0, 0, 50, 50)
+    first = tracker.update([detection(box)], 0.0)
+    assert tracker.update([], 0.5) == []
+    second = tracker.update([detection(box)], 2.0)
+    assert len(second) == 1 and second[0].id != first[0].id
+
+
+def test_weak_detections_extend_tracks_but_do_not_create_them():
+    tracker = IoUTracker(min_hits=1, max_age=1.0)
+    box = (0, 0, 50, 50)
+    assert tracker.update([], 0.0, weak=[detection(box, confidence=0.2)]) == []
+    assert tracker.tracks == []
+
+    track = tracker.update([detection(box)], 0.0)[0]
+    # Слабые рамки держат трек дольше max_age, и возврат сильной рамки не дает нового события
+    for step in range(1, 30):
+        assert tracker.update([], step * 0.1, weak=[detection(box, confidence=0.2)]) == []
+    assert tracker.update([detection(box)], 3.0) == []
+    assert [existing.id for existing in tracker.tracks] == [track.id]
+
+
+def test_classes_are_tracked_separately():
+    tracker = IoUTracker(min_hits=1)
+    box = (0, 0, 50, 50)
+    tracker.update([detection(box)], 0.0)
+    events = tracker.update([detection(box, class_id=CAR)], 0.1)
+    assert len(events) == 1 and events[0].class_id == CAR
+    assert len(tracker.tracks) == 2
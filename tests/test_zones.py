@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from server.zones import validate_zones, build_zone_filter
+
+BOTTOM_HALF = {"type": "include", "points": [[0, 0.5], [1, 0.5], [1, 1], [0, 1]]}
+LEFT_QUARTER = {"type": "exclude", "points": [[0, 0], [0.25, 0], [0.25, 1], [0, 1]]}
+
+
+def frame(width=400, height=200):
+    return np.zeros((height, width, 3), dtype=np.uint8)
+
+
+def test_validate_zones_casts_points():
+    zones = validate_zones([{"type": "exclude", "points": [["0", 0], [1, "0.5"], [0.5, 1]]}])
+    assert zones == [{"type": "exclude", "points": [[0.0, 0.0], [1.0, 0.5], [0.5, 1.0]]}]
+
+
+@pytest.mark.parametrize("zones", [
+    {"type": "include"},
+    [{"type": "mask", "points": [[0, 0], [1, 0], [1, 1]]}],
+    [{"type": "include", "points": [[0, 0], [1, 1]]}],
+    [{"type": "include", "points": [[0, 0], [1, 0], [1, 2]]}],
+    [{"type": "include", "points": [[0, 0], [1, 0], ["x", 1]]}],
+])
+def test_validate_zones_rejects_invalid(zones):
+    with pytest.raises(ValueError):
+        validate_zones(zones)
+
+
+def test_no_zones_means_no_filter():
+    assert build_zone_filter([]) is None
+
+
+def test_crop_to_include_zones():
+    zone_filter = build_zone_filter([BOTTOM_HALF])
+    region, offset = zone_filter.crop(frame())
+    assert region.shape[:2] == (100, 400)
+    assert offset == (0, 100)
+    # Размер кадра изменился - зоны пересчитываются
+    region, offset = zone_filter.crop(frame(800, 400))
+    assert region.shape[:2] == (200, 800)
+    assert offset == (0, 200)
+
+
+def test_only_exclude_zones_keep_whole_frame():
+    zone_filter = build_zone_filter([LEFT_QUARTER])
+    region, offset = zone_filter.crop(frame())
+    assert region.shape[:2] == (200, 400) and offset == (0, 0)
+
+
+def test_accepts_by_box_center():
+    zone_filter = build_zone_filter([BOTTOM_HALF, LEFT_QUARTER])
+    zone_filter.crop(frame())
+    assert zone_filter.accepts((200, 120, 260, 190))
+    # Центр выше зоны включения
+    assert not zone_filter.accepts((200, 20, 260, 120))
+    # Центр в зоне исключения
+    assert not zone_filter.accepts((10, 120, 60, 190))